@@ -0,0 +1,90 @@
+"""
+Benchmark de LineCountRotatingFileHandler: registros por segundo con un
+archivo que ya tiene 0, 1000 y 1999 líneas, comparando el handler anterior
+(que volvía a leer el archivo entero después de cada registro) con el
+actual (contador incremental).
+
+Uso:
+    python benchmarks/bench_log_handler.py [--records 50] [--repeat 5]
+
+La rotación se desactiva (max_lines muy alto) para medir solo la escritura
+y el conteo; se toma la mejor de `repeat` repeticiones.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# modules/__init__ importa devices, que necesita SERVER_URL aunque aquí no se use
+os.environ.setdefault("SERVER_URL", "http://127.0.0.1:9")
+
+from modules.log_pipeline import LineCountRotatingFileHandler, LOG_FORMAT  # noqa: E402
+
+EXISTING_LINES = (0, 1000, 1999)
+NO_ROLLOVER = 10 ** 9
+
+
+class OldLineCountRotatingFileHandler(RotatingFileHandler):
+    """Handler anterior, tal como estaba en main.py antes del contador incremental"""
+
+    def __init__(self, filename, max_lines=2000, backup_count=5, encoding=None):
+        self.max_lines = max_lines
+        super().__init__(filename, maxBytes=0, backupCount=backup_count, encoding=encoding)
+
+    def emit(self, record):
+        super().emit(record)
+        self.check_line_count()
+
+    def check_line_count(self):
+        if os.path.exists(self.baseFilename):
+            with open(self.baseFilename, 'r', encoding=self.encoding) as f:
+                line_count = sum(1 for _ in f)
+            if line_count >= self.max_lines:
+                self.doRollover()
+
+
+def make_record(i):
+    return logging.LogRecord("bench", logging.INFO, __file__, 0, f"Registro de prueba número {i} con algo de texto",
+                             None, None)
+
+
+def records_per_second(handler_class, existing, records):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.log")
+        with open(path, "w") as f:
+            for i in range(existing):
+                f.write(f"2026-01-01 00:00:00,000 - bench - INFO - Línea existente {i}\n")
+        handler = handler_class(path, max_lines=NO_ROLLOVER, backup_count=0)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        batch = [make_record(i) for i in range(records)]
+        try:
+            started = time.perf_counter()
+            for record in batch:
+                handler.emit(record)
+            elapsed = time.perf_counter() - started
+        finally:
+            handler.close()
+    return records / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50, help="Registros emitidos por medida")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+
+    print(f"{'líneas existentes':>18} {'anterior (reg/s)':>17} {'actual (reg/s)':>15} {'mejora':>7}")
+    for existing in EXISTING_LINES:
+        old = max(records_per_second(OldLineCountRotatingFileHandler, existing, args.records)
+                  for _ in range(args.repeat))
+        new = max(records_per_second(LineCountRotatingFileHandler, existing, args.records)
+                  for _ in range(args.repeat))
+        print(f"{existing:>18} {old:>17,.0f} {new:>15,.0f} {new / old:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark de RateLimitFilter: volumen de log y CPU de un ciclo de
+sincronización (registro del estado cada latido, login y descarga de las
+playlists) contra un servidor local que imita al de gestión, con el
+limitador desactivado y activado.
+
+Uso:
+    python benchmarks/bench_log_ratelimit.py [--heartbeats 10] [--videos 30] [--runs 2]
+
+Cada medida se hace en un proceso nuevo, con los logs en un directorio
+temporal, porque la configuración del logging se lee del entorno al
+importar main. También se mide el coste de RateLimitFilter.filter().
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+VIDEO_SIZE = 64 * 1024
+
+
+def stand_in_server(videos):
+    """Aplicación FastAPI con las rutas del servidor de gestión que usa un ciclo"""
+    from fastapi import FastAPI, Request, Response
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+
+    @app.get("/login")
+    async def login_form():
+        return Response("form")
+
+    @app.post("/login")
+    async def login():
+        response = JSONResponse({"ok": True})
+        response.set_cookie("session", "bench")
+        return response
+
+    @app.get("/api/raspberry/playlists/active/{device_id}")
+    async def active_playlists(device_id: str):
+        return [{"id": 1, "title": "Benchmark",
+                 "videos": [{"id": i, "title": f"Video {i}"} for i in range(1, videos + 1)]}]
+
+    @app.get("/api/videos/{video_id}/download")
+    async def download(video_id: int):
+        async def body():
+            for _ in range(VIDEO_SIZE // 8192):
+                yield b"\0" * 8192
+        return StreamingResponse(body(), headers={"content-length": str(VIDEO_SIZE)}, media_type="video/mp4")
+
+    @app.post("/api/devices/register")
+    async def register(request: Request):
+        return {"ok": True}
+
+    @app.post("/api/devices/status")
+    async def status(request: Request):
+        return {"ok": True}
+
+    return app
+
+
+def start_server(videos):
+    """Arranca el servidor en un hilo y devuelve su URL"""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stand_in_server(videos), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def run_cycle(heartbeats):
+    """Un ciclo de sincronización en este proceso (se ejecuta en el proceso hijo)"""
+    import main
+    from modules.devices import update_status_async
+    from modules.log_pipeline import shutdown_logging, get_logging_stats
+
+    async def cycle():
+        client = main.create_sync_client()
+        client.load_state()
+        for _ in range(heartbeats):
+            await update_status_async(verify_ssl=False)
+        await client.check_for_updates()
+        await main.close_async_clients()
+
+    started = time.process_time()
+    asyncio.run(cycle())
+    cpu = time.process_time() - started
+    stats = get_logging_stats()
+    shutdown_logging()
+
+    with open(os.environ["LOG_FILE"], "rb") as f:
+        text = f.read()
+    rate_limit = stats.get("rate_limit") or {}
+    print(json.dumps({
+        "lines": text.count(b"\n"),
+        "text_bytes": len(text),
+        "jsonl_bytes": os.path.getsize(os.environ["JSONL_LOG_FILE"]),
+        "cpu_ms": round(cpu * 1000),
+        "suppressed": rate_limit.get("suppressed", 0),
+        "top": [f"{site['file']}:{site['line']} ({site['suppressed']})" for site in rate_limit.get("top", [])[:4]]
+    }))
+
+
+def measure(server_url, enabled, heartbeats):
+    """Lanza un ciclo en un proceso nuevo y devuelve sus medidas"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            SERVER_URL=server_url,
+            VERIFY_SSL="False",
+            DOWNLOAD_PATH=os.path.join(tmp, "downloads"),
+            LOG_FILE=os.path.join(tmp, "raspberry_client.log"),
+            JSONL_LOG_FILE=os.path.join(tmp, "raspberry_client.jsonl"),
+            REGISTRATION_STATE_FILE=os.path.join(tmp, "registration_state.json"),
+            LOG_RATE_LIMIT_ENABLED=str(enabled),
+            LOG_SHIP_URL=""
+        )
+        # La salida de consola del ciclo va a stderr; solo se muestra si falla
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--heartbeats", str(heartbeats)],
+            env=env, cwd=tmp, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr.decode(errors="replace"))
+        raise SystemExit(f"El ciclo terminó con código {result.returncode}")
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def filter_cost(calls=200000):
+    """Microsegundos por llamada a RateLimitFilter.filter()"""
+    from modules.log_ratelimit import RateLimitFilter
+
+    rate_filter = RateLimitFilter("20/60", "")
+    record = logging.LogRecord("bench", logging.INFO, "/bench/main.py", 10, "hola %s", ("mundo",), None)
+    started = time.perf_counter()
+    for _ in range(calls):
+        rate_filter.filter(record)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--heartbeats", type=int, default=10, help="Latidos de estado por ciclo")
+    parser.add_argument("--videos", type=int, default=30, help="Videos que se descargan en el ciclo")
+    parser.add_argument("--runs", type=int, default=2, help="Ciclos medidos en cada modo")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_cycle(args.heartbeats)
+        return
+
+    os.environ.setdefault("SERVER_URL", "http://127.0.0.1:9")
+    server_url = start_server(args.videos)
+    print(f"{'limitador':>10} {'líneas':>7} {'texto':>9} {'jsonl':>9} {'CPU (ms)':>9} {'suprimidos':>11}")
+    for enabled in (False, True):
+        for _ in range(args.runs):
+            result = measure(server_url, enabled, args.heartbeats)
+            print(f"{'on' if enabled else 'off':>10} {result['lines']:>7} {result['text_bytes']:>9,} "
+                  f"{result['jsonl_bytes']:>9,} {result['cpu_ms']:>9} {result['suppressed']:>11}")
+        if enabled and result["top"]:
+            print(f"{'':>10} más suprimidos: {', '.join(result['top'])}")
+    print(f"filter(): {filter_cost():.2f} µs por llamada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark de las variantes de captura: tiempo de codificación y tamaño por
+ancho, formato y calidad con render_variant, frente al camino anterior
+(LANCZOS sobre la imagen completa y PNG). Permite revisar los valores por
+defecto: SCREENSHOT_REDUCING_GAP, el modo draft para capturas JPEG y las
+calidades de jpeg/webp.
+
+Uso:
+    python benchmarks/bench_screenshot_variants.py [--size 1920x1080] [--repeat 5]
+
+Cada tiempo es la mejor de `repeat` repeticiones en un solo núcleo.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# modules/__init__ importa devices, que necesita SERVER_URL aunque aquí no se use
+os.environ.setdefault("SERVER_URL", "http://127.0.0.1:9")
+
+from modules import screenshot_image  # noqa: E402
+from modules.screenshot_image import decode_capture, render_variant, FORMATS  # noqa: E402
+
+WIDTHS = (320, 640, 1280)
+REDUCING_GAPS = (None, 1.5, 2.0, 3.0)
+QUALITIES = {"jpeg": (60, 70, 80, 90), "webp": (60, 75, 90)}
+
+
+def synthetic_screen(width, height):
+    """Pantalla sintética: degradado, una zona de ruido, un área plana y texto"""
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    rng = random.Random(42)
+    noise = Image.frombytes("RGB", (width // 3, height // 3), rng.randbytes(width // 3 * (height // 3) * 3))
+    image.paste(noise, (width // 2, height // 2))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width // 3, height // 4), fill=(0, 83, 161))
+    for line in range(20):
+        draw.text((40, height // 3 + line * 18), f"Línea de texto {line} " * 6, fill=(255, 255, 255))
+    return image
+
+
+def encode(image, format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def best_ms(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def old_path(image, width):
+    """Camino anterior: LANCZOS sobre la imagen completa y PNG con las opciones por defecto"""
+    height = int(image.height * (width / image.width))
+    return encode(image.resize((width, height), Image.LANCZOS), "PNG")
+
+
+def cell(ms, data):
+    return f"{ms:7.1f} ms {len(data) / 1024:7.1f} KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="1920x1080", help="Tamaño de la captura sintética")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+
+    screen_width, screen_height = (int(v) for v in args.size.lower().split("x"))
+    screen = synthetic_screen(screen_width, screen_height)
+    png_capture = encode(screen, "PNG")
+    jpeg_capture = encode(screen, "JPEG", quality=90)
+    decoded = decode_capture(png_capture)
+    defaults = {name: FORMATS[name][2] for name in FORMATS}
+
+    print(f"Captura {screen_width}x{screen_height}; calidades por defecto jpeg {defaults['jpeg']}, "
+          f"webp {defaults['webp']}; reducing_gap {screenshot_image.SCREENSHOT_REDUCING_GAP}")
+    print(f"\n{'ancho':>6} {'anterior (png)':>21} {'png':>21} {'jpeg':>21} {'webp':>21}")
+    for width in WIDTHS:
+        row = [cell(*best_ms(lambda: old_path(screen, width), args.repeat))]
+        for name in ("png", "jpeg", "webp"):
+            ms, (data, _, _) = best_ms(
+                lambda: render_variant(png_capture, decoded, width, name, defaults[name]), args.repeat
+            )
+            row.append(cell(ms, data))
+        print(f"{width:>6} " + " ".join(row))
+
+    print(f"\nreducing_gap (png, ancho 640)")
+    for gap in REDUCING_GAPS:
+        screenshot_image.SCREENSHOT_REDUCING_GAP = gap
+        ms, (data, _, _) = best_ms(lambda: render_variant(png_capture, decoded, 640, "png", None), args.repeat)
+        print(f"{str(gap):>6} {cell(ms, data)}")
+    screenshot_image.SCREENSHOT_REDUCING_GAP = float(os.getenv("SCREENSHOT_REDUCING_GAP", "1.5"))
+
+    print(f"\nCalidad (ancho 640)")
+    for name, qualities in QUALITIES.items():
+        for quality in qualities:
+            ms, (data, _, _) = best_ms(
+                lambda: render_variant(png_capture, decoded, 640, name, quality), args.repeat
+            )
+            print(f"{name:>6} q{quality:<3} {cell(ms, data)}")
+
+    print(f"\nCaptura JPEG (decodificación incluida), jpeg q{defaults['jpeg']}")
+    print(f"{'ancho':>6} {'sin draft':>21} {'con draft':>21}")
+    for width in WIDTHS:
+        full_ms, _ = best_ms(
+            lambda: render_variant(jpeg_capture, Image.open(io.BytesIO(jpeg_capture)).convert("RGB"),
+                                   width, "jpeg", defaults["jpeg"]),
+            args.repeat
+        )
+        draft_ms, (data, _, _) = best_ms(
+            lambda: render_variant(jpeg_capture, decode_capture(jpeg_capture), width, "jpeg", defaults["jpeg"]),
+            args.repeat
+        )
+        print(f"{width:>6} {full_ms:>18.1f} ms {draft_ms:>18.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark de StoreIndex: tiempo medio por búsqueda con 10, 1000 y 10000
+rangos CIDR, frente a recorrer todos los rangos quedándose con el prefijo
+más largo. Comprueba además que ambos dan el mismo resultado.
+
+Uso:
+    python benchmarks/bench_store_index.py [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# modules/__init__ importa devices, que necesita SERVER_URL aunque aquí no se use
+os.environ.setdefault("SERVER_URL", "http://127.0.0.1:9")
+
+from modules.stores import StoreIndex  # noqa: E402
+from tests.test_stores import generate_ranges, generate_queries, LinearIndex  # noqa: E402
+
+RANGE_COUNTS = (10, 1000, 10000)
+
+
+def microseconds_per_lookup(index, queries):
+    started = time.perf_counter()
+    for ip in queries:
+        index.lookup(ip)
+    return (time.perf_counter() - started) * 1e6 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=2000, help="Búsquedas por medida")
+    args = parser.parse_args()
+
+    print(f"{'rangos':>7} {'trie (µs)':>10} {'lineal (µs)':>12}")
+    for count in RANGE_COUNTS:
+        rng = random.Random(count)
+        ranges = generate_ranges(rng, count)
+        queries = generate_queries(rng, ranges, args.queries)
+        index = StoreIndex(ranges)
+        linear = LinearIndex(ranges)
+        # El recorrido lineal es lento con muchos rangos: se mide con menos búsquedas
+        linear_queries = queries[:max(10, args.queries * 10 // count)]
+        assert [index.lookup(ip) for ip in queries] == [linear.lookup(ip) for ip in queries]
+        print(f"{count:>7} {microseconds_per_lookup(index, queries):>10.1f} "
+              f"{microseconds_per_lookup(linear, linear_queries):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
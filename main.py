@@ -1,25 +1,26 @@
 #!/usr/bin/env python3
 # Cliente unificado para sincronización de videos en Raspberry Pi
 
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
 import os
 import sys
 import json
 import time
 import requests
+import httpx
 import traceback
 import argparse
 import logging
 import subprocess
 from datetime import datetime, timedelta
 import asyncio
-import websockets
 import uvicorn
 import socket
-import re
+import signal
 from pathlib import Path
 import shutil
-from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 import ssl
 import certifi
@@ -29,9 +30,22 @@ load_dotenv()
 
 # Importaciones de módulos existentes
 from routers import log, screenshot, service_router
-from modules.devices import register_device, update_status
+from modules.devices import register_device, update_status, update_status_async
+from modules.http_client import get_async_client, close_async_clients
+from modules.registration import RegistrationTask
+from modules.startup import StartupGraph, BOOT_METRICS, mark_boot_milestone
 from modules.control_interface import get_device_id, get_interface_ip, get_interface_mac, get_tienda
 from modules.services import check_service
+from modules.stores import reload_store_index
+from modules.log_pipeline import setup_logging
+from modules.log_shipper import start_log_shipper as start_log_shipping, get_log_shipper, LOG_SHIP_URL
+from modules.screen_capture import probe_capture_backends
+from modules.screen_health import get_screen_health_monitor, SCREEN_HEALTH_ENABLED
+from modules.sync_state import get_sync_state
+from modules.content_manifest import get_content_manifest, new_content_hash
+from modules.sync_jobs import get_sync_jobs, current_sync_job
+from modules.download_progress import get_download_progress
+from modules.log_stream import start_legacy_server, LOG_WS_COMPRESSION, LOG_WS_PING_INTERVAL, LOG_WS_PING_TIMEOUT
 
 # Configuración predeterminada para la sincronización
 USERNAME = os.getenv("USERNAME", "ikea")  # Valor predeterminado
@@ -42,45 +56,14 @@ SERVICE_NAME = os.getenv("SERVICE_NAME", "videoloop.service")  # Nombre del serv
 SERVER_URL = os.getenv("SERVER_URL", "https://gestionpi2.ikeasi.com")  # URL del servidor predeterminada
 API_URL = f"{SERVER_URL}/api"  # URL de la API
 VERIFY_SSL = os.getenv("VERIFY_SSL", "True").lower() != "false"  # Variable global para SSL
+DOWNLOAD_WRITE_BUFFER = int(os.getenv("DOWNLOAD_WRITE_BUFFER", str(1024 * 1024)))  # Bytes por escritura en disco
 
 # Asegurarse de que las credenciales estén definidas
 if not USERNAME or not PASSWORD:
     logger.warning("Credenciales no definidas en el archivo .env, usando valores predeterminados")
 
-# Clase personalizada para rotar basado en número de líneas
-class LineCountRotatingFileHandler(RotatingFileHandler):
-    def __init__(self, filename, max_lines=2000, backup_count=5, encoding=None):
-        self.max_lines = max_lines
-        super(LineCountRotatingFileHandler, self).__init__(
-            filename, 
-            maxBytes=0,  # No rotamos por tamaño
-            backupCount=backup_count,
-            encoding=encoding
-        )
-        
-    def emit(self, record):
-        """Emite un registro y verifica el conteo de líneas después."""
-        super(LineCountRotatingFileHandler, self).emit(record)
-        self.check_line_count()
-        
-    def check_line_count(self):
-        """Verifica si el archivo ha excedido el máximo de líneas."""
-        if os.path.exists(self.baseFilename):
-            with open(self.baseFilename, 'r', encoding=self.encoding) as f:
-                line_count = sum(1 for _ in f)
-                
-            if line_count >= self.max_lines:
-                self.doRollover()
-
-# Configuración de logging con el handler personalizado
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        LineCountRotatingFileHandler('raspberry_client.log', max_lines=2000, backup_count=3),
-        logging.StreamHandler()
-    ]
-)
+# Configuración de logging central (un único escritor en segundo plano)
+setup_logging()
 
 logger = logging.getLogger(socket.gethostname())
 
@@ -143,6 +126,14 @@ class CookieAuthManager:
         # Si no hay token o ha expirado, solicitar uno nuevo
         return self.request_new_token()
     
+    async def get_token_async(self):
+        """Versión asíncrona de get_token"""
+        if self.load_token():
+            if not self.is_token_expired():
+                return self.token_data["access_token"]
+        
+        return await self.request_new_token_async()
+    
     def load_token(self):
         """Carga el token desde el archivo"""
         try:
@@ -182,23 +173,74 @@ class CookieAuthManager:
         # Si falta menos de 5 minutos para que expire, considerarlo expirado
         return expires_at - now < timedelta(minutes=5)
     
+    def _login_form_data(self):
+        """Devuelve los datos del formulario de login o None si faltan credenciales"""
+        if not self.username or not self.password:
+            logger.error("Faltan credenciales para la autenticación. Username o Password no definidos.")
+            return None
+        
+        return {
+            "username": self.username,
+            "password": self.password,
+            "next": "/"
+        }
+    
+    def _store_session_cookies(self, all_cookies, status_code):
+        """
+        Guarda las cookies de sesión obtenidas en el login como token
+        
+        Args:
+            all_cookies: Diccionario de cookies recibidas
+            status_code: Código de estado de la respuesta de login
+            
+        Returns:
+            str o None: Cadena de cookies para el header Cookie
+        """
+        if not all_cookies:
+            logger.error("No se recibieron cookies en la respuesta ni en la sesión")
+            
+            # SOLUCIÓN ALTERNATIVA: Si no se reciben cookies pero la respuesta es 200
+            # Crear una cookie "session" con un valor generado basado en el dispositivo
+            # Esto permitirá que las solicitudes posteriores funcionen
+            if status_code == 200:
+                logger.warning("Creando cookie de sesión alternativa para compatibilidad")
+                import hashlib
+                # Generar un valor de cookie basado en el dispositivo y timestamp
+                device_hash = hashlib.md5(f"{self.device_id}_{time.time()}".encode()).hexdigest()
+                all_cookies["session"] = device_hash
+                logger.info(f"Cookie alternativa creada: session={device_hash}")
+            else:
+                return None
+        
+        # Guardar las cookies para futuras solicitudes
+        self.session_cookies = all_cookies
+        
+        # Crear un token con las cookies
+        cookie_str = "; ".join([f"{name}={value}" for name, value in all_cookies.items()])
+        
+        # Almacenar el token y las cookies
+        self.token_data = {
+            "access_token": cookie_str,
+            "session_cookies": all_cookies,
+            "expires_at": (datetime.now() + timedelta(days=1)).isoformat()
+        }
+        
+        # Guardamos el token para uso futuro
+        self.save_token()
+        
+        logger.info(f"Login exitoso para usuario {self.username}")
+        return cookie_str
+    
     def request_new_token(self):
         """Solicita un nuevo token al servidor mediante login con cookies"""
         try:
             auth_url = f"{self.server_url}/login"
             
             # Verificar que tengamos credenciales
-            if not self.username or not self.password:
-                logger.error("Faltan credenciales para la autenticación. Username o Password no definidos.")
+            form_data = self._login_form_data()
+            if not form_data:
                 return None
             
-            # Datos del formulario
-            form_data = {
-                "username": self.username,
-                "password": self.password,
-                "next": "/"
-            }
-            
             logger.info(f"Solicitando token para usuario '{self.username}' en {auth_url}")
             
             # Usar una sesión para mantener las cookies entre redirecciones
@@ -244,42 +286,66 @@ class CookieAuthManager:
                 for cookie_name, cookie_value in response.cookies.items():
                     all_cookies[cookie_name] = cookie_value
                     logger.info(f"Cookie de respuesta guardada: {cookie_name}={cookie_value}")
-                
-                if not all_cookies:
-                    logger.error("No se recibieron cookies en la respuesta ni en la sesión")
-                    
-                    # SOLUCIÓN ALTERNATIVA: Si no se reciben cookies pero la respuesta es 200
-                    # Crear una cookie "session" con un valor generado basado en el dispositivo
-                    # Esto permitirá que las solicitudes posteriores funcionen
-                    if response.status_code == 200:
-                        logger.warning("Creando cookie de sesión alternativa para compatibilidad")
-                        import hashlib
-                        import time
-                        # Generar un valor de cookie basado en el dispositivo y timestamp
-                        device_hash = hashlib.md5(f"{self.device_id}_{time.time()}".encode()).hexdigest()
-                        all_cookies["session"] = device_hash
-                        logger.info(f"Cookie alternativa creada: session={device_hash}")
-                    else:
-                        return None
             
-            # Guardar las cookies para futuras solicitudes
-            self.session_cookies = all_cookies
+            return self._store_session_cookies(all_cookies, response.status_code)
+            
+        except Exception as e:
+            logger.error(f"Error al solicitar token: {e}")
+            logger.debug(traceback.format_exc())
+            return None
+    
+    async def request_new_token_async(self):
+        """Solicita un nuevo token mediante login con cookies usando el cliente HTTP asíncrono"""
+        try:
+            auth_url = f"{self.server_url}/login"
+            
+            form_data = self._login_form_data()
+            if not form_data:
+                return None
             
-            # Crear un token con las cookies
-            cookie_str = "; ".join([f"{name}={value}" for name, value in all_cookies.items()])
+            logger.info(f"Solicitando token para usuario '{self.username}' en {auth_url}")
             
-            # Almacenar el token y las cookies
-            self.token_data = {
-                "access_token": cookie_str,
-                "session_cookies": all_cookies,
-                "expires_at": (datetime.now() + timedelta(days=1)).isoformat()
-            }
+            client = get_async_client()
+            # Cookies recibidas durante el login (página de login, redirecciones y respuesta final)
+            login_cookies = httpx.Cookies()
+            
+            # Primera solicitud al formulario de login para obtener posibles tokens CSRF
+            try:
+                logger.debug("Obteniendo página de login para posibles tokens CSRF")
+                login_page = await client.get(auth_url, timeout=30)
+                login_cookies.update(login_page.cookies)
+                logger.debug(f"Estado de página de login: {login_page.status_code}")
+            except Exception as e:
+                logger.warning(f"Error al obtener página de login: {e}")
             
-            # Guardamos el token para uso futuro
-            self.save_token()
+            # Hacemos la petición POST para login
+            response = await client.post(
+                auth_url,
+                data=form_data,
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "User-Agent": self.user_agent
+                },
+                timeout=30,
+                follow_redirects=True
+            )
+            for previous in response.history:
+                login_cookies.update(previous.cookies)
+            login_cookies.update(response.cookies)
+            
+            logger.debug(f"Respuesta login: status={response.status_code}, headers={dict(response.headers)}")
+            logger.debug(f"Cookies recibidas: {dict(login_cookies)}")
             
-            logger.info(f"Login exitoso para usuario {self.username}")
-            return cookie_str
+            if response.status_code != 200:
+                logger.error(f"Error en el login: {response.status_code} - {response.text}")
+                return None
+            
+            all_cookies = {}
+            for cookie_name, cookie_value in login_cookies.items():
+                all_cookies[cookie_name] = cookie_value
+                logger.info(f"Cookie guardada: {cookie_name}={cookie_value}")
+            
+            return self._store_session_cookies(all_cookies, response.status_code)
             
         except Exception as e:
             logger.error(f"Error al solicitar token: {e}")
@@ -300,6 +366,24 @@ class CookieAuthManager:
         auth_headers["Cookie"] = token
         
         return auth_headers
+    
+    async def get_auth_headers_async(self):
+        """Versión asíncrona de get_auth_headers"""
+        token = await self.get_token_async()
+        if not token:
+            logger.warning("No se pudo obtener token de autenticación")
+            return self.headers
+        
+        auth_headers = self.headers.copy()
+        auth_headers["Cookie"] = token
+        
+        return auth_headers
+
+def write_block(f, content_hash, block):
+    """Escribe un bloque descargado y lo suma al hash del contenido (se ejecuta en un hilo)"""
+    f.write(block)
+    content_hash.update(block)
+
 
 # Cliente para sincronización de videos
 class VideoDownloaderClient:
@@ -321,6 +405,9 @@ class VideoDownloaderClient:
         self.last_update = None
         self.changes_detected = False
         
+        # Manifiesto de los videos descargados (tamaño, hash y fecha por ID)
+        self.manifest = get_content_manifest(self.download_path)
+        
         # Inicializar gestor de autenticación con credenciales correctas
         self.auth_manager = CookieAuthManager(
             server_url=server_url,
@@ -346,6 +433,9 @@ class VideoDownloaderClient:
                 logger.info(f"Estado cargado: {len(self.active_playlists)} playlists activas")
             except Exception as e:
                 logger.error(f"Error al cargar el estado: {e}")
+        
+        # Publicar el estado para la API (instantánea copy-on-write)
+        get_sync_state().publish_client(self)
     
     def save_state(self):
         """Guarda el estado actual del cliente"""
@@ -364,16 +454,59 @@ class VideoDownloaderClient:
             logger.debug("Estado guardado correctamente")
         except Exception as e:
             logger.error(f"Error al guardar el estado: {e}")
+        
+        get_sync_state().publish_client(self)
+    
+    async def _send_download_request(self, video_url, auth_headers):
+        """Abre la descarga en streaming de un video con los headers de autenticación"""
+        client = get_async_client()
+        request = client.build_request("GET", video_url, headers=auth_headers, timeout=120)
+        return await client.send(request, stream=True)
+    
+    def _save_playlist_file(self, playlist):
+        """Guarda la información de la playlist en el directorio principal"""
+        playlist_file = os.path.join(self.download_path, f"playlist_{playlist['id']}.json")
+        with open(playlist_file, "w") as f:
+            json.dump(playlist, f, indent=4)
+    
+    def _existing_video_size(self, video_id, video_path):
+        """
+        Tamaño del video si ya está en disco (0 si no existe o está vacío).
+        Si falta en el manifiesto se registra sin hash; el verificador lo calculará.
+        """
+        if not os.path.exists(video_path):
+            return 0
+        size = os.path.getsize(video_path)
+        if size > 0 and self.manifest.get(video_id) is None:
+            self.manifest.record(video_id, size)
+        return size
     
-    def download_playlist(self, playlist):
-        """Descarga una playlist y sus videos directamente en el directorio principal"""
+    def _finish_download(self, video_id, temp_path, video_path, downloaded, content_hash):
+        """Comprueba el archivo descargado, lo mueve a su destino y lo registra en el manifiesto"""
+        if os.path.getsize(temp_path) == 0:
+            logger.error(f"Error: El archivo descargado está vacío")
+            raise Exception("Archivo vacío")
+        os.rename(temp_path, video_path)
+        self.manifest.record(video_id, downloaded, content_hash)
+    
+    @staticmethod
+    def _remove_temp_file(temp_path):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    async def download_playlist(self, playlist):
+        """
+        Descarga una playlist y sus videos directamente en el directorio principal
+
+        Las lecturas de red son asíncronas; todo el trabajo de disco (escrituras,
+        hash, renombrar, manifiesto y m3u) se hace en hilos para que la API, los
+        WebSocket y la vista en directo no se detengan mientras se escribe en la SD.
+        """
         playlist_id = str(playlist["id"])
         logger.info(f"Descargando playlist {playlist_id}: {playlist['title']}")
         
         # Guardar información de la playlist en el directorio principal
-        playlist_file = os.path.join(self.download_path, f"playlist_{playlist_id}.json")
-        with open(playlist_file, "w") as f:
-            json.dump(playlist, f, indent=4)
+        await asyncio.to_thread(self._save_playlist_file, playlist)
         
         # Descargar videos directamente en el directorio principal
         for video in playlist.get("videos", []):
@@ -382,8 +515,10 @@ class VideoDownloaderClient:
             video_path = os.path.join(self.download_path, video_filename)
             
             # Si el video ya existe y tiene tamaño mayor que cero, omitir descarga
-            if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
+            existing_size = await asyncio.to_thread(self._existing_video_size, video_id, video_path)
+            if existing_size > 0:
                 logger.debug(f"Video {video_id} ya existe, omitiendo descarga")
+                self._report_progress("video_skipped", video_id, existing_size)
                 continue
             
             # Descargar el video
@@ -393,104 +528,95 @@ class VideoDownloaderClient:
                 
                 logger.info(f"Descargando video {video_id}: {video['title']} desde {video_url}")
                 
-                # Crear una sesión para mantener las cookies
-                session = requests.Session()
-                
-                # Obtener headers de autenticación
-                auth_headers = self.auth_manager.get_auth_headers()
-                
-                # Si hay una cookie en los headers, añadirla a la sesión
-                if "Cookie" in auth_headers:
-                    cookie_header = auth_headers["Cookie"]
-                    # Parsear las cookies del header y añadirlas a la sesión
-                    for cookie_pair in cookie_header.split("; "):
-                        if "=" in cookie_pair:
-                            name, value = cookie_pair.split("=", 1)
-                            session.cookies.set(name, value)
+                # Obtener headers de autenticación (la cookie va en el header Cookie)
+                auth_headers = await self.auth_manager.get_auth_headers_async()
                 
                 # Log para depuración
-                logger.debug(f"Cookies para descarga: {dict(session.cookies)}")
                 logger.debug(f"Headers para descarga: {auth_headers}")
                 
-                # Realizar la descarga con la sesión que tiene las cookies
-                response = session.get(
-                    video_url,
-                    headers=auth_headers,
-                    stream=True,
-                    timeout=120
-                )
+                # Realizar la descarga en streaming con el cliente HTTP compartido
+                response = await self._send_download_request(video_url, auth_headers)
                 
                 # Si falla, intentar renovar el token una vez
                 if response.status_code != 200:
                     logger.info(f"Fallo en descarga (status {response.status_code}). Renovando token...")
+                    await response.aclose()
                     # Forzar renovación del token
                     self.auth_manager.token_data = None
-                    auth_headers = self.auth_manager.get_auth_headers()
-                    
-                    # Actualizar cookies en la sesión
-                    session.cookies.clear()
-                    if "Cookie" in auth_headers:
-                        cookie_header = auth_headers["Cookie"]
-                        for cookie_pair in cookie_header.split("; "):
-                            if "=" in cookie_pair:
-                                name, value = cookie_pair.split("=", 1)
-                                session.cookies.set(name, value)
+                    auth_headers = await self.auth_manager.get_auth_headers_async()
                     
                     # Intentar de nuevo
-                    response = session.get(
-                        video_url,
-                        headers=auth_headers,
-                        stream=True,
-                        timeout=120
-                    )
-                
-                # Verificar si finalmente tuvimos éxito
-                response.raise_for_status()
-                
-                # Obtener más información para depuración
-                logger.debug(f"Headers de respuesta: {dict(response.headers)}")
-                logger.debug(f"Content-Type: {response.headers.get('Content-Type')}")
-                logger.debug(f"Content-Length: {response.headers.get('Content-Length')}")
-                
-                total_size = int(response.headers.get('content-length', 0))
+                    response = await self._send_download_request(video_url, auth_headers)
                 
-                # Crear archivo temporal para la descarga
-                temp_path = f"{video_path}.tmp"
-                
-                # Descargar en chunks para archivos grandes
-                downloaded = 0
-                with open(temp_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            # Mostrar progreso cada 5%
-                            if total_size > 0 and downloaded % (total_size // 20) < 8192:
-                                progress = (downloaded / total_size) * 100
-                                logger.info(f"Progreso de descarga {video_id}: {progress:.1f}%")
-                
-                # Verificar que el archivo se descargó correctamente
-                if os.path.getsize(temp_path) == 0:
-                    logger.error(f"Error: El archivo descargado está vacío")
-                    raise Exception("Archivo vacío")
+                try:
+                    # Verificar si finalmente tuvimos éxito
+                    response.raise_for_status()
                     
-                # Mover archivo temporal a destino final
-                os.rename(temp_path, video_path)
+                    # Obtener más información para depuración
+                    logger.debug(f"Headers de respuesta: {dict(response.headers)}")
+                    logger.debug(f"Content-Type: {response.headers.get('Content-Type')}")
+                    logger.debug(f"Content-Length: {response.headers.get('Content-Length')}")
+                    
+                    total_size = int(response.headers.get('content-length', 0))
+                    self._report_progress("video_started", video_id, total_size)
+                    
+                    # Crear archivo temporal para la descarga
+                    temp_path = f"{video_path}.tmp"
+                    
+                    # Descargar en chunks para archivos grandes; se acumulan hasta
+                    # DOWNLOAD_WRITE_BUFFER bytes y cada bloque se escribe y se suma al hash en un hilo
+                    downloaded = 0
+                    content_hash = new_content_hash()
+                    buffer = bytearray()
+                    f = await asyncio.to_thread(open, temp_path, 'wb')
+                    try:
+                        async for chunk in response.aiter_bytes(chunk_size=8192):
+                            if chunk:
+                                buffer += chunk
+                                downloaded += len(chunk)
+                                self._report_progress("advance", video_id, len(chunk))
+                                if len(buffer) >= DOWNLOAD_WRITE_BUFFER:
+                                    block, buffer = buffer, bytearray()
+                                    await asyncio.to_thread(write_block, f, content_hash, block)
+                                
+                                # Mostrar progreso cada 5%
+                                if total_size > 0 and downloaded % (total_size // 20) < 8192:
+                                    progress = (downloaded / total_size) * 100
+                                    logger.info(f"Progreso de descarga {video_id}: {progress:.1f}%")
+                        if buffer:
+                            await asyncio.to_thread(write_block, f, content_hash, buffer)
+                    finally:
+                        await asyncio.to_thread(f.close)
+                finally:
+                    await response.aclose()
+                
+                # Verificar el archivo, moverlo a su destino y registrarlo en el manifiesto
+                await asyncio.to_thread(
+                    self._finish_download, video_id, temp_path, video_path, downloaded, content_hash.hexdigest()
+                )
+                self._report_progress("video_finished", video_id, downloaded)
                 logger.info(f"Video {video_id} descargado correctamente")
                 
                 # Marcar que se detectaron cambios
                 self.changes_detected = True
             
+            except asyncio.CancelledError:
+                # Trabajo cancelado: no dejar la descarga a medias en disco
+                logger.info(f"Descarga del video {video_id} cancelada")
+                self._report_progress("video_failed", video_id, "descarga cancelada")
+                # Sin await: una segunda cancelación no debe dejar el temporal en disco
+                self._remove_temp_file(f"{video_path}.tmp")
+                raise
+            
             except Exception as e:
                 logger.error(f"Error al descargar video {video_id}: {e}")
                 logger.error(traceback.format_exc())
+                self._report_progress("video_failed", video_id, e)
                 # Eliminar archivo temporal si existe
-                if os.path.exists(f"{video_path}.tmp"):
-                    os.remove(f"{video_path}.tmp")
+                await asyncio.to_thread(self._remove_temp_file, f"{video_path}.tmp")
         
         # Crear archivo m3u para la playlist directamente en el directorio principal
-        self.create_m3u_playlist(playlist)
+        await asyncio.to_thread(self.create_m3u_playlist, playlist)
         
         logger.info(f"Playlist {playlist_id} descargada correctamente")
     
@@ -567,7 +693,12 @@ class VideoDownloaderClient:
             logger.warning(f"No se encontraron videos válidos para crear el archivo m3u principal")
     
     async def restart_videoloop_service(self):
-        """Reinicia el servicio de reproducción de video"""
+        """
+        Reinicia el servicio de reproducción de video
+        
+        Returns:
+            bool: True si el servicio se reinició correctamente
+        """
         service_name = get_active_service()
         if not service_name:
             logger.warning("No se detectó ningún servicio activo y habilitado")
@@ -581,7 +712,7 @@ class VideoDownloaderClient:
 
             if check_result.returncode == 4:  # 4 indica que el servicio no existe
                 logger.warning(f"El servicio {service_name} no existe")
-                return
+                return False
 
             # Reiniciar el servicio
             restart_cmd = ["sudo", "systemctl", "restart", service_name]
@@ -589,6 +720,7 @@ class VideoDownloaderClient:
 
             if restart_result.returncode == 0:
                 logger.info(f"Servicio {service_name} reiniciado correctamente")
+                return True
             else:
                 error = restart_result.stderr.decode('utf-8', errors='ignore')
                 logger.error(f"Error al reiniciar el servicio: {error}")
@@ -601,6 +733,47 @@ class VideoDownloaderClient:
 
         except Exception as e:
             logger.error(f"Error al intentar reiniciar el servicio: {e}")
+        return False
+    
+    async def start_cached_playback(self):
+        """
+        Arranca el reproductor con el contenido ya descargado, sin esperar al servidor
+        
+        Returns:
+            bool: True si el servicio de reproducción quedó activo con contenido en caché
+        """
+        m3u_path = os.path.join(self.download_path, "playlist.m3u")
+        
+        # Regenerar la playlist principal solo con los videos que existen en disco
+        if self.active_playlists:
+            await asyncio.to_thread(self.create_main_m3u_playlist)
+        
+        cached_videos = []
+        if os.path.exists(m3u_path):
+            with open(m3u_path, "r") as f:
+                cached_videos = [line.strip() for line in f if line.strip() and os.path.exists(line.strip())]
+        
+        if not cached_videos:
+            logger.info("No hay contenido en caché para reproducir, se esperará a la primera sincronización")
+            return False
+        
+        service_name = await asyncio.to_thread(get_active_service)
+        if service_name:
+            logger.info(f"Servicio {service_name} ya activo con {len(cached_videos)} videos en caché")
+            return True
+        
+        service_name = self.service_name
+        logger.info(f"Iniciando servicio {service_name} con {len(cached_videos)} videos en caché")
+        process = await asyncio.create_subprocess_exec(
+            "sudo", "systemctl", "start", service_name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            logger.error(f"Error al iniciar el servicio {service_name}: {stderr.decode('utf-8', errors='ignore')}")
+            return False
+        return True
     
     def remove_playlist(self, playlist_id):
         """Elimina una playlist expirada del estado (pero mantiene los archivos de video)"""
@@ -625,10 +798,31 @@ class VideoDownloaderClient:
         
         # Actualizar el archivo m3u principal para reflejar las playlists activas
         self.create_main_m3u_playlist()
+        get_sync_state().publish_client(self)
 
+    def _report_progress(self, event, *args):
+        """Envía un evento de progreso a /sync/progress y al trabajo de /sync/force-update en curso"""
+        getattr(get_download_progress(), event)(*args)
+        job = current_sync_job()
+        if job:
+            getattr(job, event)(*args)
+    
     async def check_for_updates(self):
-        """Verifica si hay actualizaciones en las playlists asignadas a este dispositivo"""
+        """
+        Verifica si hay actualizaciones en las playlists asignadas a este dispositivo.
+        El bucle principal y la API comparten el lock de SyncState, así que nunca
+        se ejecutan dos sincronizaciones a la vez.
+        """
+        async with get_sync_state().sync_lock:
+            try:
+                return await self._check_for_updates()
+            finally:
+                get_download_progress().set_phase("idle")
+
+    async def _check_for_updates(self):
         logger.info("Verificando actualizaciones de playlists...")
+        job = current_sync_job()
+        self._report_progress("set_phase", "checking")
         
         # Resetear flag de cambios
         self.changes_detected = False
@@ -656,11 +850,10 @@ class VideoDownloaderClient:
             
             try:
                 # Obtener headers de autenticación
-                auth_headers = self.auth_manager.get_auth_headers()
+                auth_headers = await self.auth_manager.get_auth_headers_async()
                 
-                # Usar asyncio.to_thread para hacer la petición HTTP de forma asíncrona
-                response = await asyncio.to_thread(
-                    requests.get,
+                # Petición HTTP asíncrona con el cliente compartido (conexiones keep-alive)
+                response = await get_async_client().get(
                     endpoint_url,
                     params=params,
                     headers=auth_headers,
@@ -669,6 +862,8 @@ class VideoDownloaderClient:
                 
                 if response.status_code != 200:
                     logger.error(f"Error al obtener actualizaciones: {response.status_code} - {response.text}")
+                    if job:
+                        job.error = f"El servidor respondió {response.status_code}"
                     return False
                 
                 # Procesar playlists activas
@@ -716,13 +911,23 @@ class VideoDownloaderClient:
                 if changes_detected:
                     logger.info("Se detectaron cambios. Borrando todos los archivos y descargando de nuevo...")
                     
+                    # Olvidar el estado antes de borrar: si la sincronización se cancela o falla
+                    # a medias, la siguiente verá cambios y volverá a descargar todo
+                    self.active_playlists = {}
+                    self.last_update = None
+                    get_sync_state().publish_client(self)
+                    
                     # Borrar todos los archivos en el directorio de descargas excepto token.json
+                    self._report_progress("set_phase", "clearing")
                     await self.clear_download_directory()
                     
                     # Descargar todas las playlists activas
+                    self._report_progress("plan", active_playlists)
+                    self._report_progress("set_phase", "downloading")
                     for playlist in active_playlists:
-                        await asyncio.to_thread(self.download_playlist, playlist)
+                        await self.download_playlist(playlist)
                     
+                    self._report_progress("set_phase", "saving")
                     # Actualizar lista de playlists activas
                     self.active_playlists = {str(p["id"]): p for p in active_playlists}
                     self.last_update = datetime.now().isoformat()
@@ -741,6 +946,8 @@ class VideoDownloaderClient:
             except Exception as e:
                 logger.error(f"Error al comunicarse con el servidor: {e}")
                 logger.error(traceback.format_exc())
+                if job:
+                    job.error = str(e)
                 return False
         
         except Exception as e:
@@ -748,6 +955,16 @@ class VideoDownloaderClient:
             logger.error(traceback.format_exc())
             return False
 
+    async def check_for_updates_once(self):
+        """
+        Ejecuta check_for_updates y cierra las conexiones HTTP al terminar.
+        Pensado para asyncio.run() en el modo de sincronización simple.
+        """
+        try:
+            return await self.check_for_updates()
+        finally:
+            await close_async_clients()
+
     async def clear_download_directory(self):
         """Borra todos los archivos del directorio de descargas excepto token.json"""
         try:
@@ -775,6 +992,9 @@ class VideoDownloaderClient:
         except Exception as e:
             logger.error(f"Error al limpiar el directorio de descargas: {e}")
             logger.error(traceback.format_exc())
+        
+        # Rehacer el manifiesto con lo que haya quedado en disco
+        await asyncio.to_thread(self.manifest.rebuild)
 
 # Función para crear el cliente de sincronización
 def create_sync_client():
@@ -805,6 +1025,19 @@ def create_sync_client():
     
     return client
 
+async def get_shared_sync_client():
+    """
+    Cliente de sincronización del proceso. Lo crea y carga su estado la primera vez,
+    lo pida el arranque o la API; las llamadas siguientes devuelven el mismo cliente.
+    """
+    state = get_sync_state()
+    async with state.client_lock:
+        if state.client is None:
+            client = await asyncio.to_thread(create_sync_client)
+            # load_state publica el cliente en SyncState (state.client)
+            await asyncio.to_thread(client.load_state)
+    return state.client
+
 # Crear la aplicación FastAPI
 app = FastAPI()
 
@@ -813,6 +1046,10 @@ app.include_router(log.router)
 app.include_router(screenshot.router)
 app.include_router(service_router.router)
 
+# Campos de video que /sync/list-playlists puede devolver (parámetro fields)
+VIDEO_FIELDS = ("id", "title", "downloaded", "size", "hash", "downloaded_at")
+DEFAULT_VIDEO_FIELDS = ("id", "title", "downloaded", "size")
+
 # Crear un router para la funcionalidad del cliente de sincronización
 def create_sync_router(verify_ssl=None):
     """Crea y configura el router de sincronización con soporte SSL"""
@@ -823,69 +1060,143 @@ def create_sync_router(verify_ssl=None):
     
     verify_ssl = VERIFY_SSL if verify_ssl is None else verify_ssl
     
+    async def get_snapshot():
+        """Instantánea del estado de sincronización (sin leer disco salvo la primera vez)"""
+        snapshot = get_sync_state().snapshot()
+        if not snapshot.loaded:
+            await get_shared_sync_client()
+            snapshot = get_sync_state().snapshot()
+        return snapshot
+    
     @sync_router.get("/status")
     async def sync_status():
         """Obtiene el estado actual de la sincronización"""
-        device_id = get_device_id()
-        
-        # Crear el cliente con los parámetros corregidos
-        client = create_sync_client()
-        client.load_state()
-        
-        # Contar número de playlists y videos
-        total_videos = 0
-        for playlist_id, playlist in client.active_playlists.items():
-            total_videos += len(playlist.get("videos", []))
+        snapshot = await get_snapshot()
         
         return {
-            "device_id": device_id,
-            "active_playlists": len(client.active_playlists),
-            "total_videos": total_videos,
-            "last_update": client.last_update,
-            "download_path": client.download_path,
-            "service_name": client.service_name,
-            "verify_ssl": verify_ssl
+            "device_id": snapshot.device_id,
+            "active_playlists": len(snapshot.active_playlists),
+            "total_videos": snapshot.total_videos,
+            "last_update": snapshot.last_update,
+            "download_path": snapshot.download_path,
+            "service_name": snapshot.service_name,
+            "state_version": snapshot.version,
+            "verify_ssl": verify_ssl,
+            "boot": BOOT_METRICS
         }
 
-    @sync_router.post("/force-update")
-    async def force_sync_update():
-        """Fuerza una actualización de la sincronización"""
-        device_id = get_device_id()
-        
-        # Crear el cliente con los parámetros corregidos
-        client = create_sync_client()
-        client.load_state()
+    @sync_router.post("/force-update", status_code=202)
+    async def force_sync_update(
+        response: Response,
+        wait: bool = Query(False, description="Esperar a que termine la sincronización (comportamiento anterior)")
+    ):
+        """
+        Lanza una sincronización en segundo plano y devuelve su ID de trabajo.
+        El progreso se consulta en GET /sync/jobs/{id}.
+        """
+        client = await get_shared_sync_client()
+        job, created = get_sync_jobs().submit(client)
         
-        changes = await client.check_for_updates()
+        if wait:
+            await asyncio.wait({job.task})
+            if job.task.cancelled():
+                raise HTTPException(status_code=409, detail={
+                    "status": "cancelled", "error": job.error or "Sincronización cancelada", "job_id": job.id
+                })
+            if job.status != "succeeded":
+                raise HTTPException(status_code=500, detail={
+                    "status": job.status, "error": job.error, "job_id": job.id
+                })
+            response.status_code = 200
+            result = job.result or {}
+            if result.get("changes"):
+                return {"status": "updated", "message": "Se detectaron cambios y se reinició el servicio", "job_id": job.id}
+            return {"status": "no_changes", "message": "No se detectaron cambios", "job_id": job.id}
         
-        if changes:
-            await client.restart_videoloop_service()
-            return {"status": "updated", "message": "Se detectaron cambios y se reinició el servicio"}
-        else:
-            return {"status": "no_changes", "message": "No se detectaron cambios"}
+        return {
+            "job_id": job.id,
+            "created": created,
+            "status": job.status,
+            "url": f"/sync/jobs/{job.id}"
+        }
+    
+    @sync_router.get("/jobs")
+    async def list_sync_jobs():
+        """Trabajo de sincronización activo y los últimos terminados"""
+        return {"jobs": [job.to_dict() for job in get_sync_jobs().list()]}
+    
+    @sync_router.get("/jobs/{job_id}")
+    async def get_sync_job(job_id: str):
+        """Fase, bytes descargados y pendientes y tiempo estimado de un trabajo"""
+        job = get_sync_jobs().get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+        return job.to_dict()
+    
+    @sync_router.post("/jobs/{job_id}/cancel", status_code=202)
+    async def cancel_sync_job(job_id: str):
+        """Cancela un trabajo de sincronización; la descarga en curso se interrumpe"""
+        try:
+            job = get_sync_jobs().cancel(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+        return job.to_dict()
 
+    @sync_router.get("/progress")
+    async def sync_progress(once: bool = Query(False, description="Devolver una sola instantánea en JSON")):
+        """
+        Progreso de las descargas como Server-Sent Events: bytes por video, velocidad
+        instantánea y media y videos en cola, a ritmo fijo (SYNC_PROGRESS_RATE)
+        """
+        progress = get_download_progress()
+        if once:
+            return progress.snapshot()
+        return StreamingResponse(
+            progress.events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
     @sync_router.get("/list-playlists")
-    async def list_sync_playlists():
-        """Lista las playlists sincronizadas actualmente"""
-        device_id = get_device_id()
+    async def list_sync_playlists(
+        limit: Optional[int] = Query(None, ge=1, description="Máximo de playlists a devolver"),
+        offset: int = Query(0, ge=0, description="Playlists a omitir"),
+        fields: Optional[str] = Query(None, description="Campos de cada video separados por comas")
+    ):
+        """Lista las playlists sincronizadas actualmente (desde el manifiesto, sin acceder al disco)"""
+        if fields:
+            video_fields = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in video_fields if field not in VIDEO_FIELDS]
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Campos no válidos: {', '.join(unknown)}. Disponibles: {', '.join(VIDEO_FIELDS)}"
+                )
+        else:
+            video_fields = DEFAULT_VIDEO_FIELDS
+        
+        snapshot = await get_snapshot()
+        manifest = get_content_manifest(snapshot.download_path)
         
-        # Crear el cliente con los parámetros corregidos
-        client = create_sync_client()
-        client.load_state()
+        all_playlists = list(snapshot.active_playlists.values())
+        page = all_playlists[offset:offset + limit if limit else None]
         
         playlists = []
-        for playlist_id, playlist in client.active_playlists.items():
+        for playlist in page:
             videos = []
             for video in playlist.get("videos", []):
-                video_id = str(video["id"])
-                video_path = os.path.join(client.download_path, f"{video_id}.mp4")
-                video_exists = os.path.exists(video_path)
-                videos.append({
+                entry = manifest.get(video["id"]) or {}
+                values = {
                     "id": video["id"],
                     "title": video["title"],
-                    "downloaded": video_exists,
-                    "size": os.path.getsize(video_path) if video_exists else 0
-                })
+                    "downloaded": bool(entry),
+                    "size": entry.get("size", 0),
+                    "hash": entry.get("hash"),
+                    "downloaded_at": entry.get("downloaded_at")
+                }
+                videos.append({field: values[field] for field in video_fields})
                 
             playlists.append({
                 "id": playlist["id"],
@@ -895,10 +1206,13 @@ def create_sync_router(verify_ssl=None):
             })
         
         return {
-            "device_id": device_id,
-            "playlists_count": len(playlists),
+            "device_id": snapshot.device_id,
+            "playlists_count": len(all_playlists),
+            "offset": offset,
+            "limit": limit,
             "playlists": playlists,
-            "download_path": client.download_path,
+            "download_path": snapshot.download_path,
+            "manifest": manifest.stats(),
             "verify_ssl": verify_ssl
         }
     
@@ -930,71 +1244,6 @@ def create_app(verify_ssl=None):
     
     return app
 
-# Función para manejar conexiones WebSocket
-async def websocket_handler(websocket, path):
-    """Maneja la conexión WebSocket para streaming de logs."""
-    logger.info(f"Cliente conectado vía WebSocket desde {websocket.remote_address}")
-    tail_task = None
-
-    try:
-        # Función para leer el archivo de log en tiempo real
-        async def tail_log():
-            try:
-                with open('raspberry_client.log', 'r') as f:
-                    f.seek(0, 2)  # Ir al final del archivo
-                    while True:
-                        line = f.readline()
-                        if line:
-                            try:
-                                # Enviar en formato JSON para mayor compatibilidad
-                                log_entry = {
-                                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                    "content": line.strip()
-                                }
-                                
-                                # Extraer ID del dispositivo si está disponible
-                                device_match = re.search(r'Device\[(\w+)\]', line)
-                                if device_match:
-                                    log_entry["device_id"] = device_match.group(1)
-                                
-                                await websocket.send(json.dumps(log_entry))
-                            except Exception as e:
-                                logger.error(f"Error al procesar línea de log: {str(e)}")
-                        await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Error en tail_log: {str(e)}")
-
-        # Ejecutar la función de lectura de logs en segundo plano
-        tail_task = asyncio.create_task(tail_log())
-
-        # Mantener la conexión WebSocket abierta
-        while True:
-            try:
-                # Escuchar mensajes del cliente
-                message = await websocket.recv()
-                try:
-                    data = json.loads(message)
-                    if isinstance(data, dict) and data.get("action") == "filter":
-                        logger.info(f"Recibido filtro: {data}")
-                except:
-                    pass  # Ignorar mensajes que no sean JSON válido
-            except websockets.ConnectionClosed:
-                break
-            except Exception as e:
-                logger.error(f"Error al recibir mensaje: {str(e)}")
-                break
-
-    except Exception as e:
-        logger.error(f"Error en websocket_handler: {str(e)}")
-    finally:
-        if tail_task:
-            tail_task.cancel()
-            try:
-                await tail_task
-            except asyncio.CancelledError:
-                pass
-        logger.info("Conexión WebSocket cerrada")
-
 # Función principal asíncrona
 async def main(username, password, verify_ssl=None):
     """
@@ -1011,45 +1260,113 @@ async def main(username, password, verify_ssl=None):
         logger.info(f"Intervalo de verificación configurado: {CHECK_INTERVAL} minutos")
         logger.info(f"Verificación SSL: {'Activada' if verify_ssl else 'Desactivada'}")
         
-        # Obtener el ID del dispositivo
-        device_id = get_device_id()
-        logger.info(f"ID del dispositivo: {device_id}")
+        # Recargar los rangos de tiendas al recibir SIGHUP
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_store_index)
+        except (NotImplementedError, AttributeError):
+            logger.debug("SIGHUP no disponible, la configuración de tiendas no se recargará en caliente")
         
-        # Crear la aplicación FastAPI
-        app = create_app(verify_ssl)
+        # Registro del dispositivo en segundo plano para no retrasar la primera sincronización
+        registration = RegistrationTask(verify_ssl=verify_ssl)
+        sync_client = None
+        server = None
+        api_server_task = None
         
-        # Crear cliente con autenticación correcta
-        sync_client = create_sync_client()
-        sync_client.load_state()
+        async def load_state():
+            """Crea el cliente de sincronización y carga el estado guardado (o reutiliza el de la API)"""
+            nonlocal sync_client
+            sync_client = await get_shared_sync_client()
+            logger.info(f"ID del dispositivo: {sync_client.device_id}")
         
-        # Iniciar servidor WebSocket
-        websocket_server = await websockets.serve(websocket_handler, "0.0.0.0", 8001)
-        logger.info("Iniciando servidor WebSocket en ws://0.0.0.0:8001")
+        async def start_player():
+            """Arranca la reproducción con el contenido en caché"""
+            # Con el lock de sincronización, un /sync/force-update no puede borrar la caché mientras tanto
+            # Un fallo aquí no debe impedir la primera sincronización, que depende de este paso
+            try:
+                async with get_sync_state().sync_lock:
+                    started = await sync_client.start_cached_playback()
+            except Exception as e:
+                logger.error(f"Error al arrancar la reproducción en caché: {e}")
+                return
+            if started:
+                mark_boot_milestone("first_frame")
         
-        # Iniciar servidor API usando uvicorn como tarea asíncrona
-        config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
-        server = uvicorn.Server(config)
-        api_server_task = asyncio.create_task(server.serve())
-        logger.info("Iniciando servidor API en http://0.0.0.0:8000")
+        async def start_api():
+            """Inicia el servidor API y espera a que acepte conexiones"""
+            nonlocal server, api_server_task
+            app = create_app(verify_ssl)
+            # El WebSocket de logs (/api/logs/ws) se sirve en este mismo servidor
+            config = uvicorn.Config(
+                app,
+                host="0.0.0.0",
+                port=8000,
+                log_level="info",
+                ws_per_message_deflate=LOG_WS_COMPRESSION,
+                ws_ping_interval=LOG_WS_PING_INTERVAL or None,
+                ws_ping_timeout=LOG_WS_PING_TIMEOUT or None
+            )
+            server = uvicorn.Server(config)
+            api_server_task = asyncio.create_task(server.serve())
+            logger.info("Iniciando servidor API en http://0.0.0.0:8000")
+            while not server.started:
+                if server.should_exit:
+                    raise RuntimeError("El servidor API se detuvo durante el arranque")
+                await asyncio.sleep(0.05)
+            mark_boot_milestone("api_ready")
         
-        # Intentar registrar el dispositivo
-        is_registered = await asyncio.to_thread(register_device, verify_ssl=verify_ssl)
+        async def start_websocket():
+            """Inicia el servidor WebSocket de logs de compatibilidad (puerto 8001, LOG_WS_LEGACY_PORT=0 lo desactiva)"""
+            await start_legacy_server()
         
-        if not is_registered:
-            logger.error("No se pudo registrar el dispositivo, reintentando en 30 segundos")
-            await asyncio.sleep(30)
-            is_registered = await asyncio.to_thread(register_device, verify_ssl=verify_ssl)
+        async def start_registration():
+            registration.start()
+        
+        async def probe_screen_capture():
+            """Prueba las herramientas de captura de pantalla una vez al arrancar"""
+            await asyncio.to_thread(probe_capture_backends)
+        
+        async def start_manifest_verifier():
+            """Inicia la verificación periódica del manifiesto de contenido contra el disco"""
+            sync_client.manifest.start()
+        
+        async def start_screen_health():
+            """Inicia la vigilancia de pantalla negra o congelada"""
+            if SCREEN_HEALTH_ENABLED:
+                get_screen_health_monitor().start()
+        
+        async def start_log_shipper():
+            """Inicia el envío de logs al servidor central si está configurado"""
+            if start_log_shipping(verify_ssl=verify_ssl):
+                logger.info(f"Envío de logs activado hacia {LOG_SHIP_URL}")
+        
+        async def first_sync():
+            """Verificación inicial de playlists"""
+            logger.info("Realizando verificación inicial de playlists...")
+            changes_detected = await sync_client.check_for_updates()
+            mark_boot_milestone("first_sync")
             
-            if not is_registered:
-                logger.error("Fallo al registrar el dispositivo después de reintentos. Continuando de todos modos.")
+            # Si se detectaron cambios en la verificación inicial, reiniciar servicio
+            if changes_detected and await sync_client.restart_videoloop_service():
+                mark_boot_milestone("first_frame")
         
-        # Verificación inicial de playlists
-        logger.info("Realizando verificación inicial de playlists...")
-        changes_detected = await sync_client.check_for_updates()
+        # Los pasos independientes arrancan en paralelo; el reproductor no espera al servidor
+        startup = StartupGraph()
+        startup.add("state", load_state)
+        startup.add("player", start_player, deps=["state"])
+        startup.add("api", start_api)
+        startup.add("websocket", start_websocket)
+        startup.add("registration", start_registration)
+        startup.add("log_shipper", start_log_shipper)
+        startup.add("screen_probe", probe_screen_capture)
+        startup.add("screen_health", start_screen_health, deps=["screen_probe"])
+        # La primera sincronización puede borrar el contenido en caché: espera a que el reproductor arranque
+        startup.add("first_sync", first_sync, deps=["state", "player"])
+        startup.add("manifest", start_manifest_verifier, deps=["state"])
+        results = await startup.run()
         
-        # Si se detectaron cambios en la verificación inicial, reiniciar servicio
-        if changes_detected:
-            await sync_client.restart_videoloop_service()
+        if isinstance(results["state"], Exception):
+            raise results["state"]
+        logger.info(f"Métricas de arranque: {BOOT_METRICS}")
         
         # Configurar intervalos de actualización
         update_status_interval = 300  # segundos - 5 minutos
@@ -1070,7 +1387,7 @@ async def main(username, password, verify_ssl=None):
             current_time = time.time()
             
             # Tareas de actualización de estado
-            success = await asyncio.to_thread(update_status, verify_ssl=verify_ssl)
+            success = await update_status_async(verify_ssl=verify_ssl)
             
             if success:
                 consecutive_failures = 0
@@ -1080,7 +1397,7 @@ async def main(username, password, verify_ssl=None):
                 
                 if consecutive_failures >= max_failures:
                     logger.error("Demasiados fallos consecutivos, se reiniciará el proceso de registro")
-                    is_registered = await asyncio.to_thread(register_device, verify_ssl=verify_ssl)
+                    registration.request(force=True)
                     consecutive_failures = 0
             
             # Verificar si es momento de sincronizar videos
@@ -1107,6 +1424,11 @@ async def main(username, password, verify_ssl=None):
         logger.critical(f"Error crítico: {str(e)}")
         logger.error(traceback.format_exc())
         raise
+    finally:
+        shipper = get_log_shipper()
+        if shipper:
+            await shipper.stop()
+        await close_async_clients()
 
 # Función para ejecutar en modo sincronización simple
 def run_sync_only_mode(username, password, verify_ssl=None):
@@ -1144,7 +1466,7 @@ def run_sync_only_mode(username, password, verify_ssl=None):
             elapsed_time = current_time - last_sync_time
             if elapsed_time >= sync_check_interval or last_sync_time == 0:
                 print(f"Han pasado {elapsed_time:.1f} segundos desde la última sincronización. Verificando actualizaciones...")
-                changes_detected = asyncio.run(client.check_for_updates())
+                changes_detected = asyncio.run(client.check_for_updates_once())
                 
                 if changes_detected:
                     asyncio.run(client.restart_videoloop_service())
@@ -0,0 +1,132 @@
+"""
+Ejecutor acotado para trabajo bloqueante lanzado desde el bucle de eventos.
+
+asyncio.to_thread usa el ejecutor por defecto, que admite cualquier número
+de tareas: una ráfaga de peticiones de captura de pantalla podía ocupar
+todos sus hilos (que también usan las rutas de sincronización y de logs) y
+competir por la CPU con la reproducción. BoundedExecutor tiene sus propios
+hilos, un máximo de trabajos pendientes (los que exceden se rechazan con
+ExecutorBusy en lugar de acumularse) y un tiempo máximo de espera por
+trabajo (ExecutorTimeout).
+
+Un trabajo que supera el tiempo máximo no se puede interrumpir: sigue
+ocupando su hilo hasta terminar y cuenta como pendiente mientras tanto,
+así que el límite de trabajos refleja siempre los hilos realmente ocupados.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+
+# Configuración del ejecutor de capturas de pantalla
+SCREENSHOT_WORKERS = int(os.getenv("SCREENSHOT_WORKERS", "1"))  # Hilos para capturar y codificar
+SCREENSHOT_MAX_PENDING = int(os.getenv("SCREENSHOT_MAX_PENDING", "4"))  # Trabajos en curso o en cola
+SCREENSHOT_JOB_TIMEOUT = float(os.getenv("SCREENSHOT_JOB_TIMEOUT", "15"))  # Segundos máximos por trabajo
+
+
+class ExecutorBusy(Exception):
+    """El ejecutor ya tiene el máximo de trabajos pendientes"""
+
+
+class ExecutorTimeout(TimeoutError):
+    """Un trabajo superó el tiempo máximo de espera"""
+
+
+class BoundedExecutor:
+    """Grupo de hilos con límite de trabajos pendientes y tiempo máximo por trabajo"""
+
+    def __init__(self, name, workers, max_pending, timeout):
+        """
+        Args:
+            name: Prefijo de los hilos
+            workers: Número de hilos
+            max_pending: Trabajos en curso o en cola admitidos
+            timeout: Segundos máximos que se espera a cada trabajo
+        """
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.timeout = timeout
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_queue_ms = 0.0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, func, *args, timeout=None):
+        """
+        Ejecuta func(*args) en un hilo del ejecutor y espera el resultado
+
+        Raises:
+            ExecutorBusy: Si ya hay max_pending trabajos pendientes
+            ExecutorTimeout: Si el trabajo no termina a tiempo
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name}: {self.pending} trabajos pendientes")
+            self.pending += 1
+            self.submitted += 1
+
+        queued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            self.max_queue_ms = max(self.max_queue_ms, (started - queued) * 1000)
+            try:
+                return func(*args)
+            finally:
+                self.total_ms += (time.perf_counter() - started) * 1000
+
+        future = self._executor.submit(job)
+        future.add_done_callback(self._done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ExecutorTimeout(f"{self.name}: el trabajo superó {timeout or self.timeout:.0f} s")
+
+    def shutdown(self, wait=True):
+        """
+        Detiene los hilos del ejecutor; los trabajos nuevos fallarán
+
+        Args:
+            wait: Esperar a que terminen los trabajos en curso (incluidos los vencidos)
+        """
+        self._executor.shutdown(wait=wait)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.total_ms / self.completed, 1) if self.completed else None,
+            "max_queue_ms": round(self.max_queue_ms, 1)
+        }
+
+
+_screenshot_executor = None
+
+
+def get_screenshot_executor():
+    """Devuelve el ejecutor de capturas y codificación de imágenes"""
+    global _screenshot_executor
+    if _screenshot_executor is None:
+        _screenshot_executor = BoundedExecutor(
+            "screenshot", SCREENSHOT_WORKERS, SCREENSHOT_MAX_PENDING, SCREENSHOT_JOB_TIMEOUT
+        )
+    return _screenshot_executor
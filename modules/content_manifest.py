@@ -0,0 +1,235 @@
+"""
+Manifiesto del contenido descargado.
+
+/sync/list-playlists hacía os.path.exists y os.path.getsize para cada video
+de cada playlist en cada llamada: con bibliotecas grandes, cientos de
+accesos a la tarjeta SD por cada refresco del panel. ContentManifest guarda
+por ID de video el tamaño, el hash (blake2b, calculado mientras se descarga)
+y la fecha de descarga en CONTENT_MANIFEST_FILE dentro del directorio de
+descargas, y la API responde desde memoria.
+
+El manifiesto se actualiza al terminar cada descarga. Un verificador en
+segundo plano (cada CONTENT_MANIFEST_VERIFY_INTERVAL segundos) comprueba
+contra el disco que cada archivo sigue existiendo con el tamaño esperado,
+calcula los hashes que falten (videos anteriores al manifiesto) y marca las
+entradas que ya no coinciden.
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración del manifiesto de contenido
+CONTENT_MANIFEST_FILE = os.getenv("CONTENT_MANIFEST_FILE", "content_manifest.json")  # Dentro de DOWNLOAD_PATH
+CONTENT_MANIFEST_VERIFY_INTERVAL = float(os.getenv("CONTENT_MANIFEST_VERIFY_INTERVAL", "900"))  # Segundos
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def new_content_hash():
+    """Hash incremental que se usa para el contenido descargado"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_file(path):
+    digest = new_content_hash()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentManifest:
+    """Índice en memoria (y en disco) de los videos descargados"""
+
+    def __init__(self, download_path, filename=CONTENT_MANIFEST_FILE):
+        """
+        Args:
+            download_path: Directorio de descargas
+            filename: Nombre del archivo del manifiesto dentro de download_path
+        """
+        self.download_path = download_path
+        self.path = os.path.join(download_path, filename)
+        self.entries = {}
+        self.verified_at = None
+        self.last_verify = None
+        self._lock = threading.Lock()
+        self._task = None
+
+    def video_path(self, video_id):
+        return os.path.join(self.download_path, f"{video_id}.mp4")
+
+    def load(self):
+        """Carga el manifiesto; si no existe lo reconstruye con los videos que haya en disco"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                with self._lock:
+                    self.entries = data.get("videos", {})
+                    self.verified_at = data.get("verified_at")
+                logger.info(f"Manifiesto de contenido cargado: {len(self.entries)} videos")
+                return
+        except Exception as e:
+            logger.warning(f"Error al cargar el manifiesto de contenido, se reconstruye: {e}")
+        self.rebuild()
+
+    def rebuild(self):
+        """Reconstruye el manifiesto a partir de los videos del directorio (sin hash todavía)"""
+        entries = {}
+        try:
+            with os.scandir(self.download_path) as it:
+                for item in it:
+                    if not item.name.endswith(".mp4") or not item.is_file():
+                        continue
+                    stat = item.stat()
+                    if stat.st_size == 0:
+                        continue
+                    entries[item.name[:-4]] = {
+                        "size": stat.st_size,
+                        "hash": None,
+                        "downloaded_at": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                        "ok": True
+                    }
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.entries = entries
+        self.save()
+        logger.info(f"Manifiesto de contenido reconstruido desde disco: {len(entries)} videos")
+
+    def save(self):
+        """Guarda el manifiesto de forma atómica"""
+        with self._lock:
+            data = {"videos": dict(self.entries), "verified_at": self.verified_at}
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Error al guardar el manifiesto de contenido: {e}")
+
+    def record(self, video_id, size, content_hash=None):
+        """Registra un video descargado y guarda el manifiesto"""
+        with self._lock:
+            self.entries[str(video_id)] = {
+                "size": size,
+                "hash": content_hash,
+                "downloaded_at": datetime.datetime.now().isoformat(),
+                "ok": True
+            }
+        self.save()
+
+    def get(self, video_id):
+        """Entrada de un video o None si no está descargado"""
+        entry = self.entries.get(str(video_id))
+        if entry is None or not entry.get("ok", True):
+            return None
+        return entry
+
+    def clear(self):
+        """Vacía el manifiesto (al borrar el directorio de descargas)"""
+        with self._lock:
+            self.entries = {}
+        self.save()
+
+    def verify(self):
+        """
+        Comprueba las entradas contra el disco y calcula los hashes que falten
+
+        Returns:
+            dict: Resumen de la verificación
+        """
+        started = time.perf_counter()
+        checked = missing = mismatched = hashed = 0
+        with self._lock:
+            items = list(self.entries.items())
+        changed = False
+        for video_id, entry in items:
+            checked += 1
+            path = self.video_path(video_id)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            ok = size is not None and size == entry.get("size")
+            update = {}
+            if not ok:
+                if size is None:
+                    missing += 1
+                else:
+                    mismatched += 1
+                if entry.get("ok", True):
+                    logger.warning(f"Video {video_id} no coincide con el manifiesto "
+                                   f"(esperado {entry.get('size')} bytes, en disco {size})")
+            elif entry.get("hash") is None:
+                try:
+                    update["hash"] = hash_file(path)
+                    hashed += 1
+                except OSError:
+                    ok = False
+            if ok != entry.get("ok", True):
+                update["ok"] = ok
+            if update:
+                changed = True
+                with self._lock:
+                    current = self.entries.get(video_id)
+                    # No pisar una entrada que se actualizó mientras tanto (descarga nueva)
+                    if current is entry:
+                        self.entries[video_id] = dict(entry, **update)
+        self.verified_at = datetime.datetime.now().isoformat()
+        self.last_verify = {
+            "checked": checked,
+            "missing": missing,
+            "mismatched": mismatched,
+            "hashed": hashed,
+            "ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        if changed or hashed:
+            self.save()
+        return self.last_verify
+
+    async def run(self, interval=CONTENT_MANIFEST_VERIFY_INTERVAL):
+        while True:
+            try:
+                result = await asyncio.to_thread(self.verify)
+                logger.debug(f"Manifiesto de contenido verificado: {result}")
+            except Exception as e:
+                logger.warning(f"Error al verificar el manifiesto de contenido: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self):
+        """Lanza la verificación periódica en segundo plano"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="content-manifest")
+        return self._task
+
+    def stats(self):
+        return {
+            "videos": len(self.entries),
+            "bytes": sum(entry.get("size", 0) for entry in self.entries.values()),
+            "verified_at": self.verified_at,
+            "last_verify": self.last_verify
+        }
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_content_manifest(download_path):
+    """Devuelve (y carga la primera vez) el manifiesto de un directorio de descargas"""
+    key = os.path.abspath(download_path)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = ContentManifest(download_path)
+            manifest.load()
+        return manifest
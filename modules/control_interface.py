@@ -5,14 +5,8 @@ import uuid
 import os
 import platform
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('raspberry_client.log'),
-        logging.StreamHandler()
-    ]
-)
+from modules.stores import get_store_index
+
 
 logger = logging.getLogger(socket.gethostname())
 
@@ -112,7 +106,8 @@ def get_interface_ip(interface_name) -> str:
 
 def get_tienda(ip):
     """
-    Versión compacta que retorna diferentes códigos según los primeros octetos de la IP
+    Retorna el código de tienda del rango CIDR más específico que contiene la IP.
+    Los rangos se configuran en stores.json (ver modules/stores.py).
 
     Args:
         ip: Dirección IP (puede ser None)
@@ -120,24 +115,15 @@ def get_tienda(ip):
     Returns:
         str o None: Código de tienda correspondiente o None si no se puede determinar
     """
-    # Verificar que ip no sea None antes de usar startswith()
+    # Verificar que ip no sea None antes de buscarla
     if ip is None:
         logger.warning("IP es None, no se puede determinar la tienda")
         return None
 
-    if ip.startswith("172.19.14."):
-        return "SDQ"
-    elif ip.startswith("192.168.36"):
-        return "SDQ"
-    elif ip.startswith("172.30.42."):
-        return "STI"
-    elif ip.startswith("172.30.43."):  # Corregido: era duplicado
-        return "PUJ"
-    elif ip.startswith("172.50.42."):
-        return "LRM"
-    else:
+    tienda = get_store_index().lookup(ip)
+    if tienda is None:
         logger.info(f"IP {ip} no coincide con ninguna tienda conocida")
-        return None
+    return tienda
 
 
 
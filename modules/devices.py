@@ -1,12 +1,17 @@
 import socket
 from modules.control_interface import get_device_id, get_interface_ip, get_tienda, get_interface_mac, get_device_model, get_memory_usage, get_cpu_temperature, get_disk_usage
 from modules.services import check_service
+from modules.http_client import get_async_client
+from modules.log_reader import tail_lines
+from modules.screen_health import get_screen_health_monitor
 import uuid
+import asyncio
 import logging
 import psutil
 import subprocess
 import os
 import requests
+import httpx
 import re
 import ssl
 import certifi
@@ -14,6 +19,8 @@ import os
 import socket
 from dotenv import load_dotenv
 import datetime
+import hashlib
+import json
 
 load_dotenv()
 
@@ -21,14 +28,6 @@ load_dotenv()
 VERIFY_SSL = os.getenv("VERIFY_SSL", "True").lower() != "false"
 SSL_CERT_PATH = os.getenv("SSL_CERT_PATH", None)  # Ruta a un certificado personalizado, si existe
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('raspberry_client.log'),
-        logging.StreamHandler()
-    ]
-)
 
 logger = logging.getLogger(socket.gethostname()) 
 API_URL = os.getenv("SERVER_URL") + "/api/devices"
@@ -49,11 +48,10 @@ def read_service_logs(lines=50):
     
     for log_path in log_paths:
         try:
-            if os.path.exists(log_path):
-                # Leer las últimas líneas de cada archivo de log
-                with os.popen(f"tail -n {lines} {log_path}") as f:
-                    log_content = f.read()
-                    combined_logs += f"\n--- {log_path} ---\n{log_content}\n"
+            # Leer las últimas líneas de cada archivo de log (lectura hacia atrás por bloques)
+            log_content = "\n".join(tail_lines(log_path, lines))
+            if log_content:
+                combined_logs += f"\n--- {log_path} ---\n{log_content}\n"
         except Exception as e:
             logger.error(f"Error al leer log {log_path}: {str(e)}")
     
@@ -103,91 +101,175 @@ def get_device_info():
 
 
 ### REGISTRAR TERMINAL ###
-def register_device(verify_ssl=True):
+# Archivo donde se guarda la huella del último registro exitoso
+REGISTRATION_STATE_FILE = os.getenv("REGISTRATION_STATE_FILE", "registration_state.json")
+
+
+def build_registration_payload():
     """
-    Registra el dispositivo en el servidor manejando valores None correctamente
-    
+    Construye los datos de registro del dispositivo asegurando que nunca haya valores None
+    en los campos requeridos por el esquema del servidor
+
+    Returns:
+        dict o None: Datos de registro o None si no se pudo obtener device_id
+    """
+    device_id = get_device_id()
+    if not device_id:
+        logger.error("No se pudo obtener device_id")
+        return None
+    hostname = socket.gethostname()
+
+    # Obtener modelo y MAC de forma segura (nunca None)
+    model = get_device_model()  # Siempre retorna string
+    mac_address = get_interface_mac("eth0")  # Siempre retorna string
+    wlan0_mac = get_interface_mac("wlan0")  # Siempre retorna string
+
+    # Obtener información de red
+    ip_lan = get_interface_ip("eth0")
+    ip_wifi = get_interface_ip("wlan0")
+
+    # Obtener tienda/ubicación
+    tienda = get_tienda(ip_lan) or get_tienda(ip_wifi)
+
+    # Preparar datos del dispositivo asegurando que nunca haya valores None
+    device_data = {
+        "device_id": device_id.lower(),
+        "name": hostname,
+        'model': model if model else "player",  # Convertir None a string vacío
+        "mac_address": mac_address,
+        "wlan0_mac": wlan0_mac,
+        "ip_address_lan": ip_lan if ip_lan else None,
+        "ip_address_wifi": ip_wifi if ip_wifi else None,
+        "location": tienda,
+        "tienda": tienda,
+        "is_active": True,
+        "videoloop_enabled": True,
+        "kiosk_enabled": False,
+        "service_logs": "string"
+    }
+
+    # Limpiar campos None para campos que no pueden ser None en el esquema
+    cleaned_data = {}
+    for key, value in device_data.items():
+        if key in ["model"] and value is None:
+            cleaned_data[key] = ""  # Convertir None a string vacío para campos requeridos
+        else:
+            cleaned_data[key] = value
+
+    return cleaned_data
+
+
+def registration_fingerprint(payload):
+    """
+    Calcula la huella (SHA-256) de los datos de registro
+
+    Args:
+        payload: Datos de registro del dispositivo
+
+    Returns:
+        str: Huella hexadecimal, estable frente al orden de las claves
+    """
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def load_registration_fingerprint():
+    """Carga la huella del último registro exitoso o None si no existe"""
+    try:
+        if os.path.exists(REGISTRATION_STATE_FILE):
+            with open(REGISTRATION_STATE_FILE, "r") as f:
+                return json.load(f).get("fingerprint")
+    except Exception as e:
+        logger.warning(f"Error al cargar la huella de registro: {e}")
+    return None
+
+
+def save_registration_fingerprint(fingerprint):
+    """Guarda la huella del último registro exitoso"""
+    try:
+        state = {
+            "fingerprint": fingerprint,
+            "registered_at": datetime.datetime.now().isoformat()
+        }
+        tmp_path = f"{REGISTRATION_STATE_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, REGISTRATION_STATE_FILE)
+    except Exception as e:
+        logger.warning(f"Error al guardar la huella de registro: {e}")
+
+
+def _registration_up_to_date(cleaned_data, fingerprint, force):
+    """Indica si se puede omitir el registro porque los datos no han cambiado"""
+    if not force and fingerprint == load_registration_fingerprint():
+        logger.info(f"Dispositivo {cleaned_data['device_id']} ya registrado con los mismos datos, omitiendo registro")
+        return True
+    return False
+
+
+def _registration_url(cleaned_data):
+    """Registra en el log los datos a enviar y devuelve la URL de registro"""
+    device_id = cleaned_data["device_id"]
+    logger.info(f"Registrando dispositivo {device_id}")
+    logger.info(f"Modelo: '{cleaned_data['model']}' (length: {len(cleaned_data['model'])})")
+    logger.info(f"MAC eth0: '{cleaned_data['mac_address']}' (length: {len(cleaned_data['mac_address'])})")
+    logger.info(f"MAC wlan0: '{cleaned_data['wlan0_mac']}' (length: {len(cleaned_data['wlan0_mac'])})")
+
+    SERVER_URL = os.getenv("SERVER_URL")
+    logger.info(f"Registrando dispositivo en {SERVER_URL}/api/devices/register")
+    return f"{SERVER_URL}/api/devices/register"
+
+
+def _handle_registration_response(response, device_id, fingerprint):
+    """Interpreta la respuesta del registro (requests o httpx) y guarda la huella si tuvo éxito"""
+    if response.status_code == 200:
+        logger.info(f"Dispositivo {device_id} registrado exitosamente")
+        save_registration_fingerprint(fingerprint)
+        return True
+    elif response.status_code == 400:
+        error_detail = response.json().get("detail", "Error desconocido")
+        if "already registered" in error_detail:
+            logger.info(f"Dispositivo {device_id} ya estaba registrado")
+            save_registration_fingerprint(fingerprint)
+            return True
+        else:
+            logger.error(f"Error de validación al registrar dispositivo: {error_detail}")
+            return False
+    else:
+        logger.error(f"Error al registrar dispositivo: {response.status_code} - {response.text}")
+        return False
+
+
+def register_device(verify_ssl=True, force=False):
+    """
+    Registra el dispositivo en el servidor manejando valores None correctamente.
+    Si los datos no han cambiado desde el último registro exitoso, se omite la petición.
+
     Args:
         verify_ssl: Si verificar certificados SSL
-    
+        force: Registrar aunque la huella coincida con la del último registro
+
     Returns:
-        bool: True si el registro fue exitoso
+        bool: True si el registro fue exitoso (o no era necesario)
     """
     try:
-        # Obtener datos del dispositivo
-        device_id = get_device_id()
-        if not device_id:
-            logger.error("No se pudo obtener device_id")
+        cleaned_data = build_registration_payload()
+        if cleaned_data is None:
             return False
-        hostname = socket.gethostname()
 
-        # Obtener modelo y MAC de forma segura (nunca None)
-        model = get_device_model()  # Siempre retorna string
-        mac_address = get_interface_mac("eth0")  # Siempre retorna string
-        wlan0_mac = get_interface_mac("wlan0")  # Siempre retorna string
-        
-        # Obtener información de red
-        ip_lan = get_interface_ip("eth0")
-        ip_wifi = get_interface_ip("wlan0")
-        
-        # Obtener tienda/ubicación
-        tienda = get_tienda(ip_lan) or get_tienda(ip_wifi)
-        
-        # Preparar datos del dispositivo asegurando que nunca haya valores None
-        device_data = {
-            "device_id": device_id.lower(),
-            "name": hostname,
-            'model': model if model else "player",  # Convertir None a string vacío
-            "mac_address": mac_address,
-            "wlan0_mac": wlan0_mac,
-            "ip_address_lan": ip_lan if ip_lan else None,
-            "ip_address_wifi": ip_wifi if ip_wifi else None,            
-            "location": tienda,
-            "tienda": tienda,
-            "is_active": True,
-            "videoloop_enabled": True,
-            "kiosk_enabled": False,
-            "service_logs": "string"
-        }
-        
-        # Limpiar campos None para campos que no pueden ser None en el esquema
-        cleaned_data = {}
-        for key, value in device_data.items():
-            if key in ["model"] and value is None:
-                cleaned_data[key] = ""  # Convertir None a string vacío para campos requeridos
-            else:
-                cleaned_data[key] = value
-        
-        # Log de información para debug
-        logger.info(f"Registrando dispositivo {device_id}")
-        logger.info(f"Modelo: '{model}' (length: {len(model)})")
-        logger.info(f"MAC eth0: '{mac_address}' (length: {len(mac_address)})")
-        logger.info(f"MAC wlan0: '{wlan0_mac}' (length: {len(wlan0_mac)})")
-        
+        # Omitir el registro si los datos son los mismos que en el último registro exitoso
+        fingerprint = registration_fingerprint(cleaned_data)
+        if _registration_up_to_date(cleaned_data, fingerprint, force):
+            return True
+
         # Realizar petición al servidor
-        SERVER_URL = os.getenv("SERVER_URL")
-        logger.info(f"Registrando dispositivo en {SERVER_URL}/api/devices/register")
         response = requests.post(
-            f"{SERVER_URL}/api/devices/register",
+            _registration_url(cleaned_data),
             json=cleaned_data,
             timeout=30,
             verify=verify_ssl
         )
-        
-        if response.status_code == 200:
-            logger.info(f"Dispositivo {device_id} registrado exitosamente")
-            return True
-        elif response.status_code == 400:
-            error_detail = response.json().get("detail", "Error desconocido")
-            if "already registered" in error_detail:
-                logger.info(f"Dispositivo {device_id} ya estaba registrado")
-                return True
-            else:
-                logger.error(f"Error de validación al registrar dispositivo: {error_detail}")
-                return False
-        else:
-            logger.error(f"Error al registrar dispositivo: {response.status_code} - {response.text}")
-            return False
+        return _handle_registration_response(response, cleaned_data["device_id"], fingerprint)
             
     except Exception as e:
         logger.error(f"Error durante el registro del dispositivo: {e}")
@@ -195,6 +277,120 @@ def register_device(verify_ssl=True):
         logger.error(traceback.format_exc())
         return False
 
+
+async def register_device_async(verify_ssl=True, force=False):
+    """
+    Versión asíncrona de register_device que usa el cliente HTTP compartido
+
+    Args:
+        verify_ssl: Si verificar certificados SSL
+        force: Registrar aunque la huella coincida con la del último registro
+
+    Returns:
+        bool: True si el registro fue exitoso (o no era necesario)
+    """
+    try:
+        # La recogida de datos lanza subprocesos, así que se hace fuera del bucle de eventos
+        cleaned_data = await asyncio.to_thread(build_registration_payload)
+        if cleaned_data is None:
+            return False
+
+        fingerprint = registration_fingerprint(cleaned_data)
+        if _registration_up_to_date(cleaned_data, fingerprint, force):
+            return True
+
+        response = await get_async_client(verify_ssl).post(
+            _registration_url(cleaned_data),
+            json=cleaned_data,
+            timeout=30
+        )
+        return _handle_registration_response(response, cleaned_data["device_id"], fingerprint)
+
+    except Exception as e:
+        logger.error(f"Error durante el registro del dispositivo: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+def build_status_payload():
+    """
+    Construye los datos de estado del dispositivo con el formato que espera el servidor
+
+    Returns:
+        dict o None: Datos de estado o None si no se pudo obtener device_id
+    """
+    device_id = get_device_id()
+    if not device_id:
+        logger.error("No se pudo obtener device_id para actualización de estado")
+        return None
+    
+    # Obtener métricas del sistema
+    cpu_temp = get_cpu_temperature()
+    memory_usage = get_memory_usage()
+    disk_usage = get_disk_usage()
+    
+    # Obtener estados de servicios (solo el valor de estado, no el objeto completo)
+    videoloop_status = check_service("videoloop.service").get("status", "unknown")
+    kiosk_status = check_service("kiosk.service").get("status", "unknown")
+    
+    # Convertir estados para compatibilidad con el API
+    status_mapping = {
+        "up": "running",
+        "down": "stopped",
+        "active": "running",
+        "inactive": "stopped"
+    }
+    
+    videoloop_status = status_mapping.get(videoloop_status.lower(), videoloop_status)
+    kiosk_status = status_mapping.get(kiosk_status.lower(), kiosk_status)
+    
+    # Obtener IPs actuales
+    ip_lan = get_interface_ip("eth0")
+    ip_wifi = get_interface_ip("wlan0")
+    
+    # Preparar datos de estado en el formato correcto
+    status_data = {
+        "device_id": device_id,
+        "ip_address_lan": ip_lan if ip_lan else None,
+        "ip_address_wifi": ip_wifi if ip_wifi else None, 
+        "cpu_temp": round(cpu_temp, 2) if cpu_temp is not None else None,
+        "memory_usage": round(memory_usage, 2) if memory_usage is not None else None,
+        "disk_usage": round(disk_usage, 2) if disk_usage is not None else None,
+        "videoloop_status": videoloop_status,  # Solo el string (ej: "running")
+        "kiosk_status": kiosk_status,          # Solo el string (ej: "stopped")
+        "screen_health": get_screen_health_monitor().summary(),  # Pantalla negra o congelada
+        "last_heartbeat": datetime.datetime.utcnow().isoformat() + "Z"
+    }
+    
+    # Limpieza de valores None para campos requeridos
+    cleaned_data = {k: v for k, v in status_data.items() if v is not None}
+    
+    logger.debug(f"Datos de estado preparados: {cleaned_data}")
+    return cleaned_data
+
+
+def _status_url():
+    """Devuelve la URL de actualización de estado o None si SERVER_URL no está configurado"""
+    SERVER_URL = os.getenv("SERVER_URL")
+    if not SERVER_URL:
+        logger.error("SERVER_URL no está configurado")
+        return None
+    return f"{SERVER_URL.rstrip('/')}/api/devices/status"
+
+
+def _handle_status_response(response, device_id):
+    """Interpreta la respuesta de la actualización de estado (requests o httpx)"""
+    if response.status_code == 200:
+        logger.info(f"Estado del dispositivo {device_id} actualizado exitosamente")
+        return True
+    elif response.status_code == 422:
+        logger.error(f"Error de validación al actualizar estado: {response.json()}")
+        return False
+    else:
+        logger.error(f"Error al actualizar estado: {response.status_code} - {response.text}")
+        return False
+
+
 def update_status(verify_ssl=True):
     """
     Actualiza el estado del dispositivo con el formato correcto que espera el servidor
@@ -206,79 +402,57 @@ def update_status(verify_ssl=True):
         bool: True si la actualización fue exitosa
     """
     try:
-        device_id = get_device_id()
-        if not device_id:
-            logger.error("No se pudo obtener device_id para actualización de estado")
+        cleaned_data = build_status_payload()
+        if cleaned_data is None:
             return False
         
-        # Obtener métricas del sistema
-        cpu_temp = get_cpu_temperature()
-        memory_usage = get_memory_usage()
-        disk_usage = get_disk_usage()
-        
-        # Obtener estados de servicios (solo el valor de estado, no el objeto completo)
-        videoloop_status = check_service("videoloop.service").get("status", "unknown")
-        kiosk_status = check_service("kiosk.service").get("status", "unknown")
-        
-        # Convertir estados para compatibilidad con el API
-        status_mapping = {
-            "up": "running",
-            "down": "stopped",
-            "active": "running",
-            "inactive": "stopped"
-        }
-        
-        videoloop_status = status_mapping.get(videoloop_status.lower(), videoloop_status)
-        kiosk_status = status_mapping.get(kiosk_status.lower(), kiosk_status)
-        
-        # Obtener IPs actuales
-        ip_lan = get_interface_ip("eth0")
-        ip_wifi = get_interface_ip("wlan0")
-        
-        # Preparar datos de estado en el formato correcto
-        status_data = {
-            "device_id": device_id,
-            "ip_address_lan": ip_lan if ip_lan else None,
-            "ip_address_wifi": ip_wifi if ip_wifi else None, 
-            "cpu_temp": round(cpu_temp, 2) if cpu_temp is not None else None,
-            "memory_usage": round(memory_usage, 2) if memory_usage is not None else None,
-            "disk_usage": round(disk_usage, 2) if disk_usage is not None else None,
-            "videoloop_status": videoloop_status,  # Solo el string (ej: "running")
-            "kiosk_status": kiosk_status,          # Solo el string (ej: "stopped")
-            "last_heartbeat": datetime.datetime.utcnow().isoformat() + "Z"
-        }
-        
-        # Limpieza de valores None para campos requeridos
-        cleaned_data = {k: v for k, v in status_data.items() if v is not None}
-        
-        logger.debug(f"Datos de estado preparados: {cleaned_data}")
-        
         # Realizar petición al servidor
-        SERVER_URL = os.getenv("SERVER_URL")
-        if not SERVER_URL:
-            logger.error("SERVER_URL no está configurado")
+        status_url = _status_url()
+        if not status_url:
             return False
             
         response = requests.post(
-            f"{SERVER_URL.rstrip('/')}/api/devices/status",
+            status_url,
             json=cleaned_data,
             timeout=30,
             verify=verify_ssl
         )
-        
-        if response.status_code == 200:
-            logger.info(f"Estado del dispositivo {device_id} actualizado exitosamente")
-            return True
-        elif response.status_code == 422:
-            logger.error(f"Error de validación al actualizar estado: {response.json()}")
+        return _handle_status_response(response, cleaned_data["device_id"])
+            
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error de conexión durante actualización de estado: {str(e)}")
+        return False
+    except Exception as e:
+        logger.error(f"Error inesperado durante actualización de estado: {str(e)}", exc_info=True)
+        return False
+
+
+async def update_status_async(verify_ssl=True):
+    """
+    Versión asíncrona de update_status que usa el cliente HTTP compartido
+    
+    Args:
+        verify_ssl: Si verificar certificados SSL
+    
+    Returns:
+        bool: True si la actualización fue exitosa
+    """
+    try:
+        # Las métricas y el estado de los servicios se obtienen con subprocesos
+        cleaned_data = await asyncio.to_thread(build_status_payload)
+        if cleaned_data is None:
             return False
-        else:
-            logger.error(f"Error al actualizar estado: {response.status_code} - {response.text}")
+        
+        status_url = _status_url()
+        if not status_url:
             return False
             
-    except requests.exceptions.RequestException as e:
+        response = await get_async_client(verify_ssl).post(status_url, json=cleaned_data, timeout=30)
+        return _handle_status_response(response, cleaned_data["device_id"])
+            
+    except httpx.HTTPError as e:
         logger.error(f"Error de conexión durante actualización de estado: {str(e)}")
         return False
     except Exception as e:
         logger.error(f"Error inesperado durante actualización de estado: {str(e)}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
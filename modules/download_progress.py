@@ -0,0 +1,208 @@
+"""
+Seguimiento en vivo de las descargas de contenido.
+
+El progreso de las descargas solo aparecía como líneas "Progreso de
+descarga ..." en el log. DownloadProgress recibe los mismos eventos que un
+SyncJob (plan, video_started, advance, video_finished...) para cualquier
+sincronización, también las del bucle principal, y /sync/progress los
+publica como Server-Sent Events.
+
+advance() se llama por cada fragmento de 8 KB, así que solo suma
+contadores y, como mucho cada SAMPLE_INTERVAL segundos, guarda una muestra
+(instante, bytes) para la velocidad instantánea: la velocidad no depende de
+cuántos clientes consulten ni de cada cuánto. El resto (velocidad media,
+profundidad de la cola, serializar el evento) se hace en snapshot(), como
+mucho una vez cada 1/SYNC_PROGRESS_RATE segundos y compartido por todos los
+suscriptores: el número de eventos no depende de cuántos fragmentos se
+escriban ni de cuántos paneles estén conectados.
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+from datetime import datetime
+
+# Configuración del flujo de progreso
+SYNC_PROGRESS_RATE = float(os.getenv("SYNC_PROGRESS_RATE", "2"))  # Eventos por segundo como máximo
+SYNC_PROGRESS_WINDOW = float(os.getenv("SYNC_PROGRESS_WINDOW", "3"))  # Segundos para la velocidad instantánea
+SYNC_PROGRESS_KEEPALIVE = float(os.getenv("SYNC_PROGRESS_KEEPALIVE", "15"))  # Segundos entre comentarios sin cambios
+SAMPLE_INTERVAL = 0.25  # Segundos mínimos entre muestras de velocidad
+
+
+class DownloadProgress:
+    """Progreso de las descargas del proceso, muestreado a ritmo fijo"""
+
+    def __init__(self, rate=SYNC_PROGRESS_RATE, window=SYNC_PROGRESS_WINDOW):
+        """
+        Args:
+            rate: Instantáneas por segundo como máximo
+            window: Segundos de historia para la velocidad instantánea
+        """
+        self.interval = 1.0 / max(0.1, rate)
+        self.window = window
+        self.phase = "idle"
+        self.sync_started_at = None
+        self.videos_total = 0
+        self.videos_done = 0
+        self.videos_failed = 0
+        self.bytes_total = 0
+        self.videos = {}
+        self.last_finished = None
+        self.version = 0
+        self._samples = collections.deque()
+        self._sampled_at = 0.0
+        self._snapshot = None
+        self._snapshot_at = 0.0
+        self._snapshot_version = -1
+
+    # Eventos que envía VideoDownloaderClient (mismos nombres que SyncJob)
+
+    def set_phase(self, phase):
+        self.phase = phase
+        self.version += 1
+
+    def plan(self, playlists):
+        """Empieza una sincronización con la cola de videos indicada"""
+        self.sync_started_at = time.time()
+        self.videos_total = sum(len(playlist.get("videos", [])) for playlist in playlists)
+        self.videos_done = 0
+        self.videos_failed = 0
+        self.bytes_total = 0
+        self.videos = {}
+        self._samples.clear()
+        self._samples.append((time.monotonic(), 0))
+        self.version += 1
+
+    def video_skipped(self, video_id, size):
+        self.videos_done += 1
+        self.version += 1
+
+    def video_started(self, video_id, total):
+        self.videos[video_id] = {"id": video_id, "bytes": 0, "total": total or None, "started_at": time.time()}
+        self.version += 1
+
+    def advance(self, video_id, size):
+        self.bytes_total += size
+        video = self.videos.get(video_id)
+        if video is not None:
+            video["bytes"] += size
+        self.version += 1
+        now = time.monotonic()
+        if now - self._sampled_at >= SAMPLE_INTERVAL:
+            self._sampled_at = now
+            self._samples.append((now, self.bytes_total))
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+    def instant_rate(self):
+        """Bytes por segundo en los últimos window segundos (0 si la descarga está parada)"""
+        now = time.monotonic()
+        for sampled_at, sampled_bytes in self._samples:
+            if now - sampled_at <= self.window:
+                elapsed = now - sampled_at
+                if elapsed < SAMPLE_INTERVAL:
+                    # Muestra demasiado reciente para una medida estable
+                    break
+                return (self.bytes_total - sampled_bytes) / elapsed
+        return 0 if not self._samples or now - self._samples[-1][0] > self.window else None
+
+    def video_finished(self, video_id, size):
+        video = self.videos.pop(video_id, None)
+        self.videos_done += 1
+        if video is not None:
+            elapsed = time.time() - video["started_at"]
+            self.last_finished = {
+                "id": video_id,
+                "bytes": size,
+                "seconds": round(elapsed, 1),
+                "bytes_per_second": round(size / elapsed) if elapsed > 0 else None
+            }
+        self.version += 1
+
+    def video_failed(self, video_id, error):
+        self.videos.pop(video_id, None)
+        self.videos_failed += 1
+        self.version += 1
+
+    # Instantáneas
+
+    def snapshot(self):
+        """
+        Estado actual; se recalcula como mucho una vez por intervalo
+
+        Returns:
+            dict
+        """
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._snapshot_at < self.interval:
+            return self._snapshot
+
+        instant = 0 if self.phase == "idle" else self.instant_rate()
+
+        average = None
+        if self.sync_started_at and self.bytes_total:
+            elapsed = time.time() - self.sync_started_at
+            average = self.bytes_total / elapsed if elapsed > 0 else None
+
+        in_flight = len(self.videos)
+        videos = []
+        for video in self.videos.values():
+            videos.append({
+                "id": video["id"],
+                "bytes": video["bytes"],
+                "total": video["total"],
+                "percent": round(video["bytes"] * 100 / video["total"], 1) if video["total"] else None
+            })
+
+        self._snapshot = {
+            "phase": self.phase,
+            "timestamp": datetime.now().isoformat(),
+            "videos": videos,
+            "queue_depth": max(0, self.videos_total - self.videos_done - self.videos_failed - in_flight),
+            "videos_total": self.videos_total,
+            "videos_done": self.videos_done,
+            "videos_failed": self.videos_failed,
+            "bytes_total": self.bytes_total,
+            "bytes_per_second": round(instant) if instant is not None else None,
+            "average_bytes_per_second": round(average) if average else None,
+            "last_finished": self.last_finished
+        }
+        self._snapshot_at = now
+        self._snapshot_version = self.version
+        return self._snapshot
+
+    async def events(self, keepalive=SYNC_PROGRESS_KEEPALIVE):
+        """
+        Genera el flujo Server-Sent Events
+
+        Envía un evento "progress" al conectar y después, a ritmo fijo, solo
+        cuando algo ha cambiado; sin cambios envía un comentario cada
+        keepalive segundos para que los proxies no cierren la conexión.
+        """
+        sent_version = None
+        sent_at = time.monotonic()
+        event_id = 0
+        while True:
+            snapshot = self.snapshot()
+            # Con la descarga parada la versión no cambia, pero la velocidad instantánea sí
+            if self._snapshot_version != sent_version or snapshot["bytes_per_second"]:
+                event_id += 1
+                sent_version = self._snapshot_version
+                sent_at = time.monotonic()
+                yield f"id: {event_id}\nevent: progress\ndata: {json.dumps(snapshot)}\n\n"
+            elif time.monotonic() - sent_at >= keepalive:
+                sent_at = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(self.interval)
+
+
+_progress = None
+
+
+def get_download_progress():
+    """Devuelve el seguimiento de descargas del proceso"""
+    global _progress
+    if _progress is None:
+        _progress = DownloadProgress()
+    return _progress
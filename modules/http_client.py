@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import weakref
+
+import certifi
+import httpx
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración del cliente HTTP asíncrono
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "False").lower() == "true"  # Requiere el paquete h2
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Un cliente por bucle de eventos y configuración SSL: los clientes de httpx
+# no pueden compartirse entre bucles (run_sync_only_mode usa asyncio.run)
+_clients = weakref.WeakKeyDictionary()
+
+
+def _ssl_context(verify_ssl):
+    """Convierte el valor de verify_ssl (bool o ruta a certificado) para httpx"""
+    if isinstance(verify_ssl, str):
+        return ssl.create_default_context(cafile=verify_ssl)
+    if verify_ssl:
+        return ssl.create_default_context(cafile=certifi.where())
+    return False
+
+
+def get_async_client(verify_ssl=True):
+    """
+    Devuelve el cliente HTTP asíncrono compartido del bucle de eventos actual.
+    Mantiene conexiones keep-alive entre peticiones y usa HTTP/2 si está activado.
+
+    Args:
+        verify_ssl: Si verificar certificados SSL, o ruta a un certificado personalizado
+
+    Returns:
+        httpx.AsyncClient: Cliente compartido
+    """
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    client = clients.get(verify_ssl)
+    if client is None or client.is_closed:
+        http2 = HTTP2_ENABLED and HTTP2_AVAILABLE
+        if HTTP2_ENABLED and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 solicitado pero el paquete h2 no está instalado, usando HTTP/1.1")
+        client = httpx.AsyncClient(
+            verify=_ssl_context(verify_ssl),
+            http2=http2,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            headers={"User-Agent": "RaspberryPiClient/1.0"}
+        )
+        clients[verify_ssl] = client
+        logger.debug(f"Cliente HTTP asíncrono creado (HTTP/2: {'sí' if http2 else 'no'})")
+    return client
+
+
+async def close_async_clients():
+    """Cierra los clientes HTTP asíncronos del bucle de eventos actual"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
@@ -0,0 +1,172 @@
+"""
+Compresión de los archivos rotados del log de texto.
+
+Al rotar, LineCountRotatingFileHandler deja el archivo recién rotado sin
+comprimir (ruta.1) para no retrasar la escritura de logs, y avisa a un
+BackupCompressor. Este hilo, con prioridad mínima de CPU, comprime los
+archivos rotados pendientes a ruta.N.gz y borra el original. El cambio de
+nombre final se hace con el lock del handler tomado, de forma que no puede
+coincidir con una rotación.
+
+Los lectores (modules/log_reader.py) abren los segmentos con open_segment(),
+que devuelve el contenido descomprimido, así que los cursores (hash de la
+primera línea y offset sin comprimir) siguen siendo válidos después de
+comprimir un archivo.
+"""
+import gzip
+import io
+import logging
+import os
+import shutil
+import socket
+import struct
+import threading
+
+logger = logging.getLogger(socket.gethostname())
+
+LOG_COMPRESS_LEVEL = int(os.getenv("LOG_COMPRESS_LEVEL", "6"))  # Nivel de compresión gzip (1-9)
+
+
+def backup_path(base_filename, index):
+    """
+    Ruta del archivo rotado `index` (sin comprimir si existe, si no el .gz)
+
+    Returns:
+        str o None si no existe
+    """
+    plain = f"{base_filename}.{index}"
+    if os.path.exists(plain):
+        return plain
+    compressed = f"{plain}.gz"
+    if os.path.exists(compressed):
+        return compressed
+    return None
+
+
+def open_segment(path):
+    """Abre un segmento del log en binario; los .gz se devuelven descomprimidos en memoria"""
+    if path.endswith(".gz"):
+        with open(path, "rb") as f:
+            return io.BytesIO(gzip.decompress(f.read()))
+    return open(path, "rb")
+
+
+def read_first_line(path, limit=512):
+    """Primera línea (hasta `limit` bytes) de un segmento, comprimido o no"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.readline(limit)
+
+
+def segment_size(path):
+    """Tamaño sin comprimir de un segmento"""
+    if path.endswith(".gz"):
+        # El trailer gzip guarda el tamaño original módulo 2^32
+        with open(path, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", f.read(4))[0]
+    return os.path.getsize(path)
+
+
+def shift_compressed_backups(base_filename, backup_count):
+    """
+    Desplaza los archivos rotados comprimidos (ruta.i.gz -> ruta.i+1.gz) antes de
+    que RotatingFileHandler desplace los no comprimidos
+    """
+    for i in range(backup_count - 1, 0, -1):
+        source = f"{base_filename}.{i}.gz"
+        if os.path.exists(source):
+            os.replace(source, f"{base_filename}.{i + 1}.gz")
+    if os.path.exists(f"{base_filename}.1.gz"):
+        os.remove(f"{base_filename}.1.gz")
+
+
+class BackupCompressor(threading.Thread):
+    """Hilo de baja prioridad que comprime los archivos rotados de un handler"""
+
+    def __init__(self, handler, level=LOG_COMPRESS_LEVEL):
+        """
+        Args:
+            handler: LineCountRotatingFileHandler cuyos archivos rotados se comprimen
+            level: Nivel de compresión gzip
+        """
+        super().__init__(name="log-compressor", daemon=True)
+        self.handler = handler
+        self.level = level
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+    def wake(self):
+        """Avisa de que hay archivos rotados nuevos"""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        self.join(timeout=5)
+
+    def run(self):
+        # Prioridad mínima para no competir con la reproducción (nice por hilo en Linux)
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while not self._stopping:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                self.compress_pending()
+            except Exception as e:
+                logger.error(f"Error al comprimir logs rotados: {str(e)}")
+
+    def compress_pending(self):
+        """Comprime todos los archivos rotados que sigan sin comprimir"""
+        base = self.handler.baseFilename
+        for i in range(1, self.handler.backupCount + 1):
+            path = f"{base}.{i}"
+            if os.path.exists(path):
+                self._compress(path)
+
+    def _compress(self, path):
+        tmp_path = f"{path}.gz.tmp"
+        try:
+            with open(path, "rb") as source:
+                inode = os.fstat(source.fileno()).st_ino
+                with gzip.open(tmp_path, "wb", compresslevel=self.level) as target:
+                    shutil.copyfileobj(source, target, 65536)
+                size = source.tell()
+        except FileNotFoundError:
+            return
+
+        # Publicar el .gz solo si el archivo no se rotó mientras se comprimía
+        self.handler.acquire()
+        try:
+            try:
+                current = os.stat(path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != inode:
+                os.remove(tmp_path)
+                self._wakeup.set()  # Volver a revisar con los nombres nuevos
+                return
+            os.replace(tmp_path, f"{path}.gz")
+            os.remove(path)
+            compressed_size = os.path.getsize(f"{path}.gz")
+        finally:
+            self.handler.release()
+
+        self.compressed += 1
+        self.bytes_in += size
+        self.bytes_out += compressed_size
+
+    def stats(self):
+        return {
+            "compressed": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
@@ -0,0 +1,358 @@
+"""
+Difusión del log en tiempo real a los clientes WebSocket.
+
+Un único LogBroadcaster sigue el archivo de log y reparte cada registro nuevo
+entre los suscriptores, en lugar de que cada conexión abra el archivo y lo
+consulte cada 100 ms por su cuenta. Mientras haya suscriptores, el
+broadcaster espera eventos de inotify sobre el directorio del log (o, si
+inotify no está disponible, consulta el archivo cada LOG_TAIL_POLL_INTERVAL
+segundos). Al rotar el archivo termina de leer el anterior (y los rotados
+después de él, si hubo varias rotaciones seguidas) y continúa con el nuevo
+desde el principio.
+
+Cada suscriptor tiene una cola acotada: si un cliente lento la llena, se
+descartan sus registros más antiguos, sin frenar al broadcaster ni a los
+demás clientes.
+"""
+import asyncio
+import collections
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import socket
+import struct
+
+from modules.log_pipeline import LOG_FILE, LOG_BACKUP_COUNT
+from modules.structured_log import JSONL_LOG_ENABLED, JSONL_LOG_FILE
+from modules.log_filter import parse_text_line
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración de la difusión de logs
+LOG_TAIL_INOTIFY = os.getenv("LOG_TAIL_INOTIFY", "True").lower() != "false"  # Usar inotify si está disponible
+LOG_TAIL_POLL_INTERVAL = float(os.getenv("LOG_TAIL_POLL_INTERVAL", "1.0"))  # Segundos entre consultas sin inotify
+LOG_TAIL_RECHECK = float(os.getenv("LOG_TAIL_RECHECK", "10"))  # Comprobación de respaldo con inotify (segundos)
+LOG_SUBSCRIBER_QUEUE = int(os.getenv("LOG_SUBSCRIBER_QUEUE", "1000"))  # Registros pendientes por cliente
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Vigila un directorio con inotify (vía libc) e informa de los archivos modificados"""
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory: Directorio a vigilar
+
+        Raises:
+            OSError: Si inotify no está disponible en el sistema
+        """
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc no encontrada")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify no disponible")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno))
+
+    def fileno(self):
+        return self.fd
+
+    def read_names(self):
+        """
+        Lee los eventos pendientes
+
+        Returns:
+            set: Nombres de los archivos afectados
+        """
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            pos = 0
+            while pos + EVENT_HEADER.size <= len(data):
+                _, _, _, length = EVENT_HEADER.unpack_from(data, pos)
+                pos += EVENT_HEADER.size
+                name = data[pos:pos + length].rstrip(b"\0")
+                pos += length
+                if name:
+                    names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class Subscription:
+    """Cola acotada de un suscriptor; al llenarse descarta los registros más antiguos"""
+
+    def __init__(self, maxsize=LOG_SUBSCRIBER_QUEUE):
+        self.queue = collections.deque(maxlen=max(1, maxsize))
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, item):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(item)
+        self._ready.set()
+
+    async def get(self):
+        """Espera y devuelve el siguiente registro como tupla (entrada, bytes)"""
+        while not self.queue:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.queue.popleft()
+
+
+class LogBroadcaster:
+    """
+    Sigue un archivo de log y reparte los registros nuevos entre los suscriptores.
+    Solo lee el archivo mientras haya al menos un suscriptor.
+    """
+
+    def __init__(self, path, structured=True, use_inotify=LOG_TAIL_INOTIFY,
+                 poll_interval=LOG_TAIL_POLL_INTERVAL, queue_size=LOG_SUBSCRIBER_QUEUE,
+                 backup_count=LOG_BACKUP_COUNT):
+        """
+        Args:
+            path: Archivo de log a seguir
+            structured: True si el archivo es el log estructurado (JSONL)
+            backup_count: Archivos rotados que conserva el handler (ruta.1 ... ruta.N)
+            use_inotify: Intentar usar inotify antes de recurrir a la consulta periódica
+            poll_interval: Segundos entre consultas sin inotify
+            queue_size: Registros pendientes por suscriptor
+        """
+        self.path = os.path.abspath(path)
+        self.structured = structured
+        self.use_inotify = use_inotify
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.backup_count = backup_count
+        self.backend = None
+        self.records = 0
+        self.rotations = 0
+        self._subscribers = set()
+        self._task = None
+        self._wakeup = None
+        self._file = None
+        self._inode = None
+        self._buffer = b""
+
+    def subscribe(self):
+        """Crea una suscripción y arranca el seguimiento si es la primera"""
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="log-broadcaster")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Elimina una suscripción; el seguimiento se detiene al quedar sin suscriptores"""
+        self._subscribers.discard(subscription)
+        if not self._subscribers and self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self):
+        """Estado del broadcaster"""
+        return {
+            "backend": self.backend,
+            "subscribers": len(self._subscribers),
+            "records": self.records,
+            "rotations": self.rotations,
+            "dropped": sum(s.dropped for s in self._subscribers)
+        }
+
+    def _open(self, at_end):
+        """Abre el archivo de log (si existe) al final o al principio"""
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            self._file = None
+            self._inode = None
+            return
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._buffer = b""
+        if at_end:
+            self._file.seek(0, os.SEEK_END)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_lines(self):
+        """Lee las líneas completas nuevas del archivo abierto"""
+        data = self._file.read()
+        if not data:
+            return []
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()  # Línea todavía incompleta
+        return lines
+
+    def _read_new(self):
+        """
+        Lee los registros nuevos, siguiendo la rotación o el truncado del archivo
+
+        Returns:
+            list: Líneas completas (bytes)
+        """
+        if self._file is None:
+            self._open(at_end=False)
+            if self._file is None:
+                return []
+
+        lines = self._read_lines()
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return lines  # Rotación en curso: el archivo nuevo todavía no existe
+
+        if current.st_ino != self._inode:
+            # El archivo se rotó: terminar de leer el anterior, después los archivos
+            # rotados desde entonces (si hubo varias rotaciones) y seguir con el nuevo
+            lines += self._read_lines()
+            old_inode = self._inode
+            self._close()
+            for path in self._rotated_since(old_inode):
+                with open(path, "rb") as f:
+                    lines += f.read().split(b"\n")
+                self.rotations += 1
+            self.rotations += 1
+            self._open(at_end=False)
+            if self._file is not None:
+                lines += self._read_lines()
+        elif current.st_size < self._file.tell():
+            # El archivo se truncó
+            self._file.seek(0)
+            self._buffer = b""
+            lines += self._read_lines()
+        return lines
+
+    def _rotated_since(self, inode):
+        """
+        Archivos rotados posteriores al que tenía el inodo `inode`, del más antiguo
+        al más reciente. Si ese archivo ya no existe se devuelven todos los rotados.
+        """
+        backups = []
+        for i in range(1, self.backup_count + 1):
+            path = f"{self.path}.{i}"
+            try:
+                if os.stat(path).st_ino == inode:
+                    break
+            except FileNotFoundError:
+                break
+            backups.append(path)
+        return list(reversed(backups))
+
+    def _parse(self, line):
+        if self.structured:
+            try:
+                return json.loads(line)
+            except ValueError:
+                return None
+        text = line.decode("utf-8", errors="replace")
+        return parse_text_line(text) or {"message": text.strip()}
+
+    def _publish(self, lines):
+        for line in lines:
+            if not line:
+                continue
+            entry = self._parse(line)
+            if entry is None:
+                continue
+            self.records += 1
+            item = (entry, len(line) + 1)
+            for subscription in self._subscribers:
+                subscription.put(item)
+
+    def _start_watcher(self):
+        """Devuelve un InotifyWatcher sobre el directorio del log o None si no se puede usar"""
+        if not self.use_inotify:
+            return None
+        try:
+            return InotifyWatcher(os.path.dirname(self.path))
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify no disponible para {self.path}, se consultará el archivo periódicamente: {str(e)}")
+            return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        watcher = self._start_watcher()
+        name = os.path.basename(self.path)
+        self.backend = "inotify" if watcher else "polling"
+
+        if watcher:
+            def on_events():
+                if name in watcher.read_names():
+                    self._wakeup.set()
+            loop.add_reader(watcher.fileno(), on_events)
+
+        logger.info(f"Difusión de logs iniciada sobre {self.path} ({self.backend})")
+        try:
+            self._open(at_end=True)
+            while self._subscribers:
+                timeout = LOG_TAIL_RECHECK if watcher else self.poll_interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                if not self._subscribers:
+                    break
+                try:
+                    self._publish(self._read_new())
+                except OSError as e:
+                    logger.error(f"Error al leer {self.path}: {str(e)}")
+                    self._close()
+        finally:
+            if watcher:
+                loop.remove_reader(watcher.fileno())
+                watcher.close()
+            self._close()
+            self.backend = None
+            logger.info("Difusión de logs detenida")
+
+
+_broadcaster = None
+
+
+def get_log_broadcaster():
+    """Devuelve el broadcaster del proceso (log estructurado o, si está desactivado, el de texto)"""
+    global _broadcaster
+    if _broadcaster is None:
+        if JSONL_LOG_ENABLED:
+            _broadcaster = LogBroadcaster(JSONL_LOG_FILE, structured=True)
+        else:
+            _broadcaster = LogBroadcaster(LOG_FILE, structured=False)
+    return _broadcaster
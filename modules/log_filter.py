@@ -0,0 +1,359 @@
+"""
+Filtro de registros de log en el dispositivo.
+
+Los criterios (nivel mínimo, logger, rango de tiempo, texto o expresión
+regular y ID de dispositivo) se evalúan sobre las entradas del log
+estructurado, que ya tienen esos campos extraídos al escribirse (ver
+modules/structured_log.py), así que filtrar no requiere volver a analizar
+cada línea con expresiones regulares. Lo usan GET /api/logs y la acción
+"filter" del WebSocket de logs, de forma que por los enlaces de las tiendas
+solo viajan los registros que el cliente quiere ver.
+
+El WebSocket evalúa el filtro en el bucle de eventos por cada registro
+nuevo, y una expresión regular con retroceso catastrófico (aunque sea
+corta) lo bloquearía entero: API, control del reproductor incluido. Como
+una búsqueda de re no se puede interrumpir, allí los filtros se limitan a
+nivel, logger, tiempo, texto e ID de dispositivo (allow_regex=False); la
+expresión regular solo se admite en GET /api/logs, que filtra en un hilo.
+
+Aun en un hilo, una expresión como (a+)+$ ocuparía un núcleo durante
+minutos, así que check_regex rechaza las construcciones que provocan
+retroceso exponencial (cuantificadores anidados, alternativas dentro de una
+repetición y referencias a grupos) y limita las repeticiones sin cota. Además
+la consulta entera tiene un tiempo máximo (LOG_QUERY_TIMEOUT): al agotarse
+devuelve lo encontrado, marcado como parcial, con el punto desde el que seguir.
+"""
+import collections
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from modules.structured_log import parse_log_time, DEVICE_ID_PATTERN
+from modules.log_reader import log_segments as text_log_segments
+from modules.log_archive import open_segment
+
+logger = logging.getLogger(socket.gethostname())
+
+MAX_PATTERN_LENGTH = 256  # Longitud máxima de texto y expresiones regulares de los filtros
+MAX_REGEX_UNBOUNDED = 2  # Repeticiones sin cota (*, +, {n,}) admitidas en una expresión regular
+UNBOUNDED_REPEAT = 16  # Una repetición con máximo mayor que este cuenta como sin cota
+QUERY_CHECK_INTERVAL = 64  # Líneas revisadas entre comprobaciones del tiempo máximo
+
+# Tiempo máximo de una consulta filtrada en GET /api/logs
+LOG_QUERY_TIMEOUT = float(os.getenv("LOG_QUERY_TIMEOUT", "5"))  # Segundos
+
+# Línea del log de texto con el formato de LOG_FORMAT
+TEXT_LINE_PATTERN = re.compile(
+    r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) - (.*?) - ([A-Z]+) - (.*)$'
+)
+
+FILTER_FIELDS = ("level", "logger", "since", "until", "contains", "regex", "device_id")
+
+
+def _level_number(name):
+    """Convierte el nombre de un nivel en su valor numérico"""
+    value = logging.getLevelName(str(name).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Nivel de log desconocido: {name}")
+    return value
+
+
+def check_regex(pattern):
+    """
+    Comprueba que una expresión regular no pueda provocar retroceso catastrófico
+
+    Raises:
+        ValueError: Si la expresión no es válida o usa construcciones no admitidas
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        raise ValueError(f"Expresión regular no válida: {e}")
+
+    unbounded = 0
+
+    def walk(items, repeated):
+        nonlocal unbounded
+        for op, av in items:
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                low, high, subpattern = av
+                if repeated and high > 1:
+                    raise ValueError("La expresión regular no puede anidar cuantificadores")
+                if high > UNBOUNDED_REPEAT:
+                    unbounded += 1
+                walk(subpattern, repeated or high > 1)
+            elif op == sre_parse.SUBPATTERN:
+                walk(av[-1], repeated)
+            elif op == sre_parse.BRANCH:
+                if repeated:
+                    raise ValueError("La expresión regular no puede repetir alternativas (a|b)*")
+                for branch in av[1]:
+                    walk(branch, repeated)
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                walk(av[1], repeated)
+            elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+                raise ValueError("La expresión regular no puede usar referencias a grupos")
+
+    walk(parsed, False)
+    if unbounded > MAX_REGEX_UNBOUNDED:
+        raise ValueError(f"La expresión regular admite como mucho {MAX_REGEX_UNBOUNDED} repeticiones sin límite")
+
+
+class LogFilter:
+    """
+    Criterios de filtrado de registros de log. Todos los criterios indicados
+    deben cumplirse; un filtro sin criterios acepta todos los registros.
+    """
+
+    def __init__(self, level=None, logger=None, since=None, until=None,
+                 contains=None, regex=None, device_id=None):
+        """
+        Args:
+            level: Nivel mínimo (ej: "WARNING")
+            logger: Nombres de logger separados por comas (incluye sus hijos)
+            since: Inicio del rango (epoch o ISO 8601)
+            until: Fin del rango (epoch o ISO 8601)
+            contains: Texto que debe aparecer en el mensaje (sin distinguir mayúsculas)
+            regex: Expresión regular que debe encontrarse en el mensaje (ver check_regex)
+            device_id: ID de dispositivo mencionado en el mensaje
+
+        Raises:
+            ValueError: Si algún criterio no es válido
+        """
+        for name, value in (("contains", contains), ("regex", regex)):
+            if value and len(value) > MAX_PATTERN_LENGTH:
+                raise ValueError(f"{name} no puede superar {MAX_PATTERN_LENGTH} caracteres")
+
+        self.level = str(level).upper() if level else None
+        self.min_level = _level_number(level) if level else None
+        self.loggers = tuple(name.strip() for name in str(logger).split(",") if name.strip()) if logger else ()
+        self.since = parse_log_time(since)
+        self.until = parse_log_time(until)
+        self.contains = contains.lower() if contains else None
+        if regex:
+            check_regex(regex)
+        try:
+            self.regex = re.compile(regex) if regex else None
+        except re.error as e:
+            raise ValueError(f"Expresión regular no válida: {e}")
+        self.device_id = device_id or None
+
+    @classmethod
+    def from_params(cls, params, allow_regex=True):
+        """
+        Crea un filtro a partir de un diccionario (parámetros de la API o mensaje del WebSocket)
+
+        Args:
+            params: Diccionario con los campos de FILTER_FIELDS
+            allow_regex: False para rechazar el criterio regex (filtros que se evalúan en el bucle de eventos)
+
+        Raises:
+            ValueError: Si algún criterio no es válido o se pide regex sin permitirlo
+        """
+        if not allow_regex and params.get("regex"):
+            raise ValueError("regex no está disponible en este canal; usa contains")
+        return cls(**{field: params.get(field) for field in FILTER_FIELDS})
+
+    @property
+    def is_empty(self):
+        """True si el filtro no tiene ningún criterio"""
+        return not any((self.min_level is not None, self.loggers, self.since is not None,
+                        self.until is not None, self.contains, self.regex, self.device_id))
+
+    def _logger_matches(self, name):
+        for wanted in self.loggers:
+            if name == wanted or name.startswith(wanted + "."):
+                return True
+        return False
+
+    def matches(self, entry):
+        """
+        Comprueba si una entrada del log estructurado cumple el filtro
+
+        Args:
+            entry: Diccionario con los campos de record_to_entry()
+
+        Returns:
+            bool
+        """
+        if self.min_level is not None:
+            level = logging.getLevelName(entry.get("level"))
+            if not isinstance(level, int) or level < self.min_level:
+                return False
+        ts = entry.get("ts", 0)
+        if self.since is not None and ts < self.since:
+            return False
+        if self.until is not None and ts > self.until:
+            return False
+        if self.loggers and not self._logger_matches(entry.get("logger", "")):
+            return False
+        if self.device_id and entry.get("device_id") != self.device_id:
+            return False
+        message = entry.get("message", "")
+        if self.contains and self.contains not in message.lower():
+            return False
+        if self.regex and not self.regex.search(message):
+            return False
+        return True
+
+    def to_dict(self):
+        """Criterios activos del filtro"""
+        return {
+            "level": self.level,
+            "logger": ",".join(self.loggers) or None,
+            "since": self.since,
+            "until": self.until,
+            "contains": self.contains,
+            "regex": self.regex.pattern if self.regex else None,
+            "device_id": self.device_id
+        }
+
+
+class FilterStats:
+    """
+    Contadores de registros y bytes revisados frente a enviados. Los bytes se
+    miden sobre el registro tal como está en el log estructurado, así que
+    bytes_saved es lo que el cliente habría descargado de más sin filtrar.
+    """
+
+    def __init__(self, parent=None):
+        """
+        Args:
+            parent: Estadísticas globales a las que sumar también estos contadores
+        """
+        self.parent = parent
+        self.truncated_at = None  # Timestamp desde el que seguir si la consulta se cortó por tiempo
+        self._lock = threading.Lock()
+        self.records_scanned = 0
+        self.records_sent = 0
+        self.bytes_scanned = 0
+        self.bytes_sent = 0
+
+    def add(self, scanned_records=0, scanned_bytes=0, sent_records=0, sent_bytes=0):
+        with self._lock:
+            self.records_scanned += scanned_records
+            self.bytes_scanned += scanned_bytes
+            self.records_sent += sent_records
+            self.bytes_sent += sent_bytes
+        if self.parent is not None:
+            self.parent.add(scanned_records, scanned_bytes, sent_records, sent_bytes)
+
+    def scanned(self, size):
+        """Cuenta un registro revisado de `size` bytes"""
+        self.add(scanned_records=1, scanned_bytes=size)
+
+    def sent(self, size):
+        """Cuenta un registro enviado de `size` bytes"""
+        self.add(sent_records=1, sent_bytes=size)
+
+    def to_dict(self):
+        saved = max(0, self.bytes_scanned - self.bytes_sent)
+        return {
+            "records_scanned": self.records_scanned,
+            "records_sent": self.records_sent,
+            "bytes_scanned": self.bytes_scanned,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": saved,
+            "saved_ratio": round(saved / self.bytes_scanned, 3) if self.bytes_scanned else 0.0
+        }
+
+
+# Estadísticas acumuladas desde el arranque por canal
+FILTER_STATS = {
+    "api": FilterStats(),
+    "websocket": FilterStats()
+}
+
+
+def get_filter_stats():
+    """Devuelve las estadísticas acumuladas de filtrado por canal"""
+    return {channel: stats.to_dict() for channel, stats in FILTER_STATS.items()}
+
+
+def entry_size(entry):
+    """Tamaño en bytes de una entrada tal como se escribe en el log estructurado"""
+    return len(json.dumps(entry, ensure_ascii=True, separators=(",", ":"))) + 1
+
+
+def parse_text_line(line):
+    """
+    Convierte una línea del log de texto en una entrada con los mismos campos
+    que el log estructurado. Solo se usa si el log estructurado está desactivado.
+
+    Returns:
+        dict o None si la línea no tiene el formato esperado
+    """
+    match = TEXT_LINE_PATTERN.match(line.rstrip("\n"))
+    if not match:
+        return None
+    time_text, millis, name, level, message = match.groups()
+    ts = datetime.strptime(time_text, "%Y-%m-%d %H:%M:%S").timestamp() + int(millis) / 1000
+    device_match = DEVICE_ID_PATTERN.search(message)
+    return {
+        "ts": ts,
+        "time": f"{time_text},{millis}",
+        "level": level,
+        "logger": name,
+        "device_id": device_match.group(1) if device_match else None,
+        "message": message
+    }
+
+
+def query_text_records(log_filter, limit=None, stats=None, base_filename=None, deadline=None):
+    """
+    Filtra el log de texto (incluidos los rotados) cuando el log estructurado está desactivado.
+    Las líneas sin el formato de LOG_FORMAT (trazas de excepciones) se añaden al registro anterior.
+
+    Args:
+        log_filter: LogFilter a aplicar
+        limit: Número máximo de entradas (las más recientes)
+        stats: FilterStats donde contar los registros revisados
+        base_filename: Log de texto (por defecto LOG_FILE)
+        deadline: Instante (time.monotonic) en el que se deja de revisar, como en query_records
+
+    Returns:
+        list: Entradas en orden cronológico, con los mismos campos que el log estructurado
+    """
+    results = collections.deque(maxlen=limit) if limit else []
+
+    def flush(entry, size):
+        if entry is None:
+            return
+        if stats is not None:
+            stats.scanned(size)
+        if log_filter.matches(entry):
+            results.append(entry)
+
+    checked = 0
+    for path, _ in text_log_segments(base_filename):
+        entry, size = None, 0
+        with open_segment(path) as f:
+            for raw in f:
+                text = raw.decode("utf-8", errors="replace")
+                parsed = parse_text_line(text)
+                if parsed is None:
+                    if entry is not None:
+                        entry["message"] += "\n" + text.rstrip("\n")
+                        size += len(raw)
+                    continue
+                checked += 1
+                if deadline is not None and checked % QUERY_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                    # El registro pendiente puede tener aún líneas de continuación: se deja sin revisar
+                    if stats is not None:
+                        stats.truncated_at = entry["ts"] if entry is not None else parsed["ts"]
+                    return list(results)
+                flush(entry, size)
+                entry, size = parsed, len(raw)
+        flush(entry, size)
+
+    return list(results)
@@ -0,0 +1,137 @@
+"""
+Limitación de logs por punto de llamada.
+
+RateLimitFilter aplica un token bucket a cada punto de llamada (logger,
+archivo y línea): cada uno puede emitir hasta N registros seguidos y después
+recupera N registros por periodo. Los registros que exceden el límite se
+descartan antes de encolarse, así que no llegan ni a la tarjeta SD ni a los
+clientes WebSocket. Cuando un punto de llamada vuelve a emitir, su mensaje
+indica cuántos registros se suprimieron mientras tanto.
+
+El límite por defecto (LOG_RATE_LIMIT) puede ajustarse por módulo con
+LOG_RATE_LIMIT_MODULES, por ejemplo "control_interface=2/3600,main=off".
+Los registros por encima de LOG_RATE_LIMIT_LEVEL no se limitan nunca.
+"""
+import logging
+import os
+import threading
+import time
+
+# Configuración de la limitación de logs
+LOG_RATE_LIMIT_ENABLED = os.getenv("LOG_RATE_LIMIT_ENABLED", "True").lower() != "false"
+LOG_RATE_LIMIT = os.getenv("LOG_RATE_LIMIT", "20/60")  # Registros por segundos en cada punto de llamada
+LOG_RATE_LIMIT_MODULES = os.getenv("LOG_RATE_LIMIT_MODULES", "control_interface=2/3600")  # Límites por módulo
+LOG_RATE_LIMIT_LEVEL = os.getenv("LOG_RATE_LIMIT_LEVEL", "WARNING").upper()  # Nivel máximo que se limita
+
+
+def parse_limit(value):
+    """
+    Convierte un límite "N/segundos" en (capacidad, registros por segundo)
+
+    Returns:
+        tuple o None si el límite está desactivado ("off")
+
+    Raises:
+        ValueError: Si el formato no es válido
+    """
+    value = value.strip().lower()
+    if value in ("off", "none", "0"):
+        return None
+    count, _, period = value.partition("/")
+    count = float(count)
+    period = float(period or 1)
+    if count <= 0 or period <= 0:
+        raise ValueError(f"Límite de logs no válido: {value}")
+    return count, count / period
+
+
+def parse_module_limits(value):
+    """Convierte "modulo=N/segundos,..." en un diccionario módulo -> límite"""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        module, _, limit = item.partition("=")
+        limits[module.strip()] = parse_limit(limit)
+    return limits
+
+
+class RateLimitFilter(logging.Filter):
+    """Filtro de logging con un token bucket por punto de llamada"""
+
+    def __init__(self, default_limit=LOG_RATE_LIMIT, module_limits=LOG_RATE_LIMIT_MODULES,
+                 max_level=LOG_RATE_LIMIT_LEVEL):
+        """
+        Args:
+            default_limit: Límite "N/segundos" para los puntos de llamada sin límite propio
+            module_limits: Límites por módulo ("modulo=N/segundos,..." o diccionario)
+            max_level: Nivel máximo al que se aplica el límite
+        """
+        super().__init__()
+        self.default_limit = parse_limit(default_limit) if isinstance(default_limit, str) else default_limit
+        if isinstance(module_limits, str):
+            module_limits = parse_module_limits(module_limits)
+        self.module_limits = dict(module_limits or {})
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+        self._sites = {}  # (logger, archivo, línea) -> [tokens, último instante, suprimidos, total suprimidos]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def _limit_for(self, record):
+        return self.module_limits.get(record.module, self.default_limit)
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        limit = self._limit_for(record)
+        if limit is None:
+            return True
+        capacity, rate = limit
+
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [capacity, now, 0, 0]
+            else:
+                site[0] = min(capacity, site[0] + (now - site[1]) * rate)
+                site[1] = now
+            if site[0] < 1:
+                site[2] += 1
+                site[3] += 1
+                self.suppressed += 1
+                return False
+            site[0] -= 1
+            pending, site[2] = site[2], 0
+
+        if pending:
+            record.msg = f"{record.getMessage()} [{pending} mensajes similares suprimidos]"
+            record.args = None
+        return True
+
+    def stats(self, top=10):
+        """
+        Estadísticas de registros suprimidos
+
+        Args:
+            top: Número de puntos de llamada con más registros suprimidos a incluir
+        """
+        with self._lock:
+            sites = [
+                {"logger": name, "file": os.path.basename(path), "line": line, "suppressed": site[3]}
+                for (name, path, line), site in self._sites.items() if site[3]
+            ]
+        sites.sort(key=lambda site: site["suppressed"], reverse=True)
+        return {
+            "suppressed": self.suppressed,
+            "sites": len(self._sites),
+            "top": sites[:top]
+        }
+
+
+def create_rate_limit_filter():
+    """Crea el filtro con la configuración del entorno o None si está desactivado"""
+    if not LOG_RATE_LIMIT_ENABLED:
+        return None
+    return RateLimitFilter()
@@ -0,0 +1,255 @@
+"""
+Lectura eficiente del log de texto y de sus archivos rotados.
+
+tail_lines() lee bloques de tamaño fijo desde el final del archivo hacia
+atrás, así que su coste depende de las líneas pedidas y no del tamaño del
+archivo. read_page() y iter_lines() permiten paginar y recorrer el log con
+cursores opacos que identifican un archivo por el hash de su primera línea
+(que no cambia al rotarlo ni al comprimirlo) y una posición en bytes dentro
+de él (sin comprimir).
+"""
+import base64
+import hashlib
+import logging
+import os
+import socket
+
+from modules.log_pipeline import LOG_FILE, LOG_BACKUP_COUNT
+from modules.log_archive import backup_path, open_segment, read_first_line, segment_size
+
+logger = logging.getLogger(socket.gethostname())
+
+BLOCK_SIZE = 8192
+
+
+class InvalidCursor(ValueError):
+    """El cursor no tiene un formato válido"""
+
+
+class ExpiredCursor(LookupError):
+    """El archivo al que apunta el cursor ya no existe (se eliminó al rotar)"""
+
+
+def _reverse_lines(f, end, block_size=BLOCK_SIZE):
+    """
+    Genera las líneas de un archivo abierto en binario desde `end` hacia el principio
+
+    Yields:
+        tuple: (offset de inicio de la línea, bytes de la línea sin salto de línea)
+    """
+    pos = end
+    head = b""  # Inicio de línea pendiente: su comienzo está en un bloque anterior
+    while pos > 0:
+        read = min(block_size, pos)
+        pos -= read
+        f.seek(pos)
+        parts = (f.read(read) + head).split(b"\n")
+        head = parts[0]
+        offset = pos + len(head) + 1
+        lines = []
+        for part in parts[1:]:
+            # El fragmento vacío tras el último salto de línea no es una línea
+            if part or offset < end:
+                lines.append((offset, part))
+            offset += len(part) + 1
+        yield from reversed(lines)
+    if head:
+        yield 0, head
+
+
+def tail_lines(path, lines, block_size=BLOCK_SIZE):
+    """
+    Devuelve las últimas líneas de un archivo leyendo hacia atrás por bloques
+
+    Args:
+        path: Ruta del archivo
+        lines: Número de líneas a devolver
+        block_size: Tamaño de bloque de lectura
+
+    Returns:
+        list: Líneas (str, sin salto de línea) en orden cronológico
+    """
+    if lines <= 0 or not os.path.exists(path):
+        return []
+    result = []
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        for _, line in _reverse_lines(f, end, block_size):
+            result.append(line.decode("utf-8", errors="replace"))
+            if len(result) >= lines:
+                break
+    result.reverse()
+    return result
+
+
+def _segment_identity(path):
+    """Identifica un archivo de log por el hash de su primera línea (no cambia al comprimirlo)"""
+    return hashlib.sha1(read_first_line(path)).hexdigest()[:16]
+
+
+def log_segments(base_filename=None, backup_count=None):
+    """
+    Devuelve los archivos del log de texto del más antiguo al más reciente,
+    incluidos los rotados ya comprimidos (.gz)
+
+    Returns:
+        list: Tuplas (ruta, identidad)
+    """
+    base = base_filename or LOG_FILE
+    backup_count = LOG_BACKUP_COUNT if backup_count is None else backup_count
+    paths = [backup_path(base, i) for i in range(backup_count, 0, -1)] + [base]
+    segments = []
+    for path in paths:
+        if path and os.path.exists(path) and segment_size(path) > 0:
+            segments.append((path, _segment_identity(path)))
+    return segments
+
+
+def encode_cursor(identity, offset):
+    """Codifica una posición (archivo, offset) como cursor opaco"""
+    return base64.urlsafe_b64encode(f"{identity}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor en (identidad, offset)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        identity, offset = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return identity, int(offset)
+    except Exception:
+        raise InvalidCursor(f"Cursor no válido: {cursor}")
+
+
+def _resolve_cursor(segments, cursor):
+    """Devuelve (índice del segmento, offset) al que apunta un cursor"""
+    identity, offset = decode_cursor(cursor)
+    for index, (_, segment_identity) in enumerate(segments):
+        if segment_identity == identity:
+            return index, offset
+    raise ExpiredCursor("El archivo del cursor ya no está disponible")
+
+
+def read_page(before=None, after=None, limit=100, base_filename=None):
+    """
+    Lee una página de líneas del log, incluidos los archivos rotados
+
+    Args:
+        before: Cursor; devuelve las `limit` líneas anteriores a esa posición
+        after: Cursor; devuelve las `limit` líneas a partir de esa posición
+        limit: Número máximo de líneas
+        base_filename: Log de texto (por defecto LOG_FILE)
+
+    Returns:
+        dict: {"lines": [...], "before": cursor, "after": cursor}. "before" es None
+        si la página empieza al principio del archivo más antiguo.
+    """
+    segments = log_segments(base_filename)
+    if not segments:
+        return {"lines": [], "before": None, "after": None}
+
+    lines = []
+    if after:
+        index, offset = _resolve_cursor(segments, after)
+        first = None
+        last = (index, offset)
+        while index < len(segments) and len(lines) < limit:
+            path, _ = segments[index]
+            with open_segment(path) as f:
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # Línea todavía incompleta
+                    if first is None:
+                        first = (index, offset)
+                    lines.append(raw[:-1].decode("utf-8", errors="replace"))
+                    offset += len(raw)
+                    last = (index, offset)
+                    if len(lines) >= limit:
+                        break
+            index += 1
+            offset = 0
+        first = first or last
+    else:
+        if before:
+            index, offset = _resolve_cursor(segments, before)
+        else:
+            index = len(segments) - 1
+            offset = segment_size(segments[index][0])
+        last = (index, offset)
+        first = (index, offset)
+        while index >= 0 and len(lines) < limit:
+            path, _ = segments[index]
+            with open_segment(path) as f:
+                for line_offset, raw in _reverse_lines(f, offset):
+                    lines.append(raw.decode("utf-8", errors="replace"))
+                    first = (index, line_offset)
+                    if len(lines) >= limit:
+                        break
+            index -= 1
+            if index >= 0:
+                offset = segment_size(segments[index][0])
+        lines.reverse()
+
+    at_start = first == (0, 0)
+    return {
+        "lines": lines,
+        "before": None if at_start else encode_cursor(segments[first[0]][1], first[1]),
+        "after": encode_cursor(segments[last[0]][1], last[1])
+    }
+
+
+def start_cursor(base_filename=None):
+    """Cursor que apunta al principio del archivo rotado más antiguo"""
+    segments = log_segments(base_filename)
+    if not segments:
+        return None
+    return encode_cursor(segments[0][1], 0)
+
+
+def end_cursor(base_filename=None):
+    """Cursor que apunta al final actual del log"""
+    segments = log_segments(base_filename)
+    if not segments:
+        return None
+    path, identity = segments[-1]
+    return encode_cursor(identity, segment_size(path))
+
+
+def iter_lines(after=None, until=None, base_filename=None, block_size=65536):
+    """
+    Recorre el log desde un cursor (o desde el archivo más antiguo) en bloques,
+    sin cargarlo entero en memoria. Pensado para respuestas en streaming.
+    Los cursores se validan antes de devolver el generador.
+
+    Args:
+        after: Cursor de inicio o None para empezar por el archivo más antiguo
+        until: Cursor de fin (por ejemplo end_cursor() al iniciar la respuesta)
+
+    Returns:
+        generator: Bloques (bytes) de líneas
+    """
+    segments = log_segments(base_filename)
+    start = _resolve_cursor(segments, after) if after else (0, 0)
+    stop = _resolve_cursor(segments, until) if until else None
+    return _iter_segments(segments, start, stop, block_size)
+
+
+def _iter_segments(segments, start, stop, block_size):
+    index, offset = start
+    while index < len(segments):
+        path, _ = segments[index]
+        limit = stop[1] if stop and stop[0] == index else None
+        with open_segment(path) as f:
+            f.seek(offset)
+            remaining = None if limit is None else max(0, limit - offset)
+            while remaining is None or remaining > 0:
+                chunk = f.read(block_size if remaining is None else min(block_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        if stop and stop[0] == index:
+            break
+        index += 1
+        offset = 0
@@ -0,0 +1,221 @@
+"""
+Envío del log de texto a un servidor central en lotes comprimidos.
+
+LogShipper lee las líneas nuevas del log (incluidos los archivos rotados y
+ya comprimidos) a partir del último cursor confirmado, las envía como un
+lote gzip por POST a LOG_SHIP_URL y solo después de una respuesta 2xx guarda
+el nuevo cursor en LOG_SHIP_STATE_FILE. Tras un reinicio o un corte de red
+el envío continúa donde se quedó; un lote puede repetirse si el servidor lo
+recibió pero la confirmación no llegó, por eso cada lote lleva su cursor de
+inicio en X-Log-Cursor para que el receptor pueda descartar duplicados.
+"""
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import random
+import socket
+
+from modules.control_interface import get_device_id
+from modules.http_client import get_async_client
+from modules.log_reader import read_page, start_cursor, ExpiredCursor, InvalidCursor
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración del envío de logs
+LOG_SHIP_URL = os.getenv("LOG_SHIP_URL", "")  # Endpoint que recibe los lotes (vacío = desactivado)
+LOG_SHIP_TOKEN = os.getenv("LOG_SHIP_TOKEN", "")  # Token Bearer opcional
+LOG_SHIP_INTERVAL = float(os.getenv("LOG_SHIP_INTERVAL", "60"))  # Segundos entre envíos
+LOG_SHIP_BATCH_LINES = int(os.getenv("LOG_SHIP_BATCH_LINES", "2000"))  # Líneas máximas por lote
+LOG_SHIP_MAX_DELAY = float(os.getenv("LOG_SHIP_MAX_DELAY", "600"))  # Espera máxima entre reintentos
+LOG_SHIP_STATE_FILE = os.getenv("LOG_SHIP_STATE_FILE", "log_shipper_state.json")
+
+
+class LogShipper:
+    """Envía en segundo plano las líneas nuevas del log en lotes gzip"""
+
+    def __init__(self, url=LOG_SHIP_URL, verify_ssl=True, state_file=LOG_SHIP_STATE_FILE,
+                 interval=LOG_SHIP_INTERVAL, batch_lines=LOG_SHIP_BATCH_LINES, base_filename=None):
+        """
+        Args:
+            url: Endpoint que recibe los lotes
+            verify_ssl: Si verificar certificados SSL
+            state_file: Archivo donde se guarda el cursor confirmado
+            interval: Segundos entre envíos cuando no hay más líneas pendientes
+            batch_lines: Líneas máximas por lote
+            base_filename: Log de texto (por defecto LOG_FILE)
+        """
+        self.url = url
+        self.verify_ssl = verify_ssl
+        self.state_file = state_file
+        self.interval = interval
+        self.batch_lines = batch_lines
+        self.base_filename = base_filename
+        self.cursor = None
+        self.batches = 0
+        self.lines = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+        self.failures = 0
+        self.delay = interval
+        self.last_error = None
+        self.last_success = None
+        self._task = None
+
+    def load_state(self):
+        """Carga el último cursor confirmado"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, "r") as f:
+                    self.cursor = json.load(f).get("cursor")
+        except Exception as e:
+            logger.warning(f"Error al cargar el estado del envío de logs: {e}")
+        return self.cursor
+
+    def save_state(self):
+        """Guarda el cursor confirmado"""
+        try:
+            state = {
+                "cursor": self.cursor,
+                "updated_at": datetime.datetime.now().isoformat()
+            }
+            tmp_path = f"{self.state_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"Error al guardar el estado del envío de logs: {e}")
+
+    def _read_batch(self):
+        """
+        Lee el siguiente lote a partir del cursor confirmado
+
+        Returns:
+            tuple: (cursor de inicio, página de read_page) o (None, None) si no hay log
+        """
+        cursor = self.cursor
+        if cursor:
+            try:
+                return cursor, read_page(after=cursor, limit=self.batch_lines, base_filename=self.base_filename)
+            except (ExpiredCursor, InvalidCursor) as e:
+                # El archivo del cursor ya se eliminó al rotar: seguir desde el más antiguo disponible
+                logger.warning(f"Cursor de envío de logs no disponible ({str(e)}), se continúa desde el archivo más antiguo")
+        cursor = start_cursor(self.base_filename)
+        if cursor is None:
+            return None, None
+        return cursor, read_page(after=cursor, limit=self.batch_lines, base_filename=self.base_filename)
+
+    async def ship_once(self):
+        """
+        Envía un lote con las líneas pendientes
+
+        Returns:
+            int: Líneas enviadas (0 si no había nada pendiente)
+
+        Raises:
+            httpx.HTTPError: Si el envío falla
+        """
+        cursor, page = await asyncio.to_thread(self._read_batch)
+        if not page or not page["lines"]:
+            return 0
+
+        raw = ("\n".join(page["lines"]) + "\n").encode("utf-8")
+        body = await asyncio.to_thread(gzip.compress, raw, 6)
+        headers = {
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Encoding": "gzip",
+            "X-Device-Id": get_device_id() or socket.gethostname(),
+            "X-Log-Cursor": cursor,
+            "X-Log-Next-Cursor": page["after"],
+            "X-Log-Lines": str(len(page["lines"]))
+        }
+        if LOG_SHIP_TOKEN:
+            headers["Authorization"] = f"Bearer {LOG_SHIP_TOKEN}"
+
+        response = await get_async_client(self.verify_ssl).post(self.url, content=body, headers=headers, timeout=60)
+        response.raise_for_status()
+
+        # Confirmar el cursor solo después de que el servidor haya aceptado el lote
+        self.cursor = page["after"]
+        await asyncio.to_thread(self.save_state)
+        self.batches += 1
+        self.lines += len(page["lines"])
+        self.bytes_raw += len(raw)
+        self.bytes_sent += len(body)
+        self.last_success = datetime.datetime.now().isoformat()
+        logger.debug(f"Lote de logs enviado: {len(page['lines'])} líneas, {len(raw)} bytes ({len(body)} comprimidos)")
+        return len(page["lines"])
+
+    async def run(self):
+        """Bucle de envío con backoff exponencial ante fallos"""
+        await asyncio.to_thread(self.load_state)
+        self.delay = self.interval
+        while True:
+            try:
+                shipped = await self.ship_once()
+                self.delay = self.interval
+                self.failures = 0
+                if shipped >= self.batch_lines:
+                    continue  # Quedan más líneas pendientes
+            except Exception as e:
+                logger.warning(f"No se pudo enviar el lote de logs a {self.url}: {str(e)}")
+                self.failures += 1
+                self.last_error = str(e)
+                self.delay = min(max(self.delay, 1) * 2, LOG_SHIP_MAX_DELAY)
+            await asyncio.sleep(self.delay * random.uniform(0.8, 1.2))
+
+    def start(self):
+        """Lanza el envío en segundo plano"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="log-shipper")
+        return self._task
+
+    async def stop(self):
+        """Detiene el envío"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "cursor": self.cursor,
+            "batches": self.batches,
+            "lines": self.lines,
+            "bytes_raw": self.bytes_raw,
+            "bytes_sent": self.bytes_sent,
+            "running": self._task is not None and not self._task.done(),
+            "failures": self.failures,
+            "delay": round(self.delay, 1),
+            "last_error": self.last_error,
+            "last_success": self.last_success
+        }
+
+
+_shipper = None
+
+
+def start_log_shipper(verify_ssl=True):
+    """
+    Crea y arranca el envío de logs del proceso si LOG_SHIP_URL está configurado
+
+    Returns:
+        LogShipper o None si está desactivado
+    """
+    global _shipper
+    if not LOG_SHIP_URL:
+        return None
+    if _shipper is None:
+        _shipper = LogShipper(verify_ssl=verify_ssl)
+    _shipper.start()
+    return _shipper
+
+
+def get_log_shipper():
+    """Devuelve el envío de logs del proceso o None si no se ha arrancado"""
+    return _shipper
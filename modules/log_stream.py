@@ -0,0 +1,175 @@
+"""
+Sesión de streaming de logs por WebSocket.
+
+La misma sesión la sirven la ruta WebSocket de FastAPI (/api/logs/ws, en el
+servidor uvicorn del puerto 8000) y el servidor websockets independiente del
+puerto 8001 (LOG_WS_LEGACY_PORT), que se mantiene por compatibilidad con los
+paneles que todavía no se hayan actualizado; LOG_WS_LEGACY_PORT=0 lo
+desactiva. La sesión solo recibe funciones para enviar y recibir texto, así
+que no depende de la implementación de WebSocket.
+
+La compresión permessage-deflate y los pings de protocolo los negocia el
+servidor (uvicorn o websockets) con la configuración de este módulo; además
+el cliente puede enviar {"action": "ping"} y recibe {"type": "pong"}, útil en
+navegadores, que no exponen los pings de protocolo.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+
+import websockets
+
+from modules.structured_log import entry_to_text
+from modules.log_filter import LogFilter, FilterStats, FILTER_STATS
+from modules.log_broadcast import get_log_broadcaster
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración del WebSocket de logs
+LOG_WS_COMPRESSION = os.getenv("LOG_WS_COMPRESSION", "True").lower() != "false"  # permessage-deflate
+LOG_WS_PING_INTERVAL = float(os.getenv("LOG_WS_PING_INTERVAL", "20"))  # Segundos entre pings de protocolo
+LOG_WS_PING_TIMEOUT = float(os.getenv("LOG_WS_PING_TIMEOUT", "20"))  # Segundos de espera del pong
+LOG_WS_LEGACY_PORT = int(os.getenv("LOG_WS_LEGACY_PORT", "8001") or 0)  # Puerto del servidor antiguo (0 = desactivado)
+
+
+def log_message(entry):
+    """Mensaje que se envía al cliente WebSocket por cada registro"""
+    log_entry = {
+        "timestamp": entry.get("time", "")[:19] or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "content": entry_to_text(entry) if "time" in entry else entry.get("message", ""),
+        "level": entry.get("level"),
+        "logger": entry.get("logger")
+    }
+    if entry.get("device_id"):
+        log_entry["device_id"] = entry["device_id"]
+    return json.dumps(log_entry)
+
+
+async def stream_logs(send, receive, closed_errors, remote=None):
+    """
+    Atiende una conexión de streaming de logs hasta que el cliente se desconecta.
+    El cliente puede enviar {"action": "filter", "level": ..., "logger": ..., "since": ...,
+    "until": ..., "contains": ..., "device_id": ...} para recibir solo los registros que
+    cumplan el filtro (un filtro vacío lo quita; regex no se admite porque el filtro se
+    evalúa en el bucle de eventos, ver modules/log_filter.py), {"action": "stats"}
+    para conocer los bytes ahorrados en la conexión y {"action": "ping"}.
+
+    Args:
+        send: Corrutina que envía un mensaje de texto
+        receive: Corrutina que devuelve el siguiente mensaje de texto
+        closed_errors: Excepciones que indican que la conexión se cerró
+        remote: Dirección del cliente (solo para los logs)
+    """
+    logger.info(f"Cliente conectado vía WebSocket desde {remote}")
+    broadcaster = get_log_broadcaster()
+    subscription = broadcaster.subscribe()
+    state = {"filter": None}
+    stats = FilterStats(parent=FILTER_STATS["websocket"])
+    send_lock = asyncio.Lock()
+
+    # La tarea de registros y las respuestas a filter/stats/ping envían por la misma
+    # conexión: el lock evita que dos envíos se solapen
+    async def send_message(text):
+        async with send_lock:
+            await send(text)
+
+    # Los registros nuevos llegan del broadcaster común, ya analizados
+    async def tail_log():
+        while True:
+            entry, size = await subscription.get()
+            stats.scanned(size)
+            log_filter = state["filter"]
+            if log_filter is not None and not log_filter.matches(entry):
+                continue
+            stats.sent(size)
+            try:
+                await send_message(log_message(entry))
+            except closed_errors:
+                break
+            except Exception as e:
+                logger.error(f"Error al enviar registro de log: {str(e)}")
+                break
+
+    tail_task = asyncio.create_task(tail_log())
+    try:
+        # Mantener la conexión abierta y atender los mensajes del cliente
+        while True:
+            try:
+                message = await receive()
+            except closed_errors:
+                break
+            try:
+                data = json.loads(message)
+            except (TypeError, ValueError):
+                continue  # Ignorar mensajes que no sean JSON válido
+            if not isinstance(data, dict):
+                continue
+
+            action = data.get("action")
+            if action == "filter":
+                try:
+                    log_filter = LogFilter.from_params(data, allow_regex=False)
+                except ValueError as e:
+                    await send_message(json.dumps({"type": "filter", "status": "error", "error": str(e)}))
+                    continue
+                state["filter"] = None if log_filter.is_empty else log_filter
+                logger.info(f"Filtro de logs WebSocket aplicado: {log_filter.to_dict()}")
+                await send_message(json.dumps({
+                    "type": "filter",
+                    "status": "ok",
+                    "filter": log_filter.to_dict(),
+                    "stats": stats.to_dict()
+                }))
+            elif action == "stats":
+                await send_message(json.dumps({
+                    "type": "stats",
+                    "stats": stats.to_dict(),
+                    "dropped": subscription.dropped
+                }))
+            elif action == "ping":
+                await send_message(json.dumps({"type": "pong", "time": datetime.now().timestamp()}))
+    except closed_errors:
+        pass
+    except Exception as e:
+        logger.error(f"Error en la conexión WebSocket de logs: {str(e)}")
+    finally:
+        tail_task.cancel()
+        try:
+            await tail_task
+        except asyncio.CancelledError:
+            pass
+        broadcaster.unsubscribe(subscription)
+        logger.info(f"Conexión WebSocket cerrada ({stats.to_dict()['bytes_saved']} bytes ahorrados por el filtro)")
+
+
+async def legacy_websocket_handler(websocket):
+    """Handler del servidor websockets independiente (compatibilidad con el puerto 8001)"""
+    await stream_logs(websocket.send, websocket.recv, (websockets.ConnectionClosed,), websocket.remote_address)
+
+
+async def start_legacy_server(port=None):
+    """
+    Arranca el servidor WebSocket independiente si está configurado
+
+    Args:
+        port: Puerto (por defecto LOG_WS_LEGACY_PORT; 0 lo desactiva)
+
+    Returns:
+        Servidor websockets o None si está desactivado
+    """
+    port = LOG_WS_LEGACY_PORT if port is None else port
+    if not port:
+        return None
+    server = await websockets.serve(
+        legacy_websocket_handler,
+        "0.0.0.0",
+        port,
+        compression="deflate" if LOG_WS_COMPRESSION else None,
+        ping_interval=LOG_WS_PING_INTERVAL or None,
+        ping_timeout=LOG_WS_PING_TIMEOUT or None
+    )
+    logger.info(f"Iniciando servidor WebSocket de compatibilidad en ws://0.0.0.0:{port}")
+    return server
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import random
+import socket
+
+from modules.devices import register_device_async
+
+logger = logging.getLogger(socket.gethostname())
+
+
+class RegistrationTask:
+    """
+    Registro del dispositivo en segundo plano con reintentos y backoff exponencial.
+
+    El registro no bloquea el arranque: la sincronización inicial puede empezar
+    mientras el servidor está caído, y el registro se reintenta de forma
+    independiente hasta que tenga éxito.
+    """
+
+    def __init__(self, verify_ssl=True, initial_delay=5, max_delay=600):
+        """
+        Inicializa la tarea de registro
+
+        Args:
+            verify_ssl: Si verificar certificados SSL
+            initial_delay: Espera inicial entre reintentos (segundos)
+            max_delay: Espera máxima entre reintentos (segundos)
+        """
+        self.verify_ssl = verify_ssl
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.registered = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._force = False
+        self._task = None
+
+    def start(self):
+        """Lanza la tarea de registro en segundo plano"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    def request(self, force=False):
+        """
+        Solicita un nuevo registro sin esperar a que termine
+
+        Args:
+            force: Registrar aunque los datos no hayan cambiado
+        """
+        self._force = self._force or force
+        self.registered.clear()
+        self._wakeup.set()
+        self.start()
+
+    async def stop(self):
+        """Detiene la tarea de registro"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        """Bucle de registro con backoff exponencial y jitter"""
+        delay = self.initial_delay
+        while True:
+            force, self._force = self._force, False
+            self._wakeup.clear()
+
+            success = await register_device_async(verify_ssl=self.verify_ssl, force=force)
+            if success:
+                self.registered.set()
+                delay = self.initial_delay
+                # Esperar a que se solicite un nuevo registro
+                await self._wakeup.wait()
+                continue
+
+            # Mantener la petición forzada para el siguiente intento
+            self._force = self._force or force
+            wait = delay * random.uniform(0.8, 1.2)
+            logger.error(f"No se pudo registrar el dispositivo, reintentando en {wait:.0f} segundos")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_delay)
@@ -0,0 +1,393 @@
+"""
+Registro de herramientas de captura de pantalla.
+
+Antes cada petición de captura lanzaba grim y después, siempre,
+xfce4-screenshooter, y si fallaban seguía con scrot, raspi2png, fbgrab y
+raspistill, lanzando un proceso fallido tras otro en cada petición. Ahora
+CaptureRegistry prueba las herramientas instaladas una sola vez (al arrancar
+y cuando cambia la sesión gráfica), recuerda la primera que funciona y va
+directamente a ella. Si la herramienta elegida falla se vuelve a probar la
+lista completa.
+
+La sesión gráfica se identifica por las variables de entorno de pantalla y
+por los sockets de Wayland y X11 que existen en ese momento: al reiniciarse
+el compositor o el servidor X los sockets se recrean y la firma cambia.
+
+Las capturas se devuelven en memoria. Las herramientas que pueden escribir
+la imagen en su salida estándar (grim, raspi2png, raspistill) se leen
+directamente de ella; grim además entrega PPM sin comprimir, que es más
+rápido de generar y de decodificar que PNG. Las que solo escriben en un
+archivo usan uno temporal con nombre único en SCREENSHOT_TMP_DIR (en memoria,
+/dev/shm, si existe), que se borra al leerlo.
+
+FramebufferBackend no lanza ningún proceso: proyecta el framebuffer
+(SCREENSHOT_FB_DEVICE, /dev/fb0) en memoria con mmap y convierte el formato
+de píxel con los decodificadores raw de PIL, escritos en C. La geometría y
+el formato se leen con los ioctl FBIOGET_VSCREENINFO/FBIOGET_FSCREENINFO y,
+si el dispositivo no los admite (por ejemplo un archivo normal), de sysfs
+(SCREENSHOT_FB_SYSFS).
+"""
+import fcntl
+import glob
+import io
+import logging
+import mmap
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración de la captura de pantalla
+SCREENSHOT_TIMEOUT = float(os.getenv("SCREENSHOT_TIMEOUT", "10"))  # Segundos máximos por captura
+SCREENSHOT_RUNTIME_DIR = os.getenv("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid() if hasattr(os, 'getuid') else 1000}"
+SCREENSHOT_X11_DIR = "/tmp/.X11-unix"
+SCREENSHOT_TMP_DIR = os.getenv("SCREENSHOT_TMP_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+SCREENSHOT_FB_DEVICE = os.getenv("SCREENSHOT_FB_DEVICE", "/dev/fb0")  # Framebuffer para la captura directa
+SCREENSHOT_FB_SYSFS = os.getenv("SCREENSHOT_FB_SYSFS", "/sys/class/graphics/fb0")  # Geometría si no hay ioctl
+
+# ioctl de <linux/fb.h>
+FBIOGET_VSCREENINFO = 0x4600
+FBIOGET_FSCREENINFO = 0x4602
+FB_VAR_SCREENINFO_SIZE = 160
+FB_VAR_SCREENINFO = struct.Struct("8I12I")  # xres ... bits_per_pixel, grayscale, red/green/blue/transp
+FB_FIX_SCREENINFO_SIZE = 80
+FB_FIX_SCREENINFO = struct.Struct("@16sL4I3HI")  # id, smem_start, smem_len, type ... line_length
+
+
+class CaptureError(Exception):
+    """Ninguna herramienta de captura pudo capturar la pantalla"""
+
+
+def display_session():
+    """
+    Describe la sesión gráfica actual
+
+    Returns:
+        dict: Variables de entorno para las herramientas de captura y firma de la sesión
+    """
+    env = {}
+    wayland_sockets = sorted(
+        path for path in glob.glob(os.path.join(SCREENSHOT_RUNTIME_DIR, "wayland-*"))
+        if not path.endswith(".lock")
+    )
+    x11_sockets = sorted(glob.glob(os.path.join(SCREENSHOT_X11_DIR, "X*")))
+
+    # Si el servicio arrancó sin variables de pantalla, usar los sockets que existan
+    if os.environ.get("WAYLAND_DISPLAY"):
+        env["WAYLAND_DISPLAY"] = os.environ["WAYLAND_DISPLAY"]
+    elif wayland_sockets:
+        env["WAYLAND_DISPLAY"] = os.path.basename(wayland_sockets[0])
+    if env.get("WAYLAND_DISPLAY") and not os.environ.get("XDG_RUNTIME_DIR"):
+        env["XDG_RUNTIME_DIR"] = SCREENSHOT_RUNTIME_DIR
+    if os.environ.get("DISPLAY"):
+        env["DISPLAY"] = os.environ["DISPLAY"]
+    elif x11_sockets:
+        env["DISPLAY"] = ":" + os.path.basename(x11_sockets[0])[1:]
+
+    signature = []
+    for path in wayland_sockets + x11_sockets:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_ino, stat.st_mtime))
+        except OSError:
+            continue
+    signature.append(tuple(sorted(env.items())))
+    return {"env": env, "signature": tuple(signature)}
+
+
+class CaptureBackend:
+    """Una herramienta de captura y sus estadísticas de latencia"""
+
+    def __init__(self, name, command, requires=None, stdout=False):
+        """
+        Args:
+            name: Nombre de la herramienta
+            command: Función que recibe la ruta de salida y la pantalla X y devuelve la orden
+            requires: Variable de entorno necesaria ("WAYLAND_DISPLAY" o "DISPLAY") o None
+            stdout: True si la herramienta escribe la imagen en su salida estándar
+        """
+        self.name = name
+        self.command = command
+        self.requires = requires
+        self.stdout = stdout
+        self.captures = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.last_ms = None
+        self.last_error = None
+
+    def available(self, session):
+        """Indica si la herramienta está instalada y la sesión tiene lo que necesita"""
+        binary = self.command("-", ":0")[0]
+        if shutil.which(binary) is None:
+            return False
+        return self.requires is None or self.requires in session["env"]
+
+    def _run(self, output, session):
+        env = dict(os.environ, **session["env"])
+        command = self.command(output, session["env"].get("DISPLAY", ":0"))
+        return subprocess.run(command, check=True, env=env, timeout=SCREENSHOT_TIMEOUT,
+                              stdout=subprocess.PIPE if self.stdout else subprocess.DEVNULL,
+                              stderr=subprocess.PIPE)
+
+    def _capture_to_file(self, session):
+        # scrot y xfce4-screenshooter eligen el formato por la extensión
+        fd, path = tempfile.mkstemp(prefix="screenshot-", suffix=".png", dir=SCREENSHOT_TMP_DIR)
+        os.close(fd)
+        try:
+            self._run(path, session)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def _grab(self, session):
+        if self.stdout:
+            return self._run("-", session).stdout
+        return self._capture_to_file(session)
+
+    def capture(self, session):
+        """
+        Captura la pantalla
+
+        Returns:
+            bytes: Imagen codificada (PNG, PPM o JPEG según la herramienta)
+
+        Raises:
+            subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError
+        """
+        started = time.perf_counter()
+        try:
+            data = self._grab(session)
+            if not data:
+                raise OSError(f"{self.name} no generó ninguna imagen")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            raise
+        elapsed = (time.perf_counter() - started) * 1000
+        self.captures += 1
+        self.total_ms += elapsed
+        self.last_ms = round(elapsed, 1)
+        self.last_error = None
+        return data
+
+    def stats(self):
+        return {
+            "captures": self.captures,
+            "failures": self.failures,
+            "last_ms": self.last_ms,
+            "avg_ms": round(self.total_ms / self.captures, 1) if self.captures else None,
+            "last_error": self.last_error
+        }
+
+
+class FramebufferBackend(CaptureBackend):
+    """Captura directa del framebuffer con mmap, sin lanzar procesos"""
+
+    def __init__(self, device=SCREENSHOT_FB_DEVICE, sysfs=SCREENSHOT_FB_SYSFS):
+        """
+        Args:
+            device: Dispositivo del framebuffer (o un archivo con su contenido)
+            sysfs: Directorio sysfs con virtual_size, bits_per_pixel y stride
+        """
+        super().__init__("framebuffer", lambda path, display: [device])
+        self.device = device
+        self.sysfs = sysfs
+
+    def available(self, session):
+        return os.access(self.device, os.R_OK)
+
+    def _read_sysfs(self, name):
+        with open(os.path.join(self.sysfs, name), "r") as f:
+            return f.read().strip()
+
+    def geometry(self, fd):
+        """
+        Geometría y formato del framebuffer
+
+        Returns:
+            dict: width, height, stride, offset (bytes hasta la zona visible) y rawmode de PIL
+        """
+        try:
+            var = FB_VAR_SCREENINFO.unpack_from(fcntl.ioctl(fd, FBIOGET_VSCREENINFO, bytes(FB_VAR_SCREENINFO_SIZE)))
+            fix = fcntl.ioctl(fd, FBIOGET_FSCREENINFO, bytes(FB_FIX_SCREENINFO_SIZE))
+            line_length = FB_FIX_SCREENINFO.unpack_from(fix)[-1]
+            width, height, _, _, xoffset, yoffset, bpp, _ = var[:8]
+            red_offset = var[8]
+        except OSError:
+            # Sin ioctl (archivo normal o controlador limitado): usar sysfs
+            width, height = (int(v) for v in self._read_sysfs("virtual_size").split(","))
+            bpp = int(self._read_sysfs("bits_per_pixel"))
+            try:
+                line_length = int(self._read_sysfs("stride"))
+            except OSError:
+                line_length = width * bpp // 8
+            xoffset = yoffset = 0
+            red_offset = 16 if bpp in (24, 32) else 11
+
+        if bpp == 32:
+            rawmode = "BGRX" if red_offset == 16 else "RGBX"
+        elif bpp == 24:
+            rawmode = "BGR" if red_offset == 16 else "RGB"
+        elif bpp == 16:
+            rawmode = "BGR;16" if red_offset == 11 else "RGB;16"
+        else:
+            raise OSError(f"Formato de framebuffer no soportado: {bpp} bits por píxel")
+        return {
+            "width": width,
+            "height": height,
+            "stride": line_length,
+            "offset": yoffset * line_length + xoffset * bpp // 8,
+            "rawmode": rawmode
+        }
+
+    def _grab(self, session):
+        with open(self.device, "rb") as f:
+            info = self.geometry(f.fileno())
+            length = info["offset"] + info["stride"] * info["height"]
+            with mmap.mmap(f.fileno(), length, mmap.MAP_SHARED, mmap.PROT_READ) as buffer:
+                view = memoryview(buffer)
+                try:
+                    # frombytes copia los píxeles, así que la imagen no depende del mmap
+                    image = Image.frombytes(
+                        "RGB", (info["width"], info["height"]), view[info["offset"]:length],
+                        "raw", info["rawmode"], info["stride"], 1
+                    )
+                finally:
+                    view.release()
+        # PPM: sin compresión, lo más barato de codificar y de volver a decodificar
+        output = io.BytesIO()
+        image.save(output, format="PPM")
+        return output.getvalue()
+
+
+def default_backends():
+    """Herramientas de captura en orden de preferencia"""
+    return [
+        CaptureBackend("grim", lambda path, display: ["grim", "-t", "ppm", path], requires="WAYLAND_DISPLAY",
+                       stdout=True),
+        CaptureBackend("xfce4-screenshooter",
+                       lambda path, display: ["xfce4-screenshooter", f"--display={display}", "-f", "-s", path],
+                       requires="DISPLAY"),
+        CaptureBackend("scrot", lambda path, display: ["scrot", "-o", path], requires="DISPLAY"),
+        CaptureBackend("raspi2png", lambda path, display: ["raspi2png", "--stdout"], stdout=True),
+        FramebufferBackend(),
+        CaptureBackend("fbgrab", lambda path, display: ["fbgrab", path]),
+        CaptureBackend("raspistill", lambda path, display: ["raspistill", "-o", path, "-t", "1"], stdout=True),
+    ]
+
+
+class CaptureRegistry:
+    """
+    Elige y recuerda la herramienta de captura que funciona en la sesión actual.
+    Es seguro usarla desde varios hilos.
+    """
+
+    def __init__(self, backends=None):
+        self.backends = backends if backends is not None else default_backends()
+        self.selected = None
+        self.session = None
+        self.probes = 0
+        self.probed_at = None
+        self._lock = threading.Lock()
+
+    def probe(self, session=None):
+        """
+        Prueba las herramientas disponibles en orden y selecciona la primera que funciona
+
+        Args:
+            session: Sesión gráfica (por defecto la actual)
+
+        Returns:
+            CaptureBackend o None si ninguna funciona
+        """
+        with self._lock:
+            backend, _ = self._probe(session or display_session())
+            return backend
+
+    def _probe(self, session):
+        """Devuelve (herramienta seleccionada, captura de prueba) o (None, None)"""
+        self.probes += 1
+        self.probed_at = time.time()
+        self.session = session
+        self.selected = None
+        for backend in self.backends:
+            if not backend.available(session):
+                continue
+            try:
+                data = backend.capture(session)
+            except Exception as e:
+                logger.warning(f"Herramienta de captura {backend.name} no disponible: {e}")
+                continue
+            self.selected = backend
+            logger.info(f"Herramienta de captura seleccionada: {backend.name} ({backend.last_ms:.0f} ms)")
+            return backend, data
+        logger.error("No hay ninguna herramienta de captura de pantalla que funcione")
+        return None, None
+
+    def _probe_or_fail(self, session):
+        backend, data = self._probe(session)
+        if backend is None:
+            raise CaptureError("Ninguna herramienta de captura disponible o funcionando")
+        return backend.name, data
+
+    def capture(self):
+        """
+        Captura la pantalla con la herramienta seleccionada, volviendo a probar si
+        cambió la sesión gráfica o si la herramienta falla
+
+        Returns:
+            tuple: (nombre de la herramienta usada, imagen codificada en bytes)
+
+        Raises:
+            CaptureError: Si ninguna herramienta funciona
+        """
+        session = display_session()
+        with self._lock:
+            backend = self.selected
+            if backend is None or self.session is None or session["signature"] != self.session["signature"]:
+                if self.session is not None and session["signature"] != self.session["signature"]:
+                    logger.info("La sesión gráfica cambió, se vuelven a probar las herramientas de captura")
+                return self._probe_or_fail(session)
+
+            try:
+                return backend.name, backend.capture(session)
+            except Exception as e:
+                logger.warning(f"Error al capturar con {backend.name}: {e}; se vuelven a probar las herramientas")
+
+            return self._probe_or_fail(session)
+
+    def stats(self):
+        """Herramienta seleccionada y latencia de cada herramienta"""
+        return {
+            "selected": self.selected.name if self.selected else None,
+            "probes": self.probes,
+            "probed_at": self.probed_at,
+            "session": self.session["env"] if self.session else None,
+            "backends": {backend.name: backend.stats() for backend in self.backends}
+        }
+
+
+_registry = None
+
+
+def probe_capture_backends():
+    """Prueba las herramientas de captura (pensado para el arranque)"""
+    return get_capture_registry().probe()
+
+
+def get_capture_registry():
+    """Devuelve el registro de herramientas de captura del proceso"""
+    global _registry
+    if _registry is None:
+        _registry = CaptureRegistry()
+    return _registry
@@ -0,0 +1,227 @@
+"""
+Vigilancia de la pantalla: detección de pantalla negra o congelada.
+
+Hasta ahora la única forma de saber que una pantalla estaba parada era que
+alguien la mirara. ScreenHealthMonitor toma cada SCREEN_HEALTH_INTERVAL
+segundos (con un margen aleatorio del ±30 %, para no sincronizarse con un
+video en bucle y ver siempre el mismo fotograma) una captura reducida a unos
+pocos píxeles, y calcula:
+
+- la luminancia media y su desviación: muy baja y uniforme = pantalla negra;
+- un hash perceptual (dHash de 64 bits): si no cambia durante
+  SCREEN_HEALTH_FROZEN_SAMPLES muestras seguidas mientras el servicio de
+  reproducción está activo y la playlist tiene videos, la pantalla está
+  congelada.
+
+El resumen se incluye en el heartbeat de update_status, así que el panel de
+la flota no necesita descargar capturas completas. Las capturas usan el
+mismo ejecutor acotado que /api/screenshot/; si está ocupado, la muestra se
+omite.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import subprocess
+import time
+
+from PIL import ImageStat
+
+from modules.bounded_executor import get_screenshot_executor, ExecutorBusy, ExecutorTimeout
+from modules.screen_capture import get_capture_registry, CaptureError
+from modules.screenshot_image import decode_capture, scale_capture
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración de la vigilancia de la pantalla
+SCREEN_HEALTH_ENABLED = os.getenv("SCREEN_HEALTH_ENABLED", "True").lower() != "false"
+SCREEN_HEALTH_INTERVAL = float(os.getenv("SCREEN_HEALTH_INTERVAL", "60"))  # Segundos entre muestras
+SCREEN_HEALTH_BLACK_LUMA = float(os.getenv("SCREEN_HEALTH_BLACK_LUMA", "16"))  # Luminancia media máxima (0-255)
+SCREEN_HEALTH_BLACK_SAMPLES = int(os.getenv("SCREEN_HEALTH_BLACK_SAMPLES", "3"))  # Muestras negras seguidas
+SCREEN_HEALTH_FROZEN_SAMPLES = int(os.getenv("SCREEN_HEALTH_FROZEN_SAMPLES", "5"))  # Muestras iguales seguidas
+SCREEN_HEALTH_HASH_DISTANCE = int(os.getenv("SCREEN_HEALTH_HASH_DISTANCE", "4"))  # Bits distintos tolerados
+SCREEN_HEALTH_SERVICE = os.getenv("SERVICE_NAME", "videoloop.service")
+SCREEN_HEALTH_PLAYLIST = os.path.join(os.getenv("DOWNLOAD_PATH", "./downloads"), "playlist.m3u")
+
+BLACK_MAX_STDDEV = 8  # Una imagen oscura pero con contenido tiene más variación
+
+
+def dhash(image):
+    """
+    Hash perceptual por diferencias (dHash) de 64 bits
+
+    Args:
+        image: Imagen PIL de cualquier tamaño
+
+    Returns:
+        int
+    """
+    small = image.convert("L").resize((9, 8))
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hash_distance(a, b):
+    """Número de bits distintos entre dos hashes"""
+    return bin(a ^ b).count("1")
+
+
+def analyze_capture(data):
+    """
+    Reduce una captura y calcula su hash y su luminancia
+
+    Returns:
+        dict: {"hash", "luma", "stddev"}
+    """
+    image = scale_capture(data, decode_capture(data), 64).convert("L")
+    stat = ImageStat.Stat(image)
+    return {
+        "hash": dhash(image),
+        "luma": stat.mean[0],
+        "stddev": stat.stddev[0]
+    }
+
+
+def playback_expected(service=SCREEN_HEALTH_SERVICE, playlist=SCREEN_HEALTH_PLAYLIST):
+    """Indica si la pantalla debería estar cambiando: servicio activo y playlist con videos"""
+    try:
+        with open(playlist, "r") as f:
+            if not any(line.strip() and not line.startswith("#") for line in f):
+                return False
+    except OSError:
+        return False
+    result = subprocess.run(["systemctl", "is-active", "--quiet", service],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return result.returncode == 0
+
+
+class ScreenHealthMonitor:
+    """Muestrea la pantalla a baja frecuencia y detecta pantallas negras o congeladas"""
+
+    def __init__(self, interval=SCREEN_HEALTH_INTERVAL, black_luma=SCREEN_HEALTH_BLACK_LUMA,
+                 black_samples=SCREEN_HEALTH_BLACK_SAMPLES, frozen_samples=SCREEN_HEALTH_FROZEN_SAMPLES,
+                 hash_distance=SCREEN_HEALTH_HASH_DISTANCE, expected=playback_expected):
+        """
+        Args:
+            interval: Segundos medios entre muestras
+            black_luma: Luminancia media por debajo de la cual una muestra es negra
+            black_samples: Muestras negras seguidas para marcar la pantalla como negra
+            frozen_samples: Muestras sin cambios seguidas para marcarla como congelada
+            hash_distance: Bits distintos del hash que todavía se consideran la misma imagen
+            expected: Función que indica si la reproducción debería estar en marcha
+        """
+        self.interval = interval
+        self.black_luma = black_luma
+        self.black_samples = max(1, black_samples)
+        self.frozen_samples = max(2, frozen_samples)
+        self.hash_distance = hash_distance
+        self.expected = expected
+        self.status = "unknown"
+        self.since = None
+        self.last = None
+        self.sampled_at = None
+        self.playback_expected = None
+        self.black_count = 0
+        self.static_count = 0
+        self.samples = 0
+        self.skipped = 0
+        self._task = None
+
+    def update(self, sample, expected):
+        """
+        Incorpora una muestra y recalcula el estado
+
+        Returns:
+            str: "ok", "black" o "frozen"
+        """
+        black = sample["luma"] <= self.black_luma and sample["stddev"] <= BLACK_MAX_STDDEV
+        self.black_count = self.black_count + 1 if black else 0
+        if self.last is not None and hash_distance(sample["hash"], self.last["hash"]) <= self.hash_distance:
+            self.static_count += 1
+        else:
+            self.static_count = 0
+
+        if self.black_count >= self.black_samples:
+            status = "black"
+        elif expected and self.static_count >= self.frozen_samples - 1:
+            status = "frozen"
+        else:
+            status = "ok"
+
+        if status != self.status:
+            if status != "ok":
+                logger.warning(f"Pantalla {'negra' if status == 'black' else 'congelada'} detectada "
+                               f"(luminancia {sample['luma']:.1f}, {self.static_count + 1} muestras iguales)")
+            elif self.status != "unknown":
+                logger.info("La pantalla vuelve a mostrar contenido")
+            self.status = status
+            self.since = time.time()
+
+        self.last = sample
+        self.playback_expected = expected
+        self.sampled_at = time.time()
+        self.samples += 1
+        return status
+
+    async def sample(self):
+        """Toma una muestra; devuelve el estado o None si no se pudo capturar"""
+        executor = get_screenshot_executor()
+        try:
+            _, data = await executor.run(get_capture_registry().capture)
+            sample = await executor.run(analyze_capture, data)
+            expected = await asyncio.to_thread(self.expected)
+        except (ExecutorBusy, ExecutorTimeout, CaptureError) as e:
+            self.skipped += 1
+            logger.debug(f"Muestra de la pantalla omitida: {e}")
+            return None
+        return self.update(sample, expected)
+
+    async def run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                self.skipped += 1
+                logger.warning(f"Error al vigilar la pantalla: {e}")
+            await asyncio.sleep(self.interval * random.uniform(0.7, 1.3))
+
+    def start(self):
+        """Lanza la vigilancia en segundo plano"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="screen-health")
+        return self._task
+
+    def summary(self):
+        """Resumen compacto para el heartbeat, o None si todavía no hay muestras"""
+        if self.last is None:
+            return None
+        return {
+            "status": self.status,
+            "since": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.since)) if self.since else None,
+            "luma": round(self.last["luma"], 1),
+            "hash": f"{self.last['hash']:016x}",
+            "static_samples": self.static_count + 1,
+            "playback_expected": self.playback_expected
+        }
+
+    def stats(self):
+        return dict(self.summary() or {"status": self.status}, samples=self.samples, skipped=self.skipped,
+                    interval=self.interval)
+
+
+_monitor = None
+
+
+def get_screen_health_monitor():
+    """Devuelve el monitor de la pantalla del proceso"""
+    global _monitor
+    if _monitor is None:
+        _monitor = ScreenHealthMonitor()
+    return _monitor
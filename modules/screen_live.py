@@ -0,0 +1,269 @@
+"""
+Vista en directo de la pantalla por WebSocket con envío de teselas cambiadas.
+
+Para diagnosticar, los operadores consultaban /api/screenshot/ en bucle, y
+cada consulta era una captura y una codificación PNG completas. LiveView
+captura a una frecuencia baja (SCREENSHOT_LIVE_FPS) y compartida por todos
+los espectadores, divide cada fotograma en teselas de SCREENSHOT_LIVE_TILE
+píxeles y solo codifica (en JPEG) y envía las teselas que cambiaron desde el
+fotograma anterior. Un espectador nuevo, o uno que se quedó atrás, recibe
+un fotograma completo con las últimas teselas ya codificadas.
+
+Presupuesto de CPU: el trabajo de cada fotograma (captura, decodificación,
+comparación y codificación) se hace en un hilo propio con prioridad mínima
+(nice 19), y después de cada fotograma se espera lo necesario para que ese
+trabajo no supere la fracción SCREENSHOT_LIVE_CPU_BUDGET del tiempo. Se
+mide el tiempo real, que siempre es mayor o igual al de CPU, así que el
+límite nunca se queda corto.
+
+El bucle de captura solo existe mientras haya espectadores: al irse el
+último se detiene y se liberan los fotogramas guardados.
+
+Protocolo: por cada fotograma se envía un mensaje de texto JSON
+{"type": "frame", "seq", "width", "height", "tile", "full", "tiles": [[x, y, w, h, bytes], ...]}
+seguido de un mensaje binario con los JPEG de esas teselas concatenados en
+el mismo orden. El cliente puede enviar {"action": "keyframe"} para pedir un
+fotograma completo y {"action": "stats"}.
+"""
+import asyncio
+import concurrent.futures
+import io
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from modules.screen_capture import get_capture_registry
+from modules.screenshot_image import decode_capture, scale_capture
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración de la vista en directo
+SCREENSHOT_LIVE_FPS = float(os.getenv("SCREENSHOT_LIVE_FPS", "2"))  # Fotogramas por segundo máximos
+SCREENSHOT_LIVE_WIDTH = int(os.getenv("SCREENSHOT_LIVE_WIDTH", "640"))  # Ancho de la vista
+SCREENSHOT_LIVE_TILE = int(os.getenv("SCREENSHOT_LIVE_TILE", "64"))  # Lado de las teselas en píxeles
+SCREENSHOT_LIVE_QUALITY = int(os.getenv("SCREENSHOT_LIVE_QUALITY", "70"))  # Calidad JPEG de las teselas
+SCREENSHOT_LIVE_CPU_BUDGET = float(os.getenv("SCREENSHOT_LIVE_CPU_BUDGET", "0.2"))  # Fracción de tiempo máxima
+
+
+class Viewer:
+    """Cola de un espectador; si se llena se vacía y el espectador recibe un fotograma completo"""
+
+    def __init__(self, maxsize=2):
+        self.queue = asyncio.Queue(maxsize)
+        self.needs_keyframe = True
+        self.dropped = 0
+        self.lock = asyncio.Lock()  # Mantiene juntos el mensaje de texto y el binario de cada fotograma
+
+    def put(self, message):
+        if self.needs_keyframe:
+            # Recibirá el fotograma completo, que ya incluye estas teselas
+            if self.queue.empty():
+                self.queue.put_nowait(None)
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.needs_keyframe = True
+            self.queue.put_nowait(None)  # Despertar al emisor
+
+
+class LiveView:
+    """Captura compartida por todos los espectadores con diferencias por teselas"""
+
+    def __init__(self, fps=SCREENSHOT_LIVE_FPS, width=SCREENSHOT_LIVE_WIDTH, tile=SCREENSHOT_LIVE_TILE,
+                 quality=SCREENSHOT_LIVE_QUALITY, cpu_budget=SCREENSHOT_LIVE_CPU_BUDGET, capture=None):
+        """
+        Args:
+            fps: Fotogramas por segundo máximos
+            width: Ancho de la vista
+            tile: Lado de las teselas en píxeles
+            quality: Calidad JPEG de las teselas
+            cpu_budget: Fracción máxima del tiempo dedicada a producir fotogramas (0-1)
+            capture: Función que devuelve (herramienta, bytes); por defecto el registro de captura
+        """
+        self.interval = 1 / fps if fps > 0 else 1.0
+        self.width = width
+        self.tile = max(8, tile)
+        self.quality = quality
+        self.cpu_budget = min(max(cpu_budget, 0.01), 1.0)
+        self.capture = capture or (lambda: get_capture_registry().capture())
+        self.viewers = set()
+        self.seq = 0
+        self.size = None
+        self.frames = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.tiles_sent = 0
+        self.bytes_sent = 0
+        self.work_ms = 0.0
+        self.throttled_s = 0.0
+        self._tiles = {}  # (x, y) -> (bytes crudos, JPEG, ancho, alto)
+        self._task = None
+        self._executor = None
+
+    def subscribe(self):
+        viewer = Viewer()
+        self.viewers.add(viewer)
+        if self._task is None or self._task.done():
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="screen-live", initializer=_lower_priority
+            )
+            self._task = asyncio.create_task(self._run(), name="screen-live")
+            logger.info("Vista en directo de la pantalla iniciada")
+        return viewer
+
+    def unsubscribe(self, viewer):
+        self.viewers.discard(viewer)
+
+    def request_keyframe(self, viewer):
+        """Hace que el espectador reciba un fotograma completo"""
+        viewer.needs_keyframe = True
+        if viewer.queue.empty():
+            viewer.queue.put_nowait(None)
+
+    def keyframe(self):
+        """Mensajes de un fotograma completo con las últimas teselas codificadas"""
+        return self._messages(sorted(self._tiles.items()), full=True)
+
+    def _messages(self, tiles, full):
+        header = {
+            "type": "frame",
+            "seq": self.seq,
+            "width": self.size[0] if self.size else 0,
+            "height": self.size[1] if self.size else 0,
+            "tile": self.tile,
+            "full": full,
+            "tiles": []
+        }
+        chunks = []
+        for (x, y), (raw, jpeg, w, h) in tiles:
+            header["tiles"].append([x, y, w, h, len(jpeg)])
+            chunks.append(jpeg)
+        return json.dumps(header), b"".join(chunks), len(chunks)
+
+    def _frame(self):
+        """
+        Captura un fotograma y codifica las teselas que cambiaron (en el hilo de la vista)
+
+        Returns:
+            list: Teselas cambiadas [((x, y), (bytes crudos, JPEG, ancho, alto)), ...]
+        """
+        _, data = self.capture()
+        image = scale_capture(data, decode_capture(data), self.width).convert("RGB")
+        # Se trabaja sobre una copia que se publica al final: keyframe() la lee desde el bucle de eventos
+        tiles = dict(self._tiles) if image.size == self.size else {}
+
+        changed = []
+        width, height = image.size
+        for y in range(0, height, self.tile):
+            for x in range(0, width, self.tile):
+                box = (x, y, min(x + self.tile, width), min(y + self.tile, height))
+                region = image.crop(box)
+                raw = region.tobytes()
+                previous = tiles.get((x, y))
+                if previous is not None and previous[0] == raw:
+                    continue
+                buffer = io.BytesIO()
+                region.save(buffer, format="JPEG", quality=self.quality)
+                tile = (raw, buffer.getvalue(), box[2] - x, box[3] - y)
+                tiles[(x, y)] = tile
+                changed.append(((x, y), tile))
+        self.size, self._tiles = image.size, tiles
+        return changed
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.viewers:
+                started = time.perf_counter()
+                try:
+                    changed = await loop.run_in_executor(self._executor, self._frame)
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"Error en la vista en directo de la pantalla: {e}")
+                    changed = None
+                work = time.perf_counter() - started
+                self.work_ms += work * 1000
+
+                if changed is not None:
+                    self.frames += 1
+                    if changed:
+                        self.seq += 1
+                        message = self._messages(changed, full=False)
+                        for viewer in self.viewers:
+                            viewer.put(message)
+                    else:
+                        self.unchanged += 1
+
+                # Respetar la frecuencia y el presupuesto: trabajo / (trabajo + espera) <= presupuesto
+                budget_wait = work * (1 / self.cpu_budget - 1)
+                wait = max(self.interval - work, budget_wait)
+                if budget_wait > self.interval - work:
+                    self.throttled_s += budget_wait - max(self.interval - work, 0)
+                await asyncio.sleep(wait)
+        finally:
+            self._tiles = {}
+            self.size = None
+            self._executor.shutdown(wait=False)
+            logger.info("Vista en directo de la pantalla detenida: no quedan espectadores")
+
+    async def stream(self, viewer, send_text, send_bytes):
+        """Envía los fotogramas a un espectador hasta que se cancele la tarea"""
+        while True:
+            if viewer.needs_keyframe and self._tiles:
+                viewer.needs_keyframe = False
+                # Descartar lo que quedara en la cola: el fotograma completo ya lo incluye
+                while not viewer.queue.empty():
+                    viewer.queue.get_nowait()
+                message = self.keyframe()
+            else:
+                message = await viewer.queue.get()
+                if message is None:
+                    continue
+            text, binary, count = message
+            async with viewer.lock:
+                await send_text(text)
+                await send_bytes(binary)
+            self.bytes_sent += len(binary)
+            self.tiles_sent += count
+
+    def stats(self):
+        attempts = self.frames + self.errors
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "viewers": len(self.viewers),
+            "size": self.size,
+            "frames": self.frames,
+            "unchanged": self.unchanged,
+            "errors": self.errors,
+            "tiles_sent": self.tiles_sent,
+            "bytes_sent": self.bytes_sent,
+            "avg_frame_ms": round(self.work_ms / attempts, 1) if attempts else None,
+            "throttled_s": round(self.throttled_s, 1),
+            "cpu_budget": self.cpu_budget
+        }
+
+
+def _lower_priority():
+    # Prioridad mínima para no competir con la reproducción (nice por hilo en Linux)
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+_live_view = None
+
+
+def get_live_view():
+    """Devuelve la vista en directo del proceso"""
+    global _live_view
+    if _live_view is None:
+        _live_view = LiveView()
+    return _live_view
@@ -0,0 +1,100 @@
+"""
+Caché de capturas de pantalla con una sola captura en curso.
+
+El panel de la flota refresca a la vez las miniaturas de muchas pantallas y
+varios operadores suelen mirar la misma tienda: sin caché cada petición
+lanzaba una captura y un redimensionado completos. ScreenshotCache guarda el
+último resultado durante SCREENSHOT_CACHE_TTL segundos y, si llega una
+petición mientras hay una captura en curso, espera a esa captura en lugar de
+lanzar otra (single-flight).
+
+La captura en curso se protege con asyncio.shield: si el cliente que la
+inició se desconecta, la captura sigue para los demás que la esperan.
+"""
+import asyncio
+import os
+import time
+
+# Configuración de la caché de capturas
+SCREENSHOT_CACHE_TTL = float(os.getenv("SCREENSHOT_CACHE_TTL", "5"))  # Segundos que se reutiliza una captura
+
+
+class ScreenshotCache:
+    """Reutiliza la última captura y agrupa las peticiones simultáneas"""
+
+    def __init__(self, producer, ttl=SCREENSHOT_CACHE_TTL):
+        """
+        Args:
+            producer: Corrutina sin argumentos que captura la pantalla y devuelve un dict
+            ttl: Segundos que se reutiliza una captura por defecto
+        """
+        self.producer = producer
+        self.ttl = ttl
+        self.entry = None
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.errors = 0
+        self._created = None
+        self._inflight = None
+
+    def age(self):
+        """Segundos desde la última captura o None si no hay ninguna"""
+        if self._created is None:
+            return None
+        return time.monotonic() - self._created
+
+    async def _produce(self):
+        try:
+            entry = await self.producer()
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight = None
+        self.entry = entry
+        self._created = time.monotonic()
+        return entry
+
+    async def get(self, max_age=None):
+        """
+        Devuelve una captura con una antigüedad máxima de max_age segundos
+
+        Args:
+            max_age: Antigüedad máxima aceptada (por defecto el TTL; 0 fuerza una captura nueva)
+
+        Returns:
+            tuple: (resultado del producer, "hit" | "shared" | "miss")
+
+        Raises:
+            Exception: La que lance el producer
+        """
+        max_age = self.ttl if max_age is None else max_age
+        age = self.age()
+        if self.entry is not None and age <= max_age:
+            self.hits += 1
+            return self.entry, "hit"
+
+        # Una captura en curso siempre es más reciente que cualquier max_age
+        if self._inflight is not None:
+            self.shared += 1
+            return await asyncio.shield(self._inflight), "shared"
+
+        self.misses += 1
+        self._inflight = asyncio.ensure_future(self._produce())
+        # Evitar el aviso de excepción no recuperada si todos los clientes se desconectan
+        self._inflight.add_done_callback(lambda future: future.cancelled() or future.exception())
+        return await asyncio.shield(self._inflight), "miss"
+
+    def stats(self):
+        requests = self.hits + self.shared + self.misses
+        age = self.age()
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "shared": self.shared,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round((self.hits + self.shared) / requests, 3) if requests else None,
+            "age": round(age, 2) if age is not None else None
+        }
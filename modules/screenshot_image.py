@@ -0,0 +1,138 @@
+"""
+Decodificación y codificación de las capturas de pantalla.
+
+Antes cada captura se redimensionaba a 640 px con LANCZOS sobre la imagen
+completa y se devolvía en PNG, la opción más cara en CPU y en bytes en una
+Raspberry Pi. Ahora:
+
+- Las capturas JPEG (raspistill) se decodifican en modo draft, que hace la
+  reducción en el propio decodificador a 1/2, 1/4 o 1/8 del tamaño.
+- El redimensionado usa reducing_gap: primero una reducción entera por
+  bloques (Image.reduce) y después LANCZOS solo sobre una imagen ya pequeña.
+- El formato se elige por petición: png (compatibilidad), jpeg o webp.
+
+El ETag de cada variante se deriva del hash de la captura original, así que
+si la pantalla no ha cambiado entre dos capturas el cliente recibe un 304.
+"""
+import hashlib
+import io
+import os
+
+from PIL import Image
+
+# Configuración de las variantes de captura
+SCREENSHOT_DEFAULT_WIDTH = int(os.getenv("SCREENSHOT_DEFAULT_WIDTH", "640"))  # Ancho por defecto
+SCREENSHOT_DEFAULT_FORMAT = os.getenv("SCREENSHOT_DEFAULT_FORMAT", "png").lower()  # png, jpeg o webp
+SCREENSHOT_REDUCING_GAP = float(os.getenv("SCREENSHOT_REDUCING_GAP", "1.5"))  # Reducción previa al remuestreo
+SCREENSHOT_MIN_WIDTH = 16
+
+FORMATS = {
+    # formato: (formato PIL, tipo MIME, calidad por defecto)
+    "png": ("PNG", "image/png", None),
+    "jpeg": ("JPEG", "image/jpeg", 80),
+    "webp": ("WEBP", "image/webp", 75),
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+def parse_variant(width=None, format=None, quality=None):
+    """
+    Valida los parámetros de una variante
+
+    Returns:
+        tuple: (ancho, formato, calidad)
+
+    Raises:
+        ValueError: Si algún parámetro no es válido
+    """
+    width = SCREENSHOT_DEFAULT_WIDTH if width is None else width
+    if width < SCREENSHOT_MIN_WIDTH:
+        raise ValueError(f"width debe ser al menos {SCREENSHOT_MIN_WIDTH}")
+    format = (format or SCREENSHOT_DEFAULT_FORMAT).lower()
+    format = FORMAT_ALIASES.get(format, format)
+    if format not in FORMATS:
+        raise ValueError(f"Formato no soportado: {format} (usa {', '.join(FORMATS)})")
+    if FORMATS[format][2] is None:
+        quality = None  # PNG no tiene calidad
+    elif quality is None:
+        quality = FORMATS[format][2]
+    elif not 1 <= quality <= 100:
+        raise ValueError("quality debe estar entre 1 y 100")
+    return width, format, quality
+
+
+def capture_digest(data):
+    """Hash corto de la captura original, base de los ETag"""
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def decode_capture(data):
+    """
+    Decodifica una captura para reutilizarla en varias variantes
+
+    Returns:
+        Image: Imagen ya cargada, o None si es JPEG (se decodifica en modo draft por variante)
+    """
+    img = Image.open(io.BytesIO(data))
+    if img.format == "JPEG":
+        return None
+    img.load()
+    return img
+
+
+def variant_etag(digest, width, format, quality):
+    return f'"{digest}-{width}-{format}-{quality or 0}"'
+
+
+def scale_capture(data, image, width):
+    """
+    Reduce la captura al ancho pedido conservando la relación de aspecto
+
+    Args:
+        data: Captura original (bytes)
+        image: Imagen decodificada por decode_capture (None para JPEG)
+        width: Ancho de salida; nunca se amplía la captura
+
+    Returns:
+        Image
+    """
+    if image is None:
+        image = Image.open(io.BytesIO(data))
+        # Reducción en el decodificador JPEG; nunca por debajo del tamaño pedido
+        image.draft("RGB", (width, max(1, int(image.height * width / image.width))))
+    width = min(width, image.width)
+    height = max(1, int(image.height * (width / image.width)))
+    if (width, height) != image.size:
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=SCREENSHOT_REDUCING_GAP)
+    return image
+
+
+def render_variant(data, image, width, format, quality):
+    """
+    Redimensiona y codifica una variante de la captura
+
+    Args:
+        data: Captura original (bytes)
+        image: Imagen decodificada por decode_capture (None para JPEG)
+        width: Ancho de salida; nunca se amplía la captura
+        format: "png", "jpeg" o "webp"
+        quality: Calidad para jpeg/webp
+
+    Returns:
+        tuple: (imagen codificada en bytes, ancho, alto)
+    """
+    image = scale_capture(data, image, width)
+    width, height = image.size
+    pil_format = FORMATS[format][0]
+    if pil_format != "PNG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(buffer, format="PNG", compress_level=6)
+    elif pil_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality)
+    else:
+        # method=2: bastante más rápido que el 4 por defecto con un tamaño casi igual
+        image.save(buffer, format="WEBP", quality=quality, method=2)
+    return buffer.getvalue(), width, height
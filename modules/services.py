@@ -3,14 +3,6 @@ import platform
 import psutil
 import logging
 import socket
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('raspberry_client.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger('socket.gethostname())')
 
 
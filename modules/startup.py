@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import socket
+import time
+
+import psutil
+
+logger = logging.getLogger(socket.gethostname())
+
+# Momento de arranque del proceso (epoch), usado como origen de las métricas de arranque
+try:
+    PROCESS_START = psutil.Process().create_time()
+except Exception:
+    PROCESS_START = time.time()
+
+# Segundos transcurridos desde el arranque del proceso hasta cada hito
+BOOT_METRICS = {}
+
+
+def mark_boot_milestone(name):
+    """
+    Registra un hito de arranque (solo la primera vez que se alcanza)
+
+    Args:
+        name: Nombre del hito (ej: "api_ready", "first_frame")
+
+    Returns:
+        float: Segundos desde el arranque del proceso hasta el hito
+    """
+    if name not in BOOT_METRICS:
+        BOOT_METRICS[name] = round(time.time() - PROCESS_START, 3)
+        logger.info(f"Arranque: {name} alcanzado {BOOT_METRICS[name]:.3f} segundos después del inicio del proceso")
+    return BOOT_METRICS[name]
+
+
+class StartupGraph:
+    """
+    Ejecuta los pasos de arranque como un grafo de dependencias.
+
+    Cada paso es una corrutina que empieza en cuanto terminan sus dependencias,
+    de forma que los pasos independientes se ejecutan en paralelo. Si un paso
+    falla, los pasos que dependen de él se omiten y el resto continúa.
+    """
+
+    def __init__(self):
+        self._steps = {}
+
+    def add(self, name, func, deps=()):
+        """
+        Añade un paso al grafo
+
+        Args:
+            name: Nombre único del paso
+            func: Función asíncrona sin argumentos
+            deps: Nombres de los pasos que deben terminar antes
+        """
+        if name in self._steps:
+            raise ValueError(f"Paso de arranque duplicado: {name}")
+        self._steps[name] = (func, tuple(deps))
+
+    def _check(self):
+        """Verifica que todas las dependencias existan y que no haya ciclos"""
+        pending = {name: set(deps) for name, (_, deps) in self._steps.items()}
+        for name, deps in pending.items():
+            unknown = deps - pending.keys()
+            if unknown:
+                raise ValueError(f"El paso {name} depende de pasos inexistentes: {', '.join(sorted(unknown))}")
+
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependencias circulares entre los pasos: {', '.join(sorted(pending))}")
+            for name in ready:
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+
+    async def run(self):
+        """
+        Ejecuta todos los pasos respetando sus dependencias
+
+        Returns:
+            dict: Resultado de cada paso (o la excepción si falló)
+        """
+        self._check()
+        tasks = {}
+
+        async def run_step(name):
+            func, deps = self._steps[name]
+            for dep in deps:
+                try:
+                    await tasks[dep]
+                except Exception:
+                    raise RuntimeError(f"omitido porque falló la dependencia {dep}")
+            started = time.monotonic()
+            result = await func()
+            logger.info(f"Paso de arranque '{name}' completado en {time.monotonic() - started:.2f} segundos")
+            return result
+
+        for name in self._steps:
+            tasks[name] = asyncio.create_task(run_step(name), name=f"startup:{name}")
+
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for name, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Paso de arranque '{name}' fallido: {result}")
+        return dict(zip(tasks, results))
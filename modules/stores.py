@@ -0,0 +1,127 @@
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+
+logger = logging.getLogger(socket.gethostname())
+
+# Archivo de configuración con los rangos CIDR de cada tienda
+STORES_CONFIG = os.getenv(
+    "STORES_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "stores.json")
+)
+
+
+class StoreIndex:
+    """
+    Índice de tiendas por rangos CIDR con búsqueda por prefijo más largo.
+
+    Cada familia de direcciones usa un trie binario: la búsqueda recorre como
+    máximo tantos nodos como bits tenga el prefijo más largo (32 en IPv4,
+    128 en IPv6), independientemente del número de rangos configurados.
+    """
+
+    def __init__(self, ranges=None):
+        """
+        Args:
+            ranges: Iterable de tuplas (cidr, código de tienda)
+        """
+        # Nodo del trie: [hijo_0, hijo_1, tienda]
+        self._roots = {4: [None, None, None], 6: [None, None, None]}
+        self.size = 0
+        for cidr, store in ranges or []:
+            self.add(cidr, store)
+
+    def add(self, cidr, store):
+        """Añade un rango CIDR asociado a una tienda"""
+        network = ipaddress.ip_network(cidr, strict=False)
+        node = self._roots[network.version]
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        for i in range(network.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+        node[2] = store
+
+    def lookup(self, ip):
+        """
+        Busca la tienda del rango más específico que contiene la IP
+
+        Args:
+            ip: Dirección IP como string
+
+        Returns:
+            str o None: Código de tienda o None si ningún rango la contiene
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        node = self._roots[address.version]
+        bits = int(address)
+        width = address.max_prefixlen
+        match = node[2]
+        for i in range(width):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                match = node[2]
+        return match
+
+    @classmethod
+    def from_config(cls, path):
+        """
+        Crea el índice a partir de un archivo JSON con el formato
+        {"TIENDA": ["10.0.0.0/24", ...], ...}
+        """
+        with open(path, "r") as f:
+            config = json.load(f)
+
+        ranges = []
+        for store, cidrs in config.items():
+            for cidr in cidrs:
+                ranges.append((cidr, store))
+        return cls(ranges)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def reload_store_index(path=None):
+    """
+    Recarga el índice de tiendas desde el archivo de configuración.
+    Si el archivo no es válido se mantiene el índice anterior.
+
+    Returns:
+        bool: True si el índice se recargó correctamente
+    """
+    global _index
+    path = path or STORES_CONFIG
+    try:
+        index = StoreIndex.from_config(path)
+    except Exception as e:
+        logger.error(f"Error al cargar la configuración de tiendas {path}: {e}")
+        with _index_lock:
+            if _index is None:
+                _index = StoreIndex()
+        return False
+
+    with _index_lock:
+        _index = index
+    logger.info(f"Índice de tiendas cargado: {index.size} rangos desde {path}")
+    return True
+
+
+def get_store_index():
+    """Devuelve el índice de tiendas, cargándolo la primera vez"""
+    if _index is None:
+        reload_store_index()
+    return _index
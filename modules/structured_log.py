@@ -0,0 +1,267 @@
+"""
+Log estructurado en formato JSONL con índice de offsets.
+
+Cada registro se escribe como un objeto JSON por línea, con el timestamp,
+el nivel, el logger y el ID de dispositivo ya extraídos al escribir. Cada
+JSONL_INDEX_INTERVAL registros se añade al archivo .idx asociado una línea
+"timestamp offset", de forma que una consulta por rango de tiempo puede
+saltar directamente a la zona del archivo que le interesa (también en los
+archivos rotados) en lugar de recorrerlo entero.
+"""
+import bisect
+import collections
+import json
+import logging
+import os
+import re
+import socket
+import time
+from datetime import datetime
+
+from modules.log_pipeline import LineCountRotatingFileHandler, LOG_MAX_LINES, LOG_BACKUP_COUNT
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración del log estructurado
+JSONL_LOG_ENABLED = os.getenv("JSONL_LOG_ENABLED", "True").lower() != "false"
+JSONL_LOG_FILE = os.getenv("JSONL_LOG_FILE", "raspberry_client.jsonl")
+JSONL_INDEX_INTERVAL = int(os.getenv("JSONL_INDEX_INTERVAL", "64"))  # Registros entre entradas del índice
+QUERY_CHECK_INTERVAL = 64  # Registros revisados entre comprobaciones del tiempo máximo de una consulta
+
+DEVICE_ID_PATTERN = re.compile(r'Device\[(\w+)\]')
+
+
+def index_path(base_filename, backup=0):
+    """Ruta del índice del archivo actual (backup=0) o de un archivo rotado"""
+    if backup == 0:
+        return f"{base_filename}.idx"
+    return f"{base_filename}.{backup}.idx"
+
+
+def record_to_entry(record):
+    """
+    Convierte un LogRecord en el diccionario que se guarda en el JSONL
+
+    Args:
+        record: Registro de logging
+
+    Returns:
+        dict: Entrada con los campos ya extraídos
+    """
+    message = record.getMessage()
+    device_match = DEVICE_ID_PATTERN.search(message)
+    return {
+        "ts": round(record.created, 6),
+        "time": datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S,") + f"{int(record.msecs):03d}",
+        "level": record.levelname,
+        "logger": record.name,
+        "module": record.module,
+        "line": record.lineno,
+        "device_id": device_match.group(1) if device_match else None,
+        "message": message
+    }
+
+
+def entry_to_text(entry):
+    """Reconstruye la línea de texto del log a partir de una entrada JSONL"""
+    return f"{entry['time']} - {entry['logger']} - {entry['level']} - {entry['message']}"
+
+
+class JsonlLogHandler(LineCountRotatingFileHandler):
+    """
+    Escribe un objeto JSON por registro y mantiene un índice (timestamp, offset)
+    cada index_interval registros. Rota por número de líneas como el log de texto
+    y rota los índices junto con los archivos de datos.
+    """
+
+    def __init__(self, filename, max_lines=2000, backup_count=5, index_interval=64):
+        self.index_interval = max(1, index_interval)
+        self._index_stream = None
+        super().__init__(filename, max_lines=max_lines, backup_count=backup_count, encoding="utf-8")
+        self.offset = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+
+    def _append_index(self, ts, offset):
+        if self._index_stream is None:
+            self._index_stream = open(index_path(self.baseFilename), "a", encoding="utf-8")
+        self._index_stream.write(f"{ts} {offset}\n")
+
+    def _close_index(self):
+        if self._index_stream is not None:
+            self._index_stream.close()
+            self._index_stream = None
+
+    def _write(self, record):
+        """Escribe el registro como JSON y añade una entrada al índice si corresponde"""
+        if self.stream is None:
+            self.stream = self._open()
+        entry = record_to_entry(record)
+        # ensure_ascii garantiza que la longitud en caracteres coincide con la longitud en bytes
+        line = json.dumps(entry, ensure_ascii=True, separators=(",", ":")) + "\n"
+        if self.line_count % self.index_interval == 0:
+            self._append_index(entry["ts"], self.offset)
+        self.stream.write(line)
+        self.offset += len(line)
+        self.line_count += 1
+        if self.line_count >= self.max_lines:
+            self.doRollover()
+
+    def flush(self):
+        super().flush()
+        if self._index_stream is not None:
+            self._index_stream.flush()
+
+    def doRollover(self):
+        """Rota los índices junto con los archivos de datos"""
+        self._close_index()
+        base = self.baseFilename
+        if self.backupCount > 0:
+            for i in range(self.backupCount - 1, 0, -1):
+                if os.path.exists(index_path(base, i)):
+                    os.replace(index_path(base, i), index_path(base, i + 1))
+            if os.path.exists(index_path(base)):
+                os.replace(index_path(base), index_path(base, 1))
+        elif os.path.exists(index_path(base)):
+            os.remove(index_path(base))
+        super().doRollover()
+        self.offset = os.path.getsize(base) if os.path.exists(base) else 0
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_index()
+        finally:
+            self.release()
+        super().close()
+
+
+def create_jsonl_handler():
+    """Crea el handler JSONL con la configuración del entorno o None si está desactivado"""
+    if not JSONL_LOG_ENABLED:
+        return None
+    return JsonlLogHandler(
+        JSONL_LOG_FILE,
+        max_lines=LOG_MAX_LINES,
+        backup_count=LOG_BACKUP_COUNT,
+        index_interval=JSONL_INDEX_INTERVAL
+    )
+
+
+def parse_log_time(value):
+    """
+    Convierte un parámetro de tiempo (epoch o ISO 8601, hora local) en epoch
+
+    Returns:
+        float o None
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def log_segments(base_filename=None, backup_count=None):
+    """
+    Devuelve los segmentos del log estructurado del más antiguo al más reciente
+
+    Returns:
+        list: Tuplas (ruta de datos, ruta del índice)
+    """
+    base = base_filename or JSONL_LOG_FILE
+    backup_count = LOG_BACKUP_COUNT if backup_count is None else backup_count
+    segments = []
+    for i in range(backup_count, 0, -1):
+        path = f"{base}.{i}"
+        if os.path.exists(path):
+            segments.append((path, index_path(base, i)))
+    if os.path.exists(base):
+        segments.append((base, index_path(base)))
+    return segments
+
+
+def read_index(path):
+    """Lee un índice como listas paralelas de timestamps y offsets"""
+    timestamps, offsets = [], []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    timestamps.append(float(parts[0]))
+                    offsets.append(int(parts[1]))
+    except FileNotFoundError:
+        pass
+    return timestamps, offsets
+
+
+def _level_number(name):
+    """Convierte el nombre de un nivel en su valor numérico (0 si no se reconoce)"""
+    value = logging.getLevelName(str(name).upper())
+    return value if isinstance(value, int) else 0
+
+
+def query_records(since=None, until=None, level=None, limit=None, base_filename=None, match=None, stats=None,
+                  deadline=None):
+    """
+    Devuelve las entradas del log estructurado dentro de un rango de tiempo
+
+    Args:
+        since: Epoch mínimo (incluido) o None
+        until: Epoch máximo (incluido) o None
+        level: Nivel mínimo (ej: "WARNING") o None
+        limit: Número máximo de entradas (las más recientes del rango)
+        base_filename: Archivo JSONL (por defecto JSONL_LOG_FILE)
+        match: Función adicional que recibe cada entrada y devuelve si se incluye
+        stats: Objeto con un método scanned(bytes) para contar los registros revisados
+        deadline: Instante (time.monotonic) en el que se deja de revisar; la consulta
+            devuelve lo encontrado hasta entonces y anota en stats.truncated_at el
+            timestamp del primer registro que quedó sin revisar
+
+    Returns:
+        list: Entradas en orden cronológico
+    """
+    min_level = _level_number(level) if level else None
+    results = collections.deque(maxlen=limit) if limit else []
+    checked = 0
+
+    for data_path, idx_path in log_segments(base_filename):
+        timestamps, offsets = read_index(idx_path)
+
+        # Si el segmento empieza después del final del rango, los siguientes también
+        if until is not None and timestamps and timestamps[0] > until:
+            break
+
+        # Saltar a la última entrada del índice anterior al inicio del rango
+        start = 0
+        if since is not None and timestamps:
+            pos = bisect.bisect_right(timestamps, since) - 1
+            if pos >= 0:
+                start = offsets[pos]
+
+        with open(data_path, "rb") as f:
+            f.seek(start)
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                ts = entry.get("ts", 0)
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    return list(results)
+                checked += 1
+                if deadline is not None and checked % QUERY_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                    if stats is not None:
+                        stats.truncated_at = ts
+                    return list(results)
+                if stats is not None:
+                    stats.scanned(len(raw))
+                if min_level is not None and _level_number(entry.get("level")) < min_level:
+                    continue
+                if match is not None and not match(entry):
+                    continue
+                results.append(entry)
+
+    return list(results)
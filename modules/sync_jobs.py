@@ -0,0 +1,272 @@
+"""
+Trabajos de sincronización en segundo plano.
+
+POST /sync/force-update ejecutaba check_for_updates dentro de la petición:
+con cambios eso incluye borrar y volver a descargar todo el contenido, a
+veces gigabytes, y el cliente HTTP se quedaba esperando hasta agotar su
+tiempo de espera. Ahora cada sincronización forzada es un SyncJob que corre
+en su propia tarea asyncio; la API devuelve su ID al momento y
+GET /sync/jobs/{id} informa de la fase, los bytes descargados y pendientes y
+el tiempo estimado.
+
+El trabajo en curso se publica en una ContextVar: VideoDownloaderClient
+informa del progreso a current_sync_job() sin recibir ningún parámetro
+nuevo, y las sincronizaciones del bucle principal (sin trabajo) no pagan
+nada. Cancelar un trabajo cancela su tarea, y la CancelledError interrumpe
+la descarga en curso en el siguiente fragmento.
+"""
+import asyncio
+import collections
+import contextvars
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(socket.gethostname())
+
+# Configuración de los trabajos de sincronización
+SYNC_JOB_HISTORY = int(os.getenv("SYNC_JOB_HISTORY", "20"))  # Trabajos terminados que se conservan
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_current_job = contextvars.ContextVar("sync_job", default=None)
+
+
+def current_sync_job():
+    """Trabajo de sincronización de la tarea actual, o None"""
+    return _current_job.get()
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class SyncJob:
+    """Una sincronización forzada y su progreso"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.status = "queued"
+        self.phase = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.download_started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.cancel_requested = False
+        self.videos_total = 0
+        self.videos_done = 0
+        self.videos_failed = 0
+        self.bytes_done = 0
+        self.bytes_transferred = 0
+        self.current = None
+        self._sized_bytes = 0
+        self._sized_videos = 0
+        self.task = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    # Eventos que envía VideoDownloaderClient
+
+    def set_phase(self, phase):
+        self.phase = phase
+        if phase == "downloading" and self.download_started_at is None:
+            self.download_started_at = time.time()
+
+    def plan(self, playlists):
+        """Fija el número de videos que se van a descargar"""
+        self.videos_total = sum(len(playlist.get("videos", [])) for playlist in playlists)
+
+    def video_skipped(self, video_id, size):
+        """Video que ya estaba en disco; su tamaño sirve para estimar los pendientes"""
+        self.videos_done += 1
+        self._sized_bytes += size
+        self._sized_videos += 1
+
+    def video_started(self, video_id, total):
+        self.current = {"id": video_id, "total": total or None, "done": 0}
+
+    def advance(self, video_id, size):
+        self.bytes_done += size
+        self.bytes_transferred += size
+        if self.current is not None and self.current["id"] == video_id:
+            self.current["done"] += size
+
+    def video_finished(self, video_id, size):
+        self.videos_done += 1
+        self._sized_bytes += size
+        self._sized_videos += 1
+        self.current = None
+
+    def video_failed(self, video_id, error):
+        self.videos_failed += 1
+        if self.current is not None:
+            # Los bytes de una descarga fallida se descartan
+            self.bytes_done -= self.current["done"]
+        self.current = None
+        self.error = f"Video {video_id}: {error}"
+
+    # Estado
+
+    def bytes_remaining(self):
+        """Bytes pendientes (estimados con el tamaño medio para los videos no empezados) o None"""
+        current_remaining = 0
+        pending_videos = self.videos_total - self.videos_done - self.videos_failed
+        if self.current is not None:
+            pending_videos -= 1
+            if self.current["total"] is None:
+                return None
+            current_remaining = max(0, self.current["total"] - self.current["done"])
+        if pending_videos <= 0:
+            return current_remaining
+        if self._sized_videos:
+            average = self._sized_bytes / self._sized_videos
+        elif self.current is not None:
+            # Primer video: su tamaño es la única referencia
+            average = self.current["total"]
+        else:
+            return None
+        return current_remaining + int(average * pending_videos)
+
+    def to_dict(self):
+        now = self.finished_at or time.time()
+        remaining = self.bytes_remaining() if self.active else 0
+        rate = None
+        if self.download_started_at and self.bytes_transferred:
+            elapsed = now - self.download_started_at
+            rate = self.bytes_transferred / elapsed if elapsed > 0 else None
+        eta = round(remaining / rate, 1) if self.active and rate and remaining is not None else None
+        return {
+            "id": self.id,
+            "status": self.status,
+            "phase": self.phase,
+            "created_at": _iso(self.created_at),
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(self.finished_at),
+            "elapsed": round(now - (self.started_at or self.created_at), 1),
+            "videos_total": self.videos_total,
+            "videos_done": self.videos_done,
+            "videos_failed": self.videos_failed,
+            "current_video": dict(self.current) if self.current else None,
+            "bytes_done": self.bytes_done,
+            "bytes_remaining": remaining,
+            "bytes_per_second": round(rate) if rate else None,
+            "eta_seconds": eta,
+            "cancel_requested": self.cancel_requested,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class SyncJobManager:
+    """Lanza los trabajos de sincronización y conserva un historial acotado"""
+
+    def __init__(self, history=SYNC_JOB_HISTORY):
+        """
+        Args:
+            history: Número de trabajos terminados que se conservan
+        """
+        self.active = None
+        self.history = collections.deque(maxlen=max(1, history))
+
+    def submit(self, client):
+        """
+        Lanza una sincronización con el cliente indicado
+
+        Si ya hay un trabajo activo se devuelve ese en lugar de encolar otro:
+        dos sincronizaciones seguidas harían el mismo trabajo.
+
+        Returns:
+            tuple: (SyncJob, creado)
+        """
+        if self.active is not None and self.active.active:
+            return self.active, False
+        job = SyncJob()
+        self.active = job
+        job.task = asyncio.create_task(self._run(job, client), name=f"sync-job-{job.id}")
+        job.task.add_done_callback(lambda task: self._finished(job, task))
+        logger.info(f"Trabajo de sincronización {job.id} creado")
+        return job, True
+
+    async def _run(self, job, client):
+        _current_job.set(job)
+        job.status = "running"
+        job.started_at = time.time()
+        # check_for_updates espera al lock de sincronización si el bucle principal está sincronizando
+        job.set_phase("waiting")
+        try:
+            changes = await client.check_for_updates()
+            restarted = False
+            if changes:
+                job.set_phase("restarting")
+                restarted = await client.restart_videoloop_service()
+            job.result = {"changes": bool(changes), "restarted": bool(restarted)}
+            job.status = "failed" if job.error and not changes else "succeeded"
+        except asyncio.CancelledError:
+            logger.info(f"Trabajo de sincronización {job.id} cancelado en la fase {job.phase}")
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Error en el trabajo de sincronización {job.id}: {e}")
+
+    def _finished(self, job, task):
+        # También se llama si la tarea se cancela antes de empezar a ejecutarse
+        if task.cancelled():
+            job.status = "cancelled"
+        job.current = None
+        job.phase = "done"
+        job.finished_at = time.time()
+        self.history.append(job)
+        if self.active is job:
+            self.active = None
+
+    def get(self, job_id):
+        if self.active is not None and self.active.id == job_id:
+            return self.active
+        for job in self.history:
+            if job.id == job_id:
+                return job
+        return None
+
+    def cancel(self, job_id):
+        """
+        Pide la cancelación de un trabajo
+
+        Returns:
+            SyncJob o None si no existe
+
+        Raises:
+            ValueError: Si el trabajo ya terminó
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.active:
+            raise ValueError(f"El trabajo {job_id} ya terminó ({job.status})")
+        job.cancel_requested = True
+        job.task.cancel()
+        return job
+
+    def list(self):
+        jobs = list(reversed(self.history))
+        if self.active is not None:
+            jobs.insert(0, self.active)
+        return jobs
+
+
+_manager = None
+
+
+def get_sync_jobs():
+    """Devuelve el gestor de trabajos de sincronización del proceso"""
+    global _manager
+    if _manager is None:
+        _manager = SyncJobManager()
+    return _manager
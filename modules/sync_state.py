@@ -0,0 +1,109 @@
+"""
+Estado de sincronización compartido por todo el proceso.
+
+Antes cada petición a /sync/status, /sync/force-update o /sync/list-playlists
+llamaba a create_sync_client(): construía un VideoDownloaderClient y un
+CookieAuthManager nuevos, hacía makedirs, llamaba a get_device_id() (que puede
+lanzar subprocesos) y volvía a leer client_state.json, sin compartir nada
+con el bucle de sincronización de main().
+
+Ahora el cliente de sincronización del proceso publica su estado en un único
+SyncState. Cada publicación crea una instantánea nueva e inmutable
+(copy-on-write) y sustituye la referencia de una vez, así que los lectores
+nunca ven un active_playlists a medio actualizar y no necesitan ningún lock.
+El mismo objeto guarda el cliente y un lock para que el bucle y la API no
+ejecuten dos sincronizaciones a la vez.
+"""
+import asyncio
+import threading
+import time
+import types
+
+
+class SyncSnapshot:
+    """Instantánea inmutable del estado de sincronización"""
+
+    __slots__ = ("version", "device_id", "active_playlists", "last_update", "download_path",
+                 "service_name", "published_at", "loaded")
+
+    def __init__(self, version=0, device_id=None, active_playlists=None, last_update=None,
+                 download_path=None, service_name=None, published_at=None, loaded=False):
+        # El diccionario de primer nivel es una copia de solo lectura; las playlists
+        # que contiene no se modifican nunca: el cliente las sustituye enteras
+        object.__setattr__(self, "active_playlists", types.MappingProxyType(dict(active_playlists or {})))
+        for name, value in (("version", version), ("device_id", device_id), ("last_update", last_update),
+                            ("download_path", download_path), ("service_name", service_name),
+                            ("published_at", published_at), ("loaded", loaded)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SyncSnapshot es inmutable; usa SyncState.publish()")
+
+    @property
+    def total_videos(self):
+        return sum(len(playlist.get("videos", [])) for playlist in self.active_playlists.values())
+
+
+class SyncState:
+    """Estado de sincronización del proceso con instantáneas copy-on-write"""
+
+    def __init__(self):
+        self._snapshot = SyncSnapshot()
+        self._write_lock = threading.Lock()
+        self._sync_lock = None
+        self._client_lock = None
+        self.client = None
+
+    def snapshot(self):
+        """Instantánea actual (lectura sin locks)"""
+        return self._snapshot
+
+    def publish(self, **changes):
+        """
+        Publica una instantánea nueva con los campos indicados cambiados
+
+        Returns:
+            SyncSnapshot
+        """
+        with self._write_lock:
+            current = self._snapshot
+            values = {name: getattr(current, name) for name in SyncSnapshot.__slots__}
+            values.update(changes)
+            values["version"] = current.version + 1
+            values["published_at"] = time.time()
+            values["loaded"] = True
+            self._snapshot = SyncSnapshot(**values)
+            return self._snapshot
+
+    def publish_client(self, client):
+        """Publica el estado de un cliente de sincronización y lo registra como el del proceso"""
+        self.client = client
+        return self.publish(
+            device_id=client.device_id,
+            active_playlists=client.active_playlists,
+            last_update=client.last_update,
+            download_path=client.download_path,
+            service_name=client.service_name
+        )
+
+    @property
+    def sync_lock(self):
+        """Lock que serializa las sincronizaciones del bucle principal y de la API"""
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        return self._sync_lock
+
+    @property
+    def client_lock(self):
+        """Lock que garantiza un único cliente de sincronización aunque el arranque y la API lo pidan a la vez"""
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        return self._client_lock
+
+
+_sync_state = SyncState()
+
+
+def get_sync_state():
+    """Devuelve el estado de sincronización del proceso"""
+    return _sync_state
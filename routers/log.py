@@ -1,20 +1,27 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 import os
 import socket
 import logging
 import re
+import time
+import asyncio
+from fastapi.responses import JSONResponse, StreamingResponse
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('raspberry_client.log'),
-        logging.StreamHandler()
-    ]
+from modules.structured_log import query_records, entry_to_text, JSONL_LOG_FILE, JSONL_LOG_ENABLED, DEVICE_ID_PATTERN
+from modules.log_pipeline import LOG_FILE, get_logging_stats
+from modules.log_filter import (
+    LogFilter, FilterStats, FILTER_STATS, LOG_QUERY_TIMEOUT, get_filter_stats, entry_size, query_text_records
 )
+from modules.log_broadcast import get_log_broadcaster
+from modules.log_stream import stream_logs
+from modules.log_shipper import get_log_shipper
+from modules.log_reader import tail_lines, read_page, end_cursor, iter_lines, InvalidCursor, ExpiredCursor
+
 
 logger = logging.getLogger(socket.gethostname()) 
 
+TIMESTAMP_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+
 router = APIRouter(
     prefix="/api/logs",
     tags=["logs"]
@@ -27,43 +34,170 @@ def read_service_logs(lines=50):
         lines: Número de líneas a leer de cada archivo
     """
     log_paths = [
-        "raspberry_client.log"
+        LOG_FILE
     ]
     
     combined_logs = ""
     
     for log_path in log_paths:
         try:
-            if os.path.exists(log_path):
-                # Leer las últimas líneas de cada archivo de log
-                with os.popen(f"tail -n {lines} {log_path}") as f:
-                    log_content = f.read()
-                    combined_logs += f"\n--- {log_path} ---\n{log_content}\n"
+            # Leer las últimas líneas de cada archivo de log (lectura hacia atrás por bloques)
+            log_content = "\n".join(tail_lines(log_path, lines))
+            if log_content:
+                combined_logs += f"\n--- {log_path} ---\n{log_content}\n"
         except Exception as e:
             logger.error(f"Error al leer log {log_path}: {str(e)}")
+    
+    return combined_logs
+
+def query_logs(lines, format, filter_params):
+    """
+    Consulta el log estructurado aplicando el filtro en el dispositivo. Si el log
+    estructurado está desactivado se filtra el log de texto, más lento pero con el mismo resultado.
+    La consulta dura como mucho LOG_QUERY_TIMEOUT segundos; si se agota, la respuesta
+    es parcial (truncated) e indica en resume_since desde dónde seguir.
+    """
+    try:
+        log_filter = LogFilter.from_params(filter_params)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Filtro no válido: {str(e)}"}
+        )
+    
+    stats = FilterStats(parent=FILTER_STATS["api"])
+    deadline = time.monotonic() + LOG_QUERY_TIMEOUT
+    if JSONL_LOG_ENABLED:
+        entries = query_records(
+            since=log_filter.since,
+            until=log_filter.until,
+            limit=lines,
+            match=log_filter.matches,
+            stats=stats,
+            deadline=deadline
+        )
+        source = JSONL_LOG_FILE
+    else:
+        entries = query_text_records(log_filter, limit=lines, stats=stats, deadline=deadline)
+        source = LOG_FILE
+    truncated = stats.truncated_at is not None
+    if truncated:
+        logger.warning(f"Consulta de logs cortada tras {LOG_QUERY_TIMEOUT:.0f} s: {log_filter.to_dict()}")
+    for entry in entries:
+        # Los bytes enviados se miden en el mismo formato que los revisados
+        stats.sent(entry_size(entry) if JSONL_LOG_ENABLED else len(entry_to_text(entry).encode("utf-8")) + 1)
+    
+    if format == "json":
+        return {
+            "logs": [
+                {
+                    "timestamp": entry["time"][:19],
+                    "device_id": entry.get("device_id"),
+                    "level": entry.get("level"),
+                    "logger": entry.get("logger"),
+                    "message": entry_to_text(entry)
+                }
+                for entry in entries
+            ],
+            "total": len(entries),
+            "source": source,
+            "filter": log_filter.to_dict(),
+            "stats": stats.to_dict(),
+            "truncated": truncated,
+            "resume_since": stats.truncated_at
+        }
+    
+    headers = {
+        "X-Log-Bytes-Scanned": str(stats.bytes_scanned),
+        "X-Log-Bytes-Sent": str(stats.bytes_sent)
+    }
+    if truncated:
+        headers["X-Log-Truncated"] = "true"
+        headers["X-Log-Resume-Since"] = str(stats.truncated_at)
+    return JSONResponse(
+        content="".join(entry_to_text(entry) + "\n" for entry in entries),
+        headers=headers
+    )
+
+@router.get("/stats")
+async def get_log_stats():
+    """Estadísticas del escritor de logs, del filtrado (bytes ahorrados por canal), de la difusión y del envío"""
+    shipper = get_log_shipper()
+    return {
+        "pipeline": get_logging_stats(),
+        "filter": get_filter_stats(),
+        "broadcast": get_log_broadcaster().stats(),
+        "shipper": shipper.stats() if shipper else None
+    }
+
+@router.websocket("/ws")
+async def logs_websocket(websocket: WebSocket):
+    """
+    Streaming de logs en tiempo real por WebSocket, en el mismo servidor que la API.
+    Admite las acciones "filter", "stats" y "ping" (ver modules/log_stream.py).
+    """
+    await websocket.accept()
+    remote = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    await stream_logs(websocket.send_text, websocket.receive_text, (WebSocketDisconnect,), remote)
 
 @router.get("/")
-async def get_logs(lines: int = 100, format: str = "text"):
-    """Obtiene los logs del dispositivo."""
+async def get_logs(lines: int = 100, format: str = "text", since: str = None, until: str = None, level: str = None,
+                   logger_name: str = Query(None, alias="logger"), contains: str = None, regex: str = None,
+                   device_id: str = None, before: str = None, after: str = None, stream: bool = False):
+    """
+    Obtiene los logs del dispositivo.
+    Con since/until/level/logger/contains/regex/device_id la consulta se filtra en el
+    dispositivo sobre el log estructurado (JSONL), saltando con su índice al inicio
+    del rango, incluidos los archivos rotados. La respuesta indica los bytes ahorrados.
+    Sin filtros devuelve las últimas `lines` líneas leyendo el archivo hacia atrás.
+    before/after paginan con los cursores devueltos en la respuesta (o en las
+    cabeceras X-Log-Before/X-Log-After en formato texto) y stream=true devuelve
+    todas las líneas desde `after` (o desde el archivo rotado más antiguo) en streaming.
+    """
     try:
-        log_path = "raspberry_client.log"
+        filter_params = {
+            "level": level,
+            "logger": logger_name,
+            "since": since,
+            "until": until,
+            "contains": contains,
+            "regex": regex,
+            "device_id": device_id
+        }
+        if any(filter_params.values()):
+            return await asyncio.to_thread(query_logs, lines, format, filter_params)
+        
+        log_path = LOG_FILE
         if not os.path.exists(log_path):
             if format == "json":
                 return {"error": "Archivo de log no encontrado"}
             return "Archivo de log no encontrado"
+        
+        try:
+            if stream:
+                end = end_cursor()
+                return StreamingResponse(
+                    iter_lines(after=after, until=end),
+                    media_type="text/plain; charset=utf-8",
+                    headers={"X-Log-After": end} if end else {}
+                )
             
-        # Leer las últimas líneas del archivo
-        with open(log_path, "r") as f:
-            all_lines = f.readlines()
-            last_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
+            # Leer las últimas líneas (o la página pedida) sin cargar el archivo entero
+            page = await asyncio.to_thread(read_page, before, after, lines)
+        except InvalidCursor as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        except ExpiredCursor as e:
+            return JSONResponse(status_code=410, content={"error": str(e)})
+        
+        last_lines = page["lines"]
             
         if format == "json":
             parsed_logs = []
             for line in last_lines:
-                timestamp_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', line)
+                timestamp_match = TIMESTAMP_PATTERN.search(line)
                 timestamp = timestamp_match.group(1) if timestamp_match else None
                 
-                device_match = re.search(r'Device\[(\w+)\]', line)
+                device_match = DEVICE_ID_PATTERN.search(line)
                 device_id = device_match.group(1) if device_match else None
                 
                 parsed_logs.append({
@@ -75,10 +209,17 @@ async def get_logs(lines: int = 100, format: str = "text"):
             return {
                 "logs": parsed_logs,
                 "total": len(parsed_logs),
-                "source": log_path
+                "source": log_path,
+                "before": page["before"],
+                "after": page["after"]
             }
         
-        return "".join(last_lines)
+        cursors = {}
+        if page["before"]:
+            cursors["X-Log-Before"] = page["before"]
+        if page["after"]:
+            cursors["X-Log-After"] = page["after"]
+        return JSONResponse(content="".join(line + "\n" for line in last_lines), headers=cursors)
     except Exception as e:
         if format == "json":
             return {"error": f"Error al leer logs: {str(e)}"}
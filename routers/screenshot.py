@@ -1,170 +1,234 @@
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
-import os
-import subprocess
 import socket
 import logging
-from PIL import Image
+import asyncio
+import json
+import time
 
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('raspberry_client.log'),
-        logging.StreamHandler()
-    ]
+from modules.screen_capture import get_capture_registry, CaptureError
+from modules.screenshot_cache import ScreenshotCache
+from modules.screen_live import get_live_view
+from modules.screen_health import get_screen_health_monitor
+from modules.bounded_executor import get_screenshot_executor, ExecutorBusy, ExecutorTimeout
+from modules.screenshot_image import (
+    FORMATS, parse_variant, capture_digest, decode_capture, variant_etag, render_variant
 )
 
+
+
 logger = logging.getLogger(socket.gethostname()) 
 
+SCREENSHOT_MAX_VARIANTS = 8  # Variantes codificadas que se guardan por captura
+
 router = APIRouter(
     prefix="/api/screenshot",
     tags=["screenshot"]
 )
+@router.get("/backends")
+async def capture_backends():
+    """Herramienta de captura seleccionada y latencia de cada herramienta"""
+    return get_capture_registry().stats()
+
+class RenderError(Exception):
+    """La captura no se pudo decodificar o redimensionar"""
+
+
+async def take_screenshot():
+    """Captura la pantalla y la decodifica una vez para todas sus variantes (productor de la caché)"""
+    executor = get_screenshot_executor()
+    backend, data = await executor.run(get_capture_registry().capture)
+    logger.info(f"Captura con {backend} exitosa ({len(data)} bytes)")
+    try:
+        image = await executor.run(decode_capture, data)
+    except (ExecutorBusy, ExecutorTimeout):
+        raise
+    except Exception as e:
+        raise RenderError(str(e)) from e
+    return {
+        "data": data,
+        "image": image,
+        "digest": capture_digest(data),
+        "backend": backend,
+        "captured_at": time.time(),
+        "variants": {}
+    }
+
+
+async def get_variant(screenshot, width, format, quality):
+    """
+    Devuelve una variante codificada de la captura, codificándola una sola vez
+    aunque la pidan varios clientes a la vez
+
+    Returns:
+        tuple: (imagen codificada en bytes, ancho, alto)
+    """
+    key = (width, format, quality)
+    variants = screenshot["variants"]
+    future = variants.get(key)
+    if future is None or (future.done() and future.exception() is not None):
+        future = asyncio.ensure_future(get_screenshot_executor().run(
+            render_variant, screenshot["data"], screenshot["image"], width, format, quality
+        ))
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        variants[key] = future
+        while len(variants) > SCREENSHOT_MAX_VARIANTS:
+            variants.pop(next(iter(variants)))
+    try:
+        return await asyncio.shield(future)
+    except (ExecutorBusy, ExecutorTimeout):
+        raise
+    except Exception as e:
+        raise RenderError(str(e)) from e
+
+
+screenshot_cache = ScreenshotCache(take_screenshot)
+
+@router.get("/stats")
+async def screenshot_stats():
+    """Estadísticas de la caché de capturas y de las herramientas de captura"""
+    return {
+        "cache": screenshot_cache.stats(),
+        "capture": get_capture_registry().stats(),
+        "executor": get_screenshot_executor().stats(),
+        "live": get_live_view().stats()
+    }
+
+@router.get("/health")
+async def screen_health():
+    """Estado de la pantalla según el monitor: ok, black (negra), frozen (congelada) o unknown"""
+    return get_screen_health_monitor().stats()
+
+@router.websocket("/live")
+async def live_screenshot(websocket: WebSocket):
+    """
+    Vista en directo de la pantalla: fotogramas a baja frecuencia en los que solo
+    se envían las teselas que cambiaron (protocolo en modules/screen_live.py).
+    La captura se detiene sola cuando no quedan espectadores.
+    """
+    await websocket.accept()
+    remote = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    logger.info(f"Espectador de la vista en directo conectado desde {remote}")
+    live_view = get_live_view()
+    viewer = live_view.subscribe()
+    sender = asyncio.create_task(live_view.stream(viewer, websocket.send_text, websocket.send_bytes))
+    try:
+        while True:
+            receiver = asyncio.ensure_future(websocket.receive_text())
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                receiver.cancel()
+                sender.result()  # Propagar el error de envío (p. ej. desconexión)
+                break
+            try:
+                data = json.loads(receiver.result())
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            if data.get("action") == "keyframe":
+                live_view.request_keyframe(viewer)
+            elif data.get("action") == "stats":
+                async with viewer.lock:
+                    await websocket.send_text(json.dumps({"type": "stats", "stats": live_view.stats(),
+                                                          "dropped": viewer.dropped}))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error en la vista en directo: {str(e)}")
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, Exception):
+            pass
+        live_view.unsubscribe(viewer)
+        logger.info(f"Espectador de la vista en directo desconectado ({remote})")
+
 @router.get("/")
-async def capture_screenshot():
+async def capture_screenshot(request: Request, width: int = None, format: str = None,
+                             quality: int = None, max_age: float = None):
     """
-    Captura una captura de pantalla del dispositivo.
-    Intenta diferentes métodos de captura, empezando por grim.
+    Captura una captura de pantalla del dispositivo con la herramienta de captura
+    seleccionada para la sesión gráfica actual (ver modules/screen_capture.py).
+    La imagen se procesa en memoria, sin escribir archivos en la tarjeta SD.
+
+    Si la pantalla no cambió desde la captura que ya tiene el cliente
+    (If-None-Match con el ETag recibido) se responde 304 sin cuerpo.
+
+    Args:
+        width: Ancho en píxeles (por defecto SCREENSHOT_DEFAULT_WIDTH; nunca se amplía)
+        format: png, jpeg o webp (por defecto SCREENSHOT_DEFAULT_FORMAT)
+        quality: Calidad de jpeg/webp entre 1 y 100
+        max_age: Antigüedad máxima en segundos de una captura reutilizada
+            (por defecto SCREENSHOT_CACHE_TTL; 0 fuerza una captura nueva)
     """
     logger.info("Solicitada captura de pantalla")
-    
-    # Crear directorio temp si no existe
-    temp_dir = "/home/pi/app-client/temp/"
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-    
-    # Ruta temporal para guardar la captura de pantalla
-    screenshot_path = f"{temp_dir}/screenshot_tmp.png"
-    screenshot_path_out = f"{temp_dir}/screenshot.png"
-    display_target = os.environ.get('DISPLAY')
+    if max_age is not None and max_age < 0:
+        return JSONResponse(status_code=400, content={"error": "max_age no puede ser negativo"})
     try:
-        # Primer intento: usar grim (independientemente del entorno)
-        capture_success = False
-        
-        try:
-            logger.info("Intentando capturar con grim")
-            subprocess.run([
-            "grim",
-            screenshot_path  
-            ], check=True)
-            logger.info("Captura con grim exitosa")
-            capture_success = True
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            logger.warning(f"Error al capturar con grim: {e}")
-            
+        width, format, quality = parse_variant(width, format, quality)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        # Capturar con la herramienta seleccionada (se prueban todas solo la primera
+        # vez, si cambia la sesión gráfica o si la seleccionada deja de funcionar)
         try:
-            logger.info("Intentando capturar con xfce4-screenshooter")
-            subprocess.run([
-            "xfce4-screenshooter",
-            "--display=:0",
-            "-f",
-            "-s",
-            "/home/pi/app-client/temp/screenshot_tmp.png"
-            ], check=True)
-            logger.info("Captura con xfce4-screenshooter exitosa")
-            capture_success = True
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            logger.warning(f"Error al capturar con xfce4-screenshooter: {e}")
-            
-
-        # Si grim falló, intentar con otras herramientas
-        if not capture_success:
-            try:
-                logger.info("Intentando capturar con scrot")
-                subprocess.run(["scrot", screenshot_path], check=True)
-                logger.info("Captura con scrot exitosa")
-                capture_success = True
-            except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                logger.warning(f"Error al capturar con scrot: {e}")
-        
-        # Si scrot falló, intentar con raspi2png
-        if not capture_success:
-            try:
-                logger.info("Intentando capturar con raspi2png")
-                subprocess.run(["raspi2png", "-p", screenshot_path], check=True)
-                logger.info("Captura con raspi2png exitosa")
-                capture_success = True
-            except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                logger.warning(f"Error al capturar con raspi2png: {e}")
-        
-        # Si raspi2png falló, intentar con fbgrab
-        if not capture_success:
-            try:
-                logger.info("Intentando capturar con fbgrab")
-                subprocess.run(["fbgrab", screenshot_path], check=True)
-                logger.info("Captura con fbgrab exitosa")
-                capture_success = True
-            except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                logger.warning(f"Error al capturar con fbgrab: {e}")
-        
-        # Si fbgrab falló, intentar con raspistill (específico de Raspberry Pi)
-        if not capture_success:
-            try:
-                logger.info("Intentando capturar con raspistill")
-                # raspistill genera JPG, así que usamos un archivo temporal diferente
-                jpg_path = f"{temp_dir}/screenshot_tmp.jpg"
-                subprocess.run(["raspistill", "-o", jpg_path, "-t", "1"], check=True)
-                # Convertir de JPG a PNG usando PIL
-                with Image.open(jpg_path) as img:
-                    img.save(screenshot_path)
-                # Eliminar archivo JPG temporal
-                os.remove(jpg_path)
-                logger.info("Captura con raspistill exitosa")
-                capture_success = True
-            except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                logger.warning(f"Error al capturar con raspistill: {e}")
-        
-        # Si ningún método funcionó, devolver error
-        if not capture_success:
+            screenshot, cache_status = await screenshot_cache.get(max_age)
+        except CaptureError as e:
             logger.error("No se pudo capturar la pantalla con ninguna herramienta disponible")
             return JSONResponse(
                 status_code=500,
-                content={"error": "No se pudo capturar la pantalla. Ninguna herramienta de captura disponible o funcionando."}
+                content={"error": f"No se pudo capturar la pantalla. {str(e)}."}
             )
-        
-        # Redimensionar la imagen para reducir tamaño
-        try:
-            with Image.open(screenshot_path) as img:
-                # Redimensionar la imagen conservando la relación de aspecto
-                width, height = img.size
-                new_width = 640
-                new_height = int(height * (new_width / width))
-                
-                img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-                img_resized.save(screenshot_path_out)
-                logger.info(f"Imagen redimensionada a {new_width}x{new_height}")
-        except Exception as e:
-            logger.error(f"Error al redimensionar la imagen: {e}")
-            # Si falla el redimensionado, usar la original
-            if os.path.exists(screenshot_path):
-                os.rename(screenshot_path, screenshot_path_out)
-                
-        # Leer la imagen y devolverla
+        except RenderError as e:
+            logger.error(f"Error al procesar la imagen: {e}")
+            return JSONResponse(
+                status_code=500,
+                content={"error": f"Error al procesar la imagen: {str(e)}"}
+            )
+
+        age = max(0.0, time.time() - screenshot["captured_at"])
+        etag = variant_etag(screenshot["digest"], width, format, quality)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "X-Screenshot-Cache": cache_status,
+            "X-Screenshot-Age": f"{age:.2f}",
+            "X-Screenshot-Backend": screenshot["backend"]
+        }
+        # La pantalla no cambió: no hace falta ni codificar ni enviar la imagen
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
         try:
-            with open(screenshot_path_out, "rb") as f:
-                img_data = f.read()
-                logger.info(f"Devolviendo imagen de {len(img_data)} bytes")
-                return Response(content=img_data, media_type="image/png")
-        except Exception as e:
-            logger.error(f"Error al leer la imagen: {e}")
+            img_data, out_width, out_height = await get_variant(screenshot, width, format, quality)
+        except RenderError as e:
+            logger.error(f"Error al procesar la imagen: {e}")
             return JSONResponse(
                 status_code=500,
-                content={"error": f"Error al leer la imagen: {str(e)}"}
+                content={"error": f"Error al procesar la imagen: {str(e)}"}
             )
-            
+        logger.info(f"Devolviendo captura {out_width}x{out_height} en {format} ({len(img_data)} bytes)")
+        return Response(content=img_data, media_type=FORMATS[format][1], headers=headers)
+
+    except ExecutorBusy as e:
+        logger.warning(f"Captura de pantalla rechazada: {e}")
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": "1"},
+            content={"error": "Demasiadas capturas de pantalla en curso, inténtalo de nuevo"}
+        )
+    except ExecutorTimeout as e:
+        logger.error(f"Captura de pantalla demasiado lenta: {e}")
+        return JSONResponse(
+            status_code=504,
+            content={"error": f"La captura de pantalla tardó demasiado: {str(e)}"}
+        )
     except Exception as e:
         logger.exception(f"Error inesperado en captura de pantalla: {e}")
         return JSONResponse(
             status_code=500, 
             content={"error": f"Error inesperado: {str(e)}"}
         )
-    finally:
-        # Limpiar archivos temporales
-        try:
-            if os.path.exists(screenshot_path):
-                os.remove(screenshot_path)
-            # No eliminar screenshot_path_out ya que podría ser utilizado en futuras capturas
-        except Exception as e:
-            logger.warning(f"Error al eliminar archivos temporales: {e}")
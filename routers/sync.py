@@ -16,16 +16,7 @@ import uvicorn
 
 app=FastAPI()
 from modules.devices import get_device_id, API_URL
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('raspberry_client.log'),
-        logging.StreamHandler()
-    ]
-)
-
+# Configuración de logging (los handlers los instala modules/log_pipeline.py)
 logger = logging.getLogger(socket.gethostname()) 
 
 
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# modules/devices.py construye sus URLs con SERVER_URL al importarse
+os.environ.setdefault("SERVER_URL", "http://127.0.0.1:9")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
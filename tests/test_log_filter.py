@@ -0,0 +1,95 @@
+"""
+Expresiones regulares de GET /api/logs: check_regex rechaza las que pueden
+provocar retroceso catastrófico, y las consultas con tiempo máximo devuelven
+una página parcial con el punto desde el que seguir.
+"""
+import json
+import time
+
+import pytest
+
+from modules.log_filter import LogFilter, FilterStats, check_regex, query_text_records
+from modules.structured_log import query_records
+
+RECORDS = 1000
+
+
+@pytest.mark.parametrize("pattern", [
+    r"(a+)+$",
+    r"(a*)*b",
+    r"(\w+\s?)+$",
+    r"(a|aa)+$",
+    r"(x{1,3}){2,}",
+    r"(\w)\1",
+    r".*.*.*x",
+    r"(",
+])
+def test_check_regex_rejects_catastrophic_patterns(pattern):
+    with pytest.raises(ValueError):
+        check_regex(pattern)
+    with pytest.raises(ValueError):
+        LogFilter(regex=pattern)
+
+
+@pytest.mark.parametrize("pattern", [
+    r"error.*timeout",
+    r"Device\[\w+\]",
+    r"\d{4}-\d{2}-\d{2}",
+    r"(descarga|download) (fallida|failed)",
+    r"^Video \d+ descargado",
+    r"(?i)conexi[oó]n",
+])
+def test_check_regex_accepts_common_patterns(pattern):
+    check_regex(pattern)
+    assert LogFilter(regex=pattern).regex.pattern == pattern
+
+
+def test_websocket_filter_rejects_regex():
+    with pytest.raises(ValueError, match="contains"):
+        LogFilter.from_params({"regex": "error"}, allow_regex=False)
+
+
+def write_jsonl(path):
+    with open(path, "w") as f:
+        for i in range(RECORDS):
+            entry = {"ts": 1700000000 + i, "time": "2023-11-14 22:13:20,000", "level": "INFO",
+                     "logger": "test", "message": f"Registro {i}"}
+            f.write(json.dumps(entry) + "\n")
+
+
+def write_text_log(path):
+    with open(path, "w") as f:
+        for i in range(RECORDS):
+            f.write(f"2023-11-14 22:{i // 60 % 60:02d}:{i % 60:02d},000 - test - INFO - Registro {i}\n")
+
+
+def test_query_records_stops_at_deadline(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    write_jsonl(path)
+
+    stats = FilterStats()
+    complete = query_records(base_filename=path, stats=stats, deadline=time.monotonic() + 60)
+    assert len(complete) == RECORDS and stats.truncated_at is None
+
+    stats = FilterStats()
+    partial = query_records(base_filename=path, stats=stats, deadline=time.monotonic() - 1)
+    assert 0 < len(partial) < RECORDS
+    # Seguir desde resume_since completa la consulta sin perder registros
+    rest = query_records(since=stats.truncated_at, base_filename=path)
+    assert [e["message"] for e in partial + rest] == [e["message"] for e in complete]
+
+
+def test_query_text_records_stops_at_deadline(tmp_path):
+    path = str(tmp_path / "log.txt")
+    write_text_log(path)
+    log_filter = LogFilter(logger="test")
+
+    stats = FilterStats()
+    complete = query_text_records(log_filter, stats=stats, base_filename=path, deadline=time.monotonic() + 60)
+    assert len(complete) == RECORDS and stats.truncated_at is None
+
+    stats = FilterStats()
+    partial = query_text_records(log_filter, stats=stats, base_filename=path, deadline=time.monotonic() - 1)
+    assert 0 < len(partial) < RECORDS
+    rest = query_text_records(LogFilter(logger="test", since=stats.truncated_at), base_filename=path)
+    assert [e["message"] for e in partial + rest] == [e["message"] for e in complete]
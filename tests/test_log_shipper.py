@@ -0,0 +1,133 @@
+"""
+LogShipper contra un receptor HTTP local: los lotes llegan comprimidos con
+gzip y el cursor solo avanza (y se guarda) después de una respuesta 2xx.
+"""
+import asyncio
+import gzip
+import http.server
+import json
+import threading
+
+import httpx
+import pytest
+
+from modules import log_shipper
+from modules.http_client import close_async_clients
+from modules.log_shipper import LogShipper
+
+
+class Receiver:
+    """Servidor HTTP local que guarda los lotes y responde con los códigos indicados"""
+
+    def __init__(self):
+        self.batches = []
+        self.statuses = []
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.batches.append((dict(self.headers), body))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/logs"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fixed_device_id(monkeypatch):
+    monkeypatch.setattr(log_shipper, "get_device_id", lambda: "test-device")
+
+
+def write_lines(path, start, count):
+    with open(path, "a") as f:
+        for i in range(start, start + count):
+            f.write(f"2026-10-19 07:00:00,000 - test - INFO - linea {i}\n")
+
+
+def lines_of(body):
+    return gzip.decompress(body).decode("utf-8").splitlines()
+
+
+def test_batches_are_gzip_and_cursor_moves_only_after_2xx(tmp_path):
+    log_file = tmp_path / "client.log"
+    state_file = tmp_path / "state.json"
+    write_lines(log_file, 1, 5)
+
+    async def scenario(receiver):
+        shipper = LogShipper(url=receiver.url, verify_ssl=False, state_file=str(state_file),
+                             batch_lines=3, base_filename=str(log_file))
+        try:
+            # El servidor rechaza el primer lote: el cursor no se mueve ni se guarda
+            receiver.statuses = [500]
+            with pytest.raises(httpx.HTTPStatusError):
+                await shipper.ship_once()
+            assert shipper.cursor is None
+            assert not state_file.exists()
+
+            # Reintento aceptado: mismo lote, mismo cursor de inicio
+            assert await shipper.ship_once() == 3
+            first_cursor = shipper.cursor
+            assert first_cursor is not None
+            assert json.loads(state_file.read_text())["cursor"] == first_cursor
+
+            assert await shipper.ship_once() == 2
+            assert await shipper.ship_once() == 0
+            return shipper
+        finally:
+            await close_async_clients()
+
+    with Receiver() as receiver:
+        shipper = asyncio.run(scenario(receiver))
+
+    assert len(receiver.batches) == 3
+    (rejected_headers, rejected), (first_headers, first), (second_headers, second) = receiver.batches
+    for headers, _ in receiver.batches:
+        assert headers["Content-Encoding"] == "gzip"
+        assert headers["X-Device-Id"] == "test-device"
+    assert lines_of(rejected) == lines_of(first)
+    assert rejected_headers["X-Log-Cursor"] == first_headers["X-Log-Cursor"]
+    assert lines_of(first) == [f"2026-10-19 07:00:00,000 - test - INFO - linea {i}" for i in (1, 2, 3)]
+    assert lines_of(second) == [f"2026-10-19 07:00:00,000 - test - INFO - linea {i}" for i in (4, 5)]
+    # Cada lote empieza donde terminó el anterior confirmado
+    assert second_headers["X-Log-Cursor"] == first_headers["X-Log-Next-Cursor"]
+    assert shipper.stats()["batches"] == 2
+    assert shipper.stats()["lines"] == 5
+
+
+def test_restart_resumes_from_saved_cursor(tmp_path):
+    log_file = tmp_path / "client.log"
+    state_file = tmp_path / "state.json"
+    write_lines(log_file, 1, 2)
+
+    async def ship_all(receiver):
+        shipper = LogShipper(url=receiver.url, verify_ssl=False, state_file=str(state_file),
+                             base_filename=str(log_file))
+        try:
+            shipper.load_state()
+            return await shipper.ship_once()
+        finally:
+            await close_async_clients()
+
+    with Receiver() as receiver:
+        assert asyncio.run(ship_all(receiver)) == 2
+        write_lines(log_file, 3, 1)
+        # Un shipper nuevo (reinicio del proceso) solo envía la línea nueva
+        assert asyncio.run(ship_all(receiver)) == 1
+
+    assert lines_of(receiver.batches[-1][1]) == ["2026-10-19 07:00:00,000 - test - INFO - linea 3"]
@@ -0,0 +1,41 @@
+"""
+Herramientas de captura que escriben en un archivo: como scrot o
+xfce4-screenshooter, eligen el formato por la extensión de la ruta.
+"""
+import io
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+from modules.screen_capture import CaptureBackend
+
+# Igual que scrot: sin extensión conocida no escribe nada
+FAKE_TOOL = """
+import sys
+from PIL import Image
+path = sys.argv[1]
+if not path.endswith(".png"):
+    sys.exit("formato desconocido")
+Image.new("RGB", (4, 3), (255, 0, 0)).save(path)
+"""
+
+
+def test_capture_to_file_uses_png_path():
+    backend = CaptureBackend("fake-scrot", lambda path, display: [sys.executable, "-c", FAKE_TOOL, path])
+
+    data = backend.capture({"env": {}})
+
+    image = Image.open(io.BytesIO(data))
+    assert image.format == "PNG"
+    assert image.size == (4, 3)
+    assert backend.captures == 1
+
+
+def test_capture_to_file_reports_tool_failure():
+    backend = CaptureBackend("fake-fail", lambda path, display: [sys.executable, "-c", "import sys; sys.exit(1)"])
+
+    with pytest.raises(subprocess.CalledProcessError):
+        backend.capture({"env": {}})
+    assert backend.failures == 1
@@ -0,0 +1,137 @@
+"""
+FramebufferBackend con un framebuffer sintético: un archivo normal con los
+píxeles (con relleno al final de cada línea) y un directorio sysfs falso en
+tmp_path. En un archivo normal los ioctl fallan, así que la geometría sale de
+sysfs; la ruta del ioctl se prueba simulando sus respuestas.
+"""
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from modules import screen_capture
+from modules.screen_capture import (
+    FramebufferBackend, FB_VAR_SCREENINFO, FB_VAR_SCREENINFO_SIZE, FB_FIX_SCREENINFO, FB_FIX_SCREENINFO_SIZE,
+    FBIOGET_VSCREENINFO, FBIOGET_FSCREENINFO
+)
+
+WIDTH = 7
+HEIGHT = 5
+PADDING = 12  # Bytes de relleno al final de cada línea
+
+
+def color(x, y):
+    return ((x * 37 + 5) % 256, (y * 59 + 11) % 256, ((x + y) * 13 + 200) % 256)
+
+
+def encode_pixel(rgb, bpp):
+    """Píxel tal como lo guarda un framebuffer little-endian con el rojo en los bits altos"""
+    r, g, b = rgb
+    if bpp == 32:
+        return bytes((b, g, r, 0xFF))
+    if bpp == 24:
+        return bytes((b, g, r))
+    return struct.pack("<H", (r >> 3) << 11 | (g >> 2) << 5 | (b >> 3))
+
+
+def framebuffer(bpp, width=WIDTH, height=HEIGHT, padding=PADDING, leading_lines=0):
+    """Contenido del framebuffer y su stride; las líneas previas y el relleno son basura"""
+    stride = width * bpp // 8 + padding
+    lines = [b"\xab" * stride] * leading_lines
+    for y in range(height):
+        line = b"".join(encode_pixel(color(x, y), bpp) for x in range(width))
+        lines.append(line + b"\xab" * padding)
+    return b"".join(lines), stride
+
+
+def make_sysfs(path, bpp, stride=None, width=WIDTH, height=HEIGHT):
+    path.mkdir()
+    (path / "virtual_size").write_text(f"{width},{height}\n")
+    (path / "bits_per_pixel").write_text(f"{bpp}\n")
+    if stride is not None:
+        (path / "stride").write_text(f"{stride}\n")
+    return str(path)
+
+
+def assert_pixels(data, bpp, width=WIDTH, height=HEIGHT):
+    image = Image.open(io.BytesIO(data))
+    assert image.format == "PPM"
+    assert image.size == (width, height)
+    # 16 bpp conserva 5 bits de rojo y azul y 6 de verde
+    shifts = (3, 2, 3) if bpp == 16 else (0, 0, 0)
+    for y in range(height):
+        for x in range(width):
+            got = image.getpixel((x, y))
+            expected = color(x, y)
+            assert tuple(v >> s for v, s in zip(got, shifts)) == tuple(v >> s for v, s in zip(expected, shifts)), \
+                (x, y, got, expected)
+
+
+@pytest.mark.parametrize("bpp", [16, 24, 32])
+def test_sysfs_fallback_with_stride(tmp_path, bpp):
+    content, stride = framebuffer(bpp)
+    device = tmp_path / "fb0"
+    device.write_bytes(content)
+    backend = FramebufferBackend(str(device), make_sysfs(tmp_path / "sysfs", bpp, stride))
+
+    with open(device, "rb") as f:
+        info = backend.geometry(f.fileno())
+    assert info == {
+        "width": WIDTH,
+        "height": HEIGHT,
+        "stride": stride,
+        "offset": 0,
+        "rawmode": {16: "BGR;16", 24: "BGR", 32: "BGRX"}[bpp]
+    }
+    assert_pixels(backend.capture({"env": {}}), bpp)
+    assert backend.captures == 1
+
+
+def test_sysfs_without_stride_uses_packed_lines(tmp_path):
+    content, stride = framebuffer(32, padding=0)
+    device = tmp_path / "fb0"
+    device.write_bytes(content)
+    backend = FramebufferBackend(str(device), make_sysfs(tmp_path / "sysfs", 32))
+
+    with open(device, "rb") as f:
+        assert backend.geometry(f.fileno())["stride"] == stride == WIDTH * 4
+    assert_pixels(backend.capture({"env": {}}), 32)
+
+
+def test_unsupported_bpp(tmp_path):
+    device = tmp_path / "fb0"
+    device.write_bytes(b"\x00" * WIDTH * HEIGHT)
+    backend = FramebufferBackend(str(device), make_sysfs(tmp_path / "sysfs", 8))
+
+    with pytest.raises(OSError, match="8 bits"):
+        backend.capture({"env": {}})
+    assert backend.failures == 1
+
+
+@pytest.mark.parametrize("bpp,red_offset,rawmode", [(32, 16, "BGRX"), (24, 16, "BGR"), (16, 11, "BGR;16")])
+def test_ioctl_geometry_with_panning_offset(tmp_path, monkeypatch, bpp, red_offset, rawmode):
+    yoffset = 3
+    content, stride = framebuffer(bpp, leading_lines=yoffset)
+    device = tmp_path / "fb0"
+    device.write_bytes(content)
+
+    def fake_ioctl(fd, request, arg):
+        if request == FBIOGET_VSCREENINFO:
+            values = [WIDTH, HEIGHT, WIDTH, HEIGHT + yoffset, 0, yoffset, bpp, 0, red_offset] + [0] * 11
+            return FB_VAR_SCREENINFO.pack(*values).ljust(FB_VAR_SCREENINFO_SIZE, b"\x00")
+        if request == FBIOGET_FSCREENINFO:
+            fix = FB_FIX_SCREENINFO.pack(b"synthetic", 0, len(content), 0, 0, 2, 0, 1, 0, stride)
+            return fix.ljust(FB_FIX_SCREENINFO_SIZE, b"\x00")
+        raise OSError("ioctl inesperado")
+
+    monkeypatch.setattr(screen_capture.fcntl, "ioctl", fake_ioctl)
+    # sysfs no existe: si se usara, la prueba fallaría
+    backend = FramebufferBackend(str(device), str(tmp_path / "missing"))
+
+    with open(device, "rb") as f:
+        info = backend.geometry(f.fileno())
+    assert info["stride"] == stride
+    assert info["offset"] == yoffset * stride
+    assert info["rawmode"] == rawmode
+    assert_pixels(backend.capture({"env": {}}), bpp)
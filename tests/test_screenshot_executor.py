@@ -0,0 +1,121 @@
+"""
+Saturación del ejecutor de capturas: muchos clientes piden a la vez variantes
+distintas de la misma captura y cada codificación tarda más que el tiempo
+máximo por trabajo. Las peticiones deben acabar en 504 (ExecutorTimeout) y,
+con el ejecutor lleno, en 503 con Retry-After (ExecutorBusy), mientras una
+ruta barata del mismo proceso mantiene la latencia que tiene sin carga
+porque el bucle de eventos nunca se bloquea.
+"""
+import asyncio
+import io
+import time
+
+import httpx
+from fastapi import FastAPI
+from PIL import Image
+
+from routers import screenshot
+from modules.bounded_executor import BoundedExecutor
+from modules.screenshot_cache import ScreenshotCache
+from modules.screenshot_image import render_variant
+
+CAPTURE_SECONDS = 0.02  # Duración de cada captura simulada
+RENDER_SECONDS = 0.4  # Duración de cada codificación simulada (bloquea su hilo)
+JOB_TIMEOUT = 0.15  # Tiempo máximo por trabajo del ejecutor de prueba
+BASELINE_SECONDS = 1.0  # Duración de la medida sin carga
+LOAD_SECONDS = 1.5  # Duración de la carga
+CAPTURE_CLIENTS = 8  # Clientes pidiendo capturas a la vez
+CHEAP_P99_RATIO = 5  # p99 con carga / p99 sin carga admitido en la ruta barata
+
+
+class SlowCaptureRegistry:
+    """Registro de captura falso que devuelve siempre la misma imagen"""
+
+    def __init__(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 36), (10, 20, 30)).save(buffer, "PNG")
+        self.data = buffer.getvalue()
+        self.captures = 0
+
+    def capture(self):
+        self.captures += 1
+        time.sleep(CAPTURE_SECONDS)
+        return "fake", self.data
+
+    def stats(self):
+        return {"selected": "fake", "captures": self.captures}
+
+
+def slow_render(*args):
+    time.sleep(RENDER_SECONDS)
+    return render_variant(*args)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def test_saturated_executor_rejects_and_keeps_api_responsive(monkeypatch):
+    executor = BoundedExecutor("screenshot-test", workers=1, max_pending=2, timeout=JOB_TIMEOUT)
+    registry = SlowCaptureRegistry()
+    monkeypatch.setattr(screenshot, "get_screenshot_executor", lambda: executor)
+    monkeypatch.setattr(screenshot, "get_capture_registry", lambda: registry)
+    monkeypatch.setattr(screenshot, "render_variant", slow_render)
+    # Una sola captura para toda la prueba: la carga está en las variantes
+    monkeypatch.setattr(screenshot, "screenshot_cache", ScreenshotCache(screenshot.take_screenshot, ttl=60))
+
+    app = FastAPI()
+    app.include_router(screenshot.router)
+
+    statuses = []
+    retry_after = []
+    baseline_ms = []
+    cheap_ms = []
+
+    async def capture_client(client, deadline, number):
+        width = 16 + number
+        while time.monotonic() < deadline:
+            # Cada petición pide un ancho que no está en la caché de variantes
+            width += CAPTURE_CLIENTS
+            response = await client.get("/api/screenshot/", params={"width": width, "format": "png"})
+            statuses.append(response.status_code)
+            if response.status_code == 503:
+                retry_after.append(response.headers.get("retry-after"))
+
+    async def cheap_client(client, deadline, samples):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/api/screenshot/stats")
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200
+            await asyncio.sleep(0.002)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Latencia de la ruta barata sin carga, en este mismo equipo (tras una petición de calentamiento)
+            await client.get("/api/screenshot/stats")
+            await cheap_client(client, time.monotonic() + BASELINE_SECONDS, baseline_ms)
+            deadline = time.monotonic() + LOAD_SECONDS
+            await asyncio.gather(
+                cheap_client(client, deadline, cheap_ms),
+                *(capture_client(client, deadline, number) for number in range(CAPTURE_CLIENTS))
+            )
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown(wait=True)
+
+    assert 504 in statuses
+    assert 503 in statuses
+    assert set(statuses) <= {503, 504}
+    assert retry_after and all(value == "1" for value in retry_after)
+    stats = executor.stats()
+    assert stats["timeouts"] > 0 and stats["rejected"] > 0
+    # Los trabajos vencidos terminan en su hilo y dejan de contar como pendientes
+    assert stats["pending"] == 0
+
+    assert len(baseline_ms) > 20 and len(cheap_ms) > 20
+    assert percentile(cheap_ms, 0.99) <= CHEAP_P99_RATIO * percentile(baseline_ms, 0.99)
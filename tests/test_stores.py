@@ -0,0 +1,139 @@
+"""
+StoreIndex contra tablas generadas con miles de rangos CIDR: la búsqueda en
+el trie debe dar exactamente el mismo resultado que recorrer todos los rangos
+quedándose con el prefijo más largo, y ser más rápida.
+"""
+import ipaddress
+import json
+import random
+import time
+
+from modules import stores
+from modules.stores import StoreIndex, reload_store_index, get_store_index
+
+RANGES = 5000
+QUERIES = 2000
+
+
+def generate_ranges(rng, count):
+    """Rangos IPv4 e IPv6 aleatorios, con rangos anidados para ejercitar el prefijo más largo"""
+    ranges = []
+    for i in range(count):
+        store = f"T{i:05d}"
+        if ranges and rng.random() < 0.2:
+            # Subred de un rango ya generado
+            parent = ipaddress.ip_network(rng.choice(ranges)[0])
+            if parent.prefixlen < parent.max_prefixlen - 2:
+                prefixlen = rng.randint(parent.prefixlen + 1, min(parent.max_prefixlen, parent.prefixlen + 8))
+                subnets = 1 << (prefixlen - parent.prefixlen)
+                offset = rng.randrange(subnets) << (parent.max_prefixlen - prefixlen)
+                network = ipaddress.ip_network((int(parent.network_address) + offset, prefixlen))
+                ranges.append((str(network), store))
+                continue
+        if rng.random() < 0.9:
+            network = ipaddress.ip_network((rng.getrandbits(32), rng.randint(8, 30)), strict=False)
+        else:
+            network = ipaddress.ip_network((rng.getrandbits(128), rng.randint(16, 64)), strict=False)
+        ranges.append((str(network), store))
+    return ranges
+
+
+def generate_queries(rng, ranges, count):
+    """Direcciones dentro de algún rango (la mitad) y direcciones al azar"""
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            network = ipaddress.ip_network(rng.choice(ranges)[0])
+            address = network.network_address + rng.randrange(network.num_addresses)
+        elif rng.random() < 0.9:
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+        else:
+            address = ipaddress.IPv6Address(rng.getrandbits(128))
+        queries.append(str(address))
+    return queries
+
+
+class LinearIndex:
+    """Recorre todos los rangos en cada búsqueda; el último añadido gana si hay duplicados, como en StoreIndex"""
+
+    def __init__(self, ranges):
+        self.ranges = []
+        for cidr, store in ranges:
+            network = ipaddress.ip_network(cidr, strict=False)
+            mask = int(network.netmask)
+            self.ranges.append((network.version, int(network.network_address) & mask, mask, network.prefixlen, store))
+
+    def lookup(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        version, bits = address.version, int(address)
+        best, best_len = None, -1
+        for range_version, network, mask, prefixlen, store in self.ranges:
+            if range_version == version and bits & mask == network and prefixlen >= best_len:
+                best, best_len = store, prefixlen
+        return best
+
+
+def test_trie_matches_linear_scan():
+    rng = random.Random(27)
+    ranges = generate_ranges(rng, RANGES)
+    queries = generate_queries(rng, ranges, QUERIES)
+    index = StoreIndex(ranges)
+    linear = LinearIndex(ranges)
+
+    expected = [linear.lookup(ip) for ip in queries]
+    assert [index.lookup(ip) for ip in queries] == expected
+    # La tabla debe ejercitar tanto aciertos como fallos
+    assert sum(store is not None for store in expected) > QUERIES // 3
+    assert sum(store is None for store in expected) > QUERIES // 10
+
+
+def test_trie_faster_than_linear_scan():
+    rng = random.Random(2027)
+    ranges = generate_ranges(rng, RANGES)
+    queries = generate_queries(rng, ranges, 200)
+    index = StoreIndex(ranges)
+    linear = LinearIndex(ranges)
+
+    started = time.perf_counter()
+    for ip in queries:
+        linear.lookup(ip)
+    linear_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for ip in queries:
+        index.lookup(ip)
+    trie_time = time.perf_counter() - started
+
+    assert trie_time * 10 < linear_time
+
+
+def test_longest_prefix_and_invalid_ip():
+    index = StoreIndex([
+        ("10.0.0.0/8", "A"),
+        ("10.1.0.0/16", "B"),
+        ("10.1.2.0/24", "C"),
+        ("192.168.36.0/24", "D"),
+        ("2001:db8::/32", "E")
+    ])
+    assert index.lookup("10.9.9.9") == "A"
+    assert index.lookup("10.1.9.9") == "B"
+    assert index.lookup("10.1.2.3") == "C"
+    assert index.lookup("192.168.3.6") is None
+    assert index.lookup("2001:db8::1") == "E"
+    assert index.lookup("no-es-una-ip") is None
+    assert index.size == 5
+
+
+def test_reload_keeps_previous_index_on_invalid_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(stores, "_index", None)
+    config = tmp_path / "stores.json"
+    config.write_text(json.dumps({"T1": ["10.0.0.0/24"]}))
+    assert reload_store_index(str(config))
+    assert get_store_index().lookup("10.0.0.5") == "T1"
+
+    config.write_text("{no es json")
+    assert not reload_store_index(str(config))
+    assert get_store_index().lookup("10.0.0.5") == "T1"